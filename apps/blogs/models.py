@@ -114,6 +114,10 @@ class Blog(models.Model):
     is_featured = models.BooleanField(default=False, db_index=False)
     is_headline = models.BooleanField(default=False, db_index=False)
 
+    class Meta:
+        # keyset cursor pagination, see KeysetCursorPagination
+        indexes = [models.Index(fields=["-created_at", "-id"])]
+
     def __str__(self):
         return self.title
 
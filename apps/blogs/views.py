@@ -24,6 +24,7 @@ from .serializers import (
 )
 
 from tools.custom_permissions import IsAdminOrReadOnly
+from tools.custom_paginations import OptionalCursorPagination
 
 User = get_user_model()
 
@@ -54,6 +55,7 @@ class BlogViewSet(viewsets.ModelViewSet):
     queryset = Blog.objects.all()
     serializer_class = BlogSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = OptionalCursorPagination
     filter_backends = [
         filters.SearchFilter,
         filters.OrderingFilter,
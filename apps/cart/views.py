@@ -7,6 +7,8 @@ from django.core.exceptions import ValidationError
 
 from .models import Cart, CartItem
 from .serializers import CartSerializer, CartItemSerializer
+from apps.products.helpers import get_cart_recommendations
+from apps.products.serializers import ProductSerializer
 
 
 class CartViewSet(viewsets.ModelViewSet):
@@ -39,11 +41,17 @@ class CartViewSet(viewsets.ModelViewSet):
         # count total price
         total_price = sum([item.total_price for item in cart_items])
 
+        # get products frequently bought together with the cart items
+        recommendations = get_cart_recommendations(
+            {item.product_id for item in cart_items}
+        )
+
         return {
             "cart": self.get_serializer(cart).data,
             "cart_items": cart_items_serializer.data,
             "total_items": total_items,
             "total_price": total_price,
+            "recommendations": ProductSerializer(recommendations, many=True).data,
         }
 
     def list(self, request, *args, **kwargs):
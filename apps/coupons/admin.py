@@ -1,8 +1,16 @@
-from django.contrib import admin
+import csv
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.forms import ModelForm
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
 from tools.fileupload_helper import FileUploadHelper
 
 from .models import DiscountType, Coupon, CouponUser, Promotion
+from .helpers import generate_coupons
+
+# larger batches are generated with the generate_coupons command
+ADMIN_COUPON_BATCH_LIMIT = 1000
 
 
 class CouponFormAdmin(ModelForm):
@@ -42,6 +50,15 @@ class PromotionFormAdmin(ModelForm):
             ).validate()
 
 
+class Echo:
+    """
+    File-like object that returns what is written, to stream csv rows
+    """
+
+    def write(self, value):
+        return value
+
+
 class CouponUserInline(admin.TabularInline):
     model = CouponUser
     extra = 0
@@ -51,7 +68,9 @@ class CouponAdmin(admin.ModelAdmin):
     form = CouponFormAdmin
     list_filter = ("is_private", "is_limited", "valid_from", "valid_to")
     search_fields = ("prefix_code", "name", "discount_type__name", "discount_value")
+    readonly_fields = ("redemption_count",)
     inlines = [CouponUserInline]
+    actions = ["generate_coupon_batch"]
 
     def get_list_display(self, request):
         if request.user.is_superuser:
@@ -77,6 +96,62 @@ class CouponAdmin(admin.ModelAdmin):
     def full_code(self, obj):
         return obj.prefix_code + obj.decode_coupon_code(obj.code)
 
+    @admin.action(description="Generate single-use coupons like selected coupon")
+    def generate_coupon_batch(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(
+                request, "Select exactly one coupon as template", messages.ERROR
+            )
+            return None
+
+        template = queryset.get()
+
+        # ask for the number of coupons before generating them
+        if "apply" not in request.POST:
+            context = {
+                **self.admin_site.each_context(request),
+                "title": "Generate coupons",
+                "opts": self.model._meta,
+                "template_coupon": template,
+                "batch_limit": ADMIN_COUPON_BATCH_LIMIT,
+                "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            }
+            return TemplateResponse(request, "admin/generate_coupons.html", context)
+
+        try:
+            count = int(request.POST.get("count", 0))
+        except ValueError:
+            count = 0
+        if count <= 0:
+            self.message_user(
+                request, "Count must be a positive number", messages.ERROR
+            )
+            return None
+        if count > ADMIN_COUPON_BATCH_LIMIT:
+            self.message_user(
+                request,
+                f"Generate more than {ADMIN_COUPON_BATCH_LIMIT} coupons with "
+                "the generate_coupons management command",
+                messages.ERROR,
+            )
+            return None
+
+        # generate the coupons while streaming their codes back as csv
+        def stream_rows():
+            writer = csv.writer(Echo())
+            yield writer.writerow(("name", "code"))
+            for chunk in generate_coupons(
+                template, count, name=request.POST.get("name") or None
+            ):
+                for row in chunk:
+                    yield writer.writerow(row)
+
+        response = StreamingHttpResponse(stream_rows(), content_type="text/csv")
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="coupons-{template.prefix_code}.csv"'
+        return response
+
 
 class PromotionAdmin(admin.ModelAdmin):
     form = PromotionFormAdmin
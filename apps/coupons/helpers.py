@@ -0,0 +1,304 @@
+import secrets
+import string
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Coupon, CouponUser, fernet, make_code_digest
+
+COUPON_PREFIX_LENGTH = 8
+COUPON_CODE_LENGTH = 8
+COUPON_CODE_ALPHABET = string.ascii_uppercase + string.digits
+
+# the position name of each coupon code input in the error messages
+COUPON_POSITIONS = ["first", "second"]
+
+
+def with_coupon_usage(queryset, user):
+    # annotate how many times the user has used each coupon
+    return queryset.annotate(
+        user_redemption_count=Coalesce(
+            Subquery(
+                CouponUser.objects.filter(coupon=OuterRef("pk"), user=user).values(
+                    "usage_count"
+                )[:1]
+            ),
+            0,
+        )
+    )
+
+
+def is_fully_redeemed(coupon):
+    return (
+        coupon.max_redemptions is not None
+        and coupon.redemption_count >= coupon.max_redemptions
+    )
+
+
+def is_used_up_by_user(coupon):
+    return (
+        coupon.is_limited
+        and coupon.user_redemption_count >= coupon.max_redemptions_per_user
+    )
+
+
+def get_coupon_discount(coupon, subtotal_amount):
+    if coupon.is_private:
+        return coupon.max_purchase
+    return (coupon.discount_value * subtotal_amount) / 100
+
+
+def evaluate_coupons(user, subtotal_amount, coupon_code_inputs):
+    """
+    Validate the coupon codes of a cart and calculate their discount on the
+    subtotal, with the coupons and their usage by the user fetched in one
+    query. Return the applied coupons, the total discount and the total paid.
+    """
+    # the prefixes are stored in upper case and matched case-insensitively
+    coupon_code_inputs = [
+        code[:COUPON_PREFIX_LENGTH].upper() + code[COUPON_PREFIX_LENGTH:]
+        if code
+        else code
+        for code in coupon_code_inputs
+    ]
+    codes = [code for code in coupon_code_inputs if code]
+    prefixes = [code[:COUPON_PREFIX_LENGTH] for code in codes]
+    digests = [make_code_digest(code) for code in codes]
+
+    # find the coupons by their indexed code digest, or by their prefix
+    # until the digest is backfilled
+    coupons = {
+        coupon.prefix_code.upper(): coupon
+        for coupon in with_coupon_usage(
+            Coupon.objects.filter(
+                Q(code_digest__in=digests)
+                | Q(code_digest__isnull=True, prefix_code__in=prefixes)
+            ),
+            user,
+        )
+    }
+
+    applied_coupons = []
+    for position, coupon_code_input in zip(COUPON_POSITIONS, coupon_code_inputs):
+        if not coupon_code_input:
+            continue
+
+        coupon = coupons.get(coupon_code_input[:COUPON_PREFIX_LENGTH])
+        if (
+            coupon is None
+            or not coupon.is_verified(coupon_code_input[COUPON_PREFIX_LENGTH:])
+            or not coupon.is_valid()
+        ):
+            raise serializers.ValidationError({"error": "Coupon is not valid"})
+
+        if is_fully_redeemed(coupon):
+            raise serializers.ValidationError({"error": "Coupon is fully redeemed"})
+
+        if is_used_up_by_user(coupon):
+            raise serializers.ValidationError({"error": "Coupon is already used"})
+
+        # Check if the coupon is valid for this order
+        if not coupon.is_private and coupon.min_purchase > subtotal_amount:
+            raise serializers.ValidationError(
+                f"Total purchase must be higher than the minimum purchase allowed for the {position} coupon"
+            )
+
+        applied_coupons.append(coupon)
+
+    # Check if both coupons are public, or prioritize the private coupon
+    if len(applied_coupons) == 2:
+        coupon, coupon2 = applied_coupons
+        if not coupon.is_private and not coupon2.is_private:
+            raise serializers.ValidationError(
+                {"error": "Only one free coupon is allowed"}
+            )
+        elif coupon.id == coupon2.id:
+            raise serializers.ValidationError({"error": "Coupon can't be used twice"})
+        elif not coupon.is_private and coupon2.is_private:
+            applied_coupons = [coupon2, coupon]
+
+    total_discount = 0
+    total_paid = subtotal_amount
+    for coupon in applied_coupons:
+        discount = get_coupon_discount(coupon, subtotal_amount)
+        total_discount += discount
+        total_paid -= discount
+
+    if total_discount > subtotal_amount:
+        total_discount = subtotal_amount
+        total_paid = 0
+
+    return applied_coupons, total_discount, total_paid
+
+
+def get_best_coupons(user, subtotal_amount, limit=None):
+    """
+    Rank the public coupons the user can use on the subtotal by their
+    discount, from one query. Return a list of (coupon, discount).
+    """
+    now = timezone.now()
+    coupons = with_coupon_usage(
+        Coupon.objects.filter(
+            is_active=True,
+            is_private=False,
+            valid_from__lte=now,
+            valid_to__gte=now,
+            min_purchase__lte=subtotal_amount,
+        ),
+        user,
+    ).exclude(
+        Q(max_redemptions__isnull=False, redemption_count__gte=F("max_redemptions"))
+        | Q(
+            is_limited=True,
+            user_redemption_count__gte=F("max_redemptions_per_user"),
+        )
+    )
+
+    best_coupons = [
+        (coupon, min(get_coupon_discount(coupon, subtotal_amount), subtotal_amount))
+        for coupon in coupons
+    ]
+    best_coupons.sort(key=lambda item: (-item[1], item[0].valid_to))
+    return best_coupons[:limit] if limit else best_coupons
+
+
+def count_user_redemptions(user, coupon_ids):
+    """
+    Increment the usage count of the user for each coupon, unless a limited
+    coupon is used up. Return False when a limited coupon is used up.
+    """
+    redeemed = (
+        CouponUser.objects.filter(coupon_id__in=coupon_ids, user=user)
+        .filter(
+            Q(coupon__is_limited=False)
+            | Q(usage_count__lt=F("coupon__max_redemptions_per_user"))
+        )
+        .update(usage_count=F("usage_count") + 1, is_used=True)
+    )
+    # a locking read, to see the usage rows committed by racing orders
+    used_coupon_ids = {
+        str(coupon_id)
+        for coupon_id in CouponUser.objects.select_for_update()
+        .filter(coupon_id__in=coupon_ids, user=user)
+        .values_list("coupon_id", flat=True)
+    }
+    if redeemed < len(used_coupon_ids):
+        return False
+
+    # the first redemption of the user, racing orders fail on the constraint
+    CouponUser.objects.bulk_create(
+        [
+            CouponUser(coupon_id=coupon_id, user=user)
+            for coupon_id in coupon_ids
+            if coupon_id not in used_coupon_ids
+        ]
+    )
+    return True
+
+
+def redeem_coupons(user, coupon_ids):
+    """
+    Count a redemption of the coupons by the user with conditional updates
+    of the coupon and user counters, so concurrent orders can't go over the
+    global or the per user limit. Must run in the transaction of the order,
+    as late as possible since the coupon rows stay locked until it commits.
+    """
+    coupon_ids = [str(coupon_id) for coupon_id in coupon_ids]
+    if not coupon_ids:
+        return
+
+    # count the redemption of each coupon, unless it is fully redeemed
+    redeemed = (
+        Coupon.objects.filter(id__in=coupon_ids)
+        .filter(
+            Q(max_redemptions__isnull=True)
+            | Q(redemption_count__lt=F("max_redemptions"))
+        )
+        .update(redemption_count=F("redemption_count") + 1)
+    )
+    if redeemed < len(coupon_ids):
+        raise serializers.ValidationError({"error": "Coupon is fully redeemed"})
+
+    # count the redemption of the user
+    try:
+        with transaction.atomic():
+            is_counted = count_user_redemptions(user, coupon_ids)
+    except IntegrityError:
+        # another order of the user created the usage row first
+        is_counted = count_user_redemptions(user, coupon_ids)
+    if not is_counted:
+        raise serializers.ValidationError({"error": "Coupon is already used"})
+
+
+def random_coupon_code(length):
+    return "".join(secrets.choice(COUPON_CODE_ALPHABET) for _ in range(length))
+
+
+def get_unique_prefixes(count, generated):
+    """
+    Get count new random prefixes, unique in the batch and in the database,
+    with one query per round of collisions
+    """
+    prefixes = set()
+    while len(prefixes) < count:
+        while len(prefixes) < count:
+            prefix = random_coupon_code(COUPON_PREFIX_LENGTH)
+            if prefix not in generated:
+                prefixes.add(prefix)
+
+        # drop the prefixes already taken by existing coupons and retry
+        prefixes -= set(
+            Coupon.objects.filter(prefix_code__in=prefixes).values_list(
+                "prefix_code", flat=True
+            )
+        )
+
+    generated |= prefixes
+    return prefixes
+
+
+def generate_coupons(template, count, name=None, batch_size=1000):
+    """
+    Generate count single-use coupons with the discount, privacy and
+    validity of the template coupon, created in chunks of batch_size.
+    Yield the (name, full code) rows of every created chunk.
+    """
+    name = name or template.name
+    generated = set()
+    remaining = count
+
+    while remaining > 0:
+        size = min(batch_size, remaining)
+
+        coupons = []
+        rows = []
+        for prefix in get_unique_prefixes(size, generated):
+            code = random_coupon_code(COUPON_CODE_LENGTH)
+            coupon_name = f"{name} {prefix}"
+            coupons.append(
+                Coupon(
+                    name=coupon_name,
+                    prefix_code=prefix,
+                    code=fernet.encrypt(code.encode()).decode(),
+                    code_digest=make_code_digest(prefix + code),
+                    discount_type_id=template.discount_type_id,
+                    discount_value=template.discount_value,
+                    min_purchase=template.min_purchase,
+                    max_purchase=template.max_purchase,
+                    valid_from=template.valid_from,
+                    valid_to=template.valid_to,
+                    is_active=True,
+                    is_private=template.is_private,
+                    is_limited=True,
+                    max_redemptions=1,
+                )
+            )
+            rows.append((coupon_name, prefix + code))
+
+        with transaction.atomic():
+            Coupon.objects.bulk_create(coupons)
+
+        remaining -= size
+        yield rows
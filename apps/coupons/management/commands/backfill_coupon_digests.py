@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from apps.coupons.models import Coupon
+
+
+class Command(BaseCommand):
+    help = "Backfill the HMAC digest of the coupon codes from the encrypted codes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recalculate the digest of every coupon, not only the missing ones",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of coupons updated per query",
+        )
+
+    def handle(self, *args, **options):
+        coupons = Coupon.objects.only("id", "code", "prefix_code", "code_digest")
+        if not options["all"]:
+            coupons = coupons.filter(code_digest__isnull=True)
+
+        updated = []
+        invalid = 0
+        for coupon in coupons.iterator():
+            coupon.code_digest = coupon.get_code_digest()
+            if coupon.code_digest is None:
+                invalid += 1
+                continue
+            updated.append(coupon)
+
+        Coupon.objects.bulk_update(
+            updated, ["code_digest"], batch_size=options["batch_size"]
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled the code digest of {len(updated)} coupons")
+        )
+        if invalid:
+            self.stdout.write(
+                self.style.WARNING(f"Skipped {invalid} coupons with an invalid code")
+            )
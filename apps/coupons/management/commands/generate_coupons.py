@@ -0,0 +1,66 @@
+import csv
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.coupons.helpers import generate_coupons
+from apps.coupons.models import Coupon
+
+
+class Command(BaseCommand):
+    help = "Generate single-use coupons from a template coupon as CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "template",
+            help="Prefix code of the coupon to copy the discount and validity from",
+        )
+        parser.add_argument("count", type=int, help="Number of coupons to generate")
+        parser.add_argument(
+            "--name",
+            help="Name of the generated coupons, followed by their prefix code",
+        )
+        parser.add_argument(
+            "--output",
+            help="CSV file of the generated codes, standard output by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of coupons created per query",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            template = Coupon.objects.get(prefix_code=options["template"].upper())
+        except Coupon.DoesNotExist:
+            raise CommandError(f"Coupon {options['template']} does not exist")
+
+        output = open(options["output"], "w", newline="") if options["output"] else None
+        writer = csv.writer(output or sys.stdout)
+        writer.writerow(["name", "code"])
+
+        started_at = time.monotonic()
+        generated = 0
+        try:
+            for rows in generate_coupons(
+                template,
+                options["count"],
+                name=options["name"],
+                batch_size=options["batch_size"],
+            ):
+                writer.writerows(rows)
+                generated += len(rows)
+        finally:
+            if output:
+                output.close()
+
+        elapsed = time.monotonic() - started_at
+        throughput = generated / elapsed if elapsed else generated
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"Generated {generated} coupons in {elapsed:.1f}s "
+                f"({throughput:.0f} coupons/s)"
+            )
+        )
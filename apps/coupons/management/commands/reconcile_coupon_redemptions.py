@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from apps.coupons.models import Coupon
+
+
+class Command(BaseCommand):
+    help = "Reconcile the coupon redemption counters with the coupon usage of users"
+
+    def handle(self, *args, **options):
+        coupons = (
+            Coupon.objects.annotate(
+                redeemed=Coalesce(Sum("couponuser__usage_count"), 0)
+            )
+            .exclude(redemption_count=F("redeemed"))
+            .values_list("id", "redemption_count", "redeemed")
+        )
+
+        reconciled = 0
+        for coupon_id, redemption_count, redeemed in coupons:
+            # skip the counter when an order redeemed the coupon meanwhile
+            reconciled += Coupon.objects.filter(
+                id=coupon_id, redemption_count=redemption_count
+            ).update(redemption_count=redeemed)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconciled {reconciled} coupon redemption counters")
+        )
@@ -7,7 +7,9 @@ from cryptography.fernet import Fernet
 from cryptography.fernet import InvalidToken
 from django.conf import settings
 import hashlib
+import hmac
 import base64
+from django.utils.crypto import salted_hmac
 from django.utils.text import slugify
 from tools.filestorage_helper import GridFSStorage
 
@@ -21,6 +23,16 @@ key = base64.urlsafe_b64encode(hash)
 
 fernet = Fernet(key)
 
+# Salt of the HMAC digest of the full coupon codes
+CODE_DIGEST_SALT = "apps.coupons.code_digest"
+
+
+def make_code_digest(full_code):
+    """
+    Get the keyed HMAC digest of a full coupon code (prefix and code)
+    """
+    return salted_hmac(CODE_DIGEST_SALT, full_code, algorithm="sha256").hexdigest()
+
 
 class DiscountType(models.Model):
     id = models.UUIDField(
@@ -37,6 +49,9 @@ class Coupon(models.Model):
         primary_key=True, default=uuid.uuid4, editable=False, db_index=True
     )
     code = models.CharField(max_length=250, unique=True, editable=False, db_index=True)
+    code_digest = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False
+    )
     prefix_code = models.CharField(max_length=100, unique=True, db_index=True)
     name = models.CharField(max_length=250, unique=True)
     cover = models.ImageField(
@@ -55,11 +70,18 @@ class Coupon(models.Model):
     is_active = models.BooleanField(default=True, db_index=True)
     is_private = models.BooleanField(default=False, db_index=True)
     is_limited = models.BooleanField(default=False, db_index=True)
+    max_redemptions = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Total redemptions allowed, empty for no limit"
+    )
+    max_redemptions_per_user = models.PositiveIntegerField(
+        default=1, help_text="Redemptions allowed per user when the coupon is limited"
+    )
+    redemption_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.name} - {self.prefix_code}{self.decode_coupon_code(self.code)}"
+        return f"{self.name} - {self.prefix_code}"
 
     def save(self, *args, **kwargs):
         if not self.code:
@@ -68,6 +90,15 @@ class Coupon(models.Model):
             self.prefix_code = self.generate_prefix_code()
         else:
             self.prefix_code = self.prefix_code.upper()[:8]
+        self.code_digest = self.get_code_digest()
+
+        # don't write back a redemption count loaded before a redemption
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "redemption_count"
+            ]
         super().save(*args, **kwargs)
 
     def generate_code(self):
@@ -78,13 +109,26 @@ class Coupon(models.Model):
         prefix = secrets.token_urlsafe(12).upper()[:8]
         return prefix
 
-    def is_verified(self, code):
+    def get_code_digest(self):
+        # the encrypted code is only decrypted here, when the coupon is saved
         try:
-            code = code.encode()
-            decrypted_code = fernet.decrypt(self.code.encode())
-            return code == decrypted_code
+            code = fernet.decrypt(self.code.encode()).decode()
         except InvalidToken:
-            return False
+            return None
+        return make_code_digest(self.prefix_code + code)
+
+    def is_verified(self, code):
+        # fall back to the encrypted code until the digest is backfilled
+        if not self.code_digest:
+            try:
+                decrypted_code = fernet.decrypt(self.code.encode())
+                return code.encode() == decrypted_code
+            except InvalidToken:
+                return False
+
+        return hmac.compare_digest(
+            self.code_digest, make_code_digest(self.prefix_code + code)
+        )
 
     def decode_coupon_code(self, code):
         try:
@@ -114,8 +158,16 @@ class CouponUser(models.Model):
         User, on_delete=models.CASCADE, related_name="user_coupons"
     )
     is_used = models.BooleanField(default=True)
+    usage_count = models.PositiveIntegerField(default=1)
     used_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["coupon", "user"], name="unique_coupon_user"
+            )
+        ]
+
     def __str__(self):
         return f"{self.coupon.name} - {self.user}"
 
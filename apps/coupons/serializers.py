@@ -15,7 +15,7 @@ class CouponSerializer(serializers.ModelSerializer):
     class Meta:
         model = Coupon
         read_only_fields = ["created_at", "updated_at"]
-        exclude = ["code"]
+        exclude = ["code", "code_digest", "redemption_count"]
 
     def get_private_code(self, obj):
         if not obj.is_private:
@@ -0,0 +1,63 @@
+import datetime
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+
+from apps.coupons.helpers import evaluate_coupons
+from apps.coupons.models import Coupon, DiscountType, make_code_digest
+
+User = get_user_model()
+
+
+@pytest.fixture
+def coupon(db):
+    now = timezone.now()
+    return Coupon.objects.create(
+        name="Public",
+        prefix_code="RANDOM",
+        discount_type=DiscountType.objects.create(name="Percentage"),
+        discount_value=10,
+        valid_from=now - datetime.timedelta(days=1),
+        valid_to=now + datetime.timedelta(days=1),
+    )
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+
+
+@pytest.mark.django_db
+def test_coupon_is_verified_by_digest(coupon):
+    # Arrange
+    code = coupon.decode_coupon_code(coupon.code)
+
+    # Assert
+    assert coupon.code_digest == make_code_digest(coupon.prefix_code + code)
+    assert coupon.is_verified(code)
+    assert not coupon.is_verified(code.lower() + "X")
+    assert str(coupon) == f"Public - {coupon.prefix_code}"
+
+
+@pytest.mark.django_db
+def test_backfill_coupon_digests(coupon, user):
+    # Arrange
+    code_input = coupon.prefix_code + coupon.decode_coupon_code(coupon.code)
+    digest = coupon.code_digest
+    Coupon.objects.update(code_digest=None)
+
+    # Act: the coupon is still verified from its encrypted code
+    coupons, _, _ = evaluate_coupons(user, 100000, [code_input])
+    call_command("backfill_coupon_digests")
+
+    # Assert
+    assert coupons == [coupon]
+    assert Coupon.objects.get(id=coupon.id).code_digest == digest
+    coupons, _, _ = evaluate_coupons(user, 100000, [code_input])
+    assert coupons == [coupon]
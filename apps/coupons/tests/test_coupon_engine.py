@@ -0,0 +1,121 @@
+import datetime
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework import serializers
+
+from apps.coupons.helpers import evaluate_coupons, get_best_coupons
+from apps.coupons.models import Coupon, CouponUser, DiscountType
+
+User = get_user_model()
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+
+
+@pytest.fixture
+def create_coupon(db):
+    discount_type = DiscountType.objects.create(name="Percentage")
+
+    def create(name, **kwargs):
+        now = timezone.now()
+        return Coupon.objects.create(
+            name=name,
+            prefix_code="RANDOM",
+            discount_type=discount_type,
+            valid_from=now - datetime.timedelta(days=1),
+            valid_to=now + datetime.timedelta(days=1),
+            **kwargs,
+        )
+
+    return create
+
+
+def get_code_input(coupon):
+    return f"{coupon.prefix_code}{coupon.decode_coupon_code(coupon.code)}"
+
+
+@pytest.mark.django_db
+def test_evaluate_coupons_in_one_query(user, create_coupon, django_assert_num_queries):
+    # Arrange
+    public = create_coupon("Public", discount_value=10)
+    private = create_coupon("Private", is_private=True, max_purchase=5000)
+
+    # Act
+    with django_assert_num_queries(1):
+        coupons, total_discount, total_paid = evaluate_coupons(
+            user, 100000, [get_code_input(public), get_code_input(private)]
+        )
+
+    # Assert: the private coupon is prioritized
+    assert coupons == [private, public]
+    assert total_discount == 15000
+    assert total_paid == 85000
+
+
+@pytest.mark.django_db
+def test_evaluate_coupons_rejects_invalid_codes(user, create_coupon):
+    # Arrange
+    public = create_coupon("Public", discount_value=10, is_limited=True)
+    other = create_coupon("Other", discount_value=20)
+    CouponUser.objects.create(coupon=public, user=user)
+
+    # Act & Assert
+    with pytest.raises(serializers.ValidationError) as error:
+        evaluate_coupons(user, 100000, [f"{public.prefix_code}WRONG", None])
+    assert error.value.detail["error"] == "Coupon is not valid"
+
+    with pytest.raises(serializers.ValidationError) as error:
+        evaluate_coupons(user, 100000, [get_code_input(public), None])
+    assert error.value.detail["error"] == "Coupon is already used"
+
+    with pytest.raises(serializers.ValidationError) as error:
+        evaluate_coupons(user, 100000, [get_code_input(other), get_code_input(other)])
+    assert error.value.detail["error"] == "Only one free coupon is allowed"
+
+
+@pytest.mark.django_db
+def test_evaluate_coupons_matches_prefix_in_any_case(user, create_coupon):
+    # Arrange
+    public = create_coupon("Public", discount_value=10)
+    code_input = get_code_input(public)
+
+    # Act
+    coupons, total_discount, _ = evaluate_coupons(
+        user, 100000, [code_input[:8].lower() + code_input[8:], None]
+    )
+
+    # Assert
+    assert coupons == [public]
+    assert total_discount == 10000
+
+    # the error stays a plain string in the response
+    with pytest.raises(serializers.ValidationError) as error:
+        evaluate_coupons(user, 100000, ["unknown1code", None])
+    assert error.value.detail == {"error": "Coupon is not valid"}
+
+
+@pytest.mark.django_db
+def test_get_best_coupons(user, create_coupon, django_assert_num_queries):
+    # Arrange
+    small = create_coupon("Small", discount_value=5)
+    large = create_coupon("Large", discount_value=20)
+    used = create_coupon("Used", discount_value=50, is_limited=True)
+    create_coupon("Minimum", discount_value=50, min_purchase=500000)
+    create_coupon("Private", is_private=True, max_purchase=90000)
+    create_coupon("Inactive", discount_value=50, is_active=False)
+    CouponUser.objects.create(coupon=used, user=user)
+
+    # Act
+    with django_assert_num_queries(1):
+        best_coupons = get_best_coupons(user, 100000)
+
+    # Assert
+    assert best_coupons == [(large, 20000), (small, 5000)]
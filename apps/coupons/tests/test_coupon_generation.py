@@ -0,0 +1,87 @@
+import csv
+import datetime
+import io
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import serializers
+
+from apps.coupons.helpers import evaluate_coupons, generate_coupons, redeem_coupons
+from apps.coupons.models import Coupon, DiscountType
+
+User = get_user_model()
+
+
+@pytest.fixture
+def coupon(db):
+    now = timezone.now()
+    return Coupon.objects.create(
+        name="Campaign",
+        prefix_code="CAMPAIGN",
+        discount_type=DiscountType.objects.create(name="Percentage"),
+        discount_value=10,
+        valid_from=now - datetime.timedelta(days=1),
+        valid_to=now + datetime.timedelta(days=1),
+    )
+
+
+@pytest.mark.django_db
+def test_generate_coupons_command(coupon, tmp_path):
+    # Arrange
+    user = User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+    output = tmp_path / "coupons.csv"
+
+    # Act
+    call_command(
+        "generate_coupons",
+        "campaign",
+        25,
+        batch_size=10,
+        output=str(output),
+        stderr=io.StringIO(),
+    )
+    with open(output, newline="") as file:
+        rows = list(csv.DictReader(file))
+
+    # Assert
+    assert len(rows) == 25
+    assert len({row["code"] for row in rows}) == 25
+    generated = Coupon.objects.exclude(id=coupon.id)
+    assert generated.count() == 25
+    assert not generated.filter(is_limited=False).exists()
+
+    # the generated codes are verified like any other coupon
+    coupons, total_discount, _ = evaluate_coupons(user, 100000, [rows[0]["code"]])
+    assert [c.name for c in coupons] == [rows[0]["name"]]
+    assert total_discount == 10000
+
+
+@pytest.mark.django_db
+def test_generated_coupon_is_redeemed_once(coupon):
+    # Arrange
+    first, second = [
+        User.objects.create_user(
+            email=f"{name}@example.com",
+            password="password",
+            first_name="Test",
+            last_name="User",
+        )
+        for name in ("first", "second")
+    ]
+    [[(name, _)]] = list(generate_coupons(coupon, 1))
+    generated = Coupon.objects.get(name=name)
+
+    # Act
+    redeem_coupons(first, [generated.id])
+
+    # Assert
+    with pytest.raises(serializers.ValidationError) as error:
+        redeem_coupons(second, [generated.id])
+    assert error.value.detail == {"error": "Coupon is fully redeemed"}
+    assert Coupon.objects.get(id=generated.id).redemption_count == 1
@@ -0,0 +1,122 @@
+import datetime
+import io
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import serializers
+
+from apps.coupons.helpers import evaluate_coupons, redeem_coupons
+from apps.coupons.models import Coupon, CouponUser, DiscountType
+
+User = get_user_model()
+
+
+@pytest.fixture
+def create_user(db):
+    def create(email):
+        return User.objects.create_user(
+            email=email, password="password", first_name="Test", last_name="User"
+        )
+
+    return create
+
+
+@pytest.fixture
+def create_coupon(db):
+    discount_type = DiscountType.objects.create(name="Percentage")
+    now = timezone.now()
+
+    def create(name, **kwargs):
+        return Coupon.objects.create(
+            name=name,
+            prefix_code="RANDOM",
+            discount_type=discount_type,
+            discount_value=10,
+            valid_from=now - datetime.timedelta(days=1),
+            valid_to=now + datetime.timedelta(days=1),
+            **kwargs,
+        )
+
+    return create
+
+
+@pytest.mark.django_db
+def test_redeem_coupons_global_limit(create_user, create_coupon):
+    # Arrange
+    coupon = create_coupon("Campaign", max_redemptions=2)
+    code_input = coupon.prefix_code + coupon.decode_coupon_code(coupon.code)
+    first, second, third = [create_user(f"user{i}@example.com") for i in range(3)]
+
+    # Act
+    redeem_coupons(first, [coupon.id])
+    redeem_coupons(second, [coupon.id])
+
+    # Assert
+    with pytest.raises(serializers.ValidationError) as error:
+        redeem_coupons(third, [coupon.id])
+    assert error.value.detail["error"] == "Coupon is fully redeemed"
+
+    with pytest.raises(serializers.ValidationError) as error:
+        evaluate_coupons(third, 100000, [code_input])
+    assert error.value.detail["error"] == "Coupon is fully redeemed"
+
+    coupon.refresh_from_db()
+    assert coupon.redemption_count == 2
+    assert CouponUser.objects.filter(coupon=coupon).count() == 2
+
+
+@pytest.mark.django_db
+def test_redeem_coupons_per_user_limit(create_user, create_coupon):
+    # Arrange
+    user = create_user("user@example.com")
+    limited = create_coupon("Limited", is_limited=True, max_redemptions_per_user=2)
+    unlimited = create_coupon("Unlimited")
+
+    # Act
+    redeem_coupons(user, [limited.id, unlimited.id])
+    redeem_coupons(user, [limited.id, unlimited.id])
+
+    # Assert
+    with pytest.raises(serializers.ValidationError) as error:
+        redeem_coupons(user, [limited.id])
+    assert error.value.detail["error"] == "Coupon is already used"
+
+    assert CouponUser.objects.get(coupon=limited, user=user).usage_count == 2
+    assert CouponUser.objects.get(coupon=unlimited, user=user).usage_count == 2
+
+
+@pytest.mark.django_db
+def test_reconcile_coupon_redemptions(create_user, create_coupon):
+    # Arrange
+    coupon = create_coupon("Campaign")
+    other = create_coupon("Other")
+    redeem_coupons(create_user("user@example.com"), [coupon.id])
+    Coupon.objects.filter(id=coupon.id).update(redemption_count=5)
+    Coupon.objects.filter(id=other.id).update(redemption_count=3)
+
+    # Act
+    call_command("reconcile_coupon_redemptions", stdout=io.StringIO())
+
+    # Assert
+    coupon.refresh_from_db()
+    other.refresh_from_db()
+    assert coupon.redemption_count == 1
+    assert other.redemption_count == 0
+
+
+@pytest.mark.django_db
+def test_coupon_save_keeps_redemption_count(create_user, create_coupon):
+    # Arrange: a coupon loaded in the admin before it is redeemed
+    coupon = create_coupon("Campaign", max_redemptions=5)
+    stale = Coupon.objects.get(pk=coupon.pk)
+    redeem_coupons(create_user("user@example.com"), [coupon.id])
+
+    # Act
+    stale.name = "Renamed campaign"
+    stale.save()
+
+    # Assert
+    coupon.refresh_from_db()
+    assert coupon.name == "Renamed campaign"
+    assert coupon.redemption_count == 1
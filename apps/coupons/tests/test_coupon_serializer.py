@@ -0,0 +1,48 @@
+import datetime
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.coupons.models import Coupon, DiscountType
+from apps.coupons.serializers import CouponSerializer
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def coupon(db):
+    now = timezone.now()
+    return Coupon.objects.create(
+        name="Public",
+        prefix_code="RANDOM",
+        discount_type=DiscountType.objects.create(name="Percentage"),
+        discount_value=10,
+        valid_from=now - datetime.timedelta(days=1),
+        valid_to=now + datetime.timedelta(days=1),
+    )
+
+
+@pytest.mark.django_db
+def test_coupon_serializer_hides_code_digest_and_counters(coupon):
+    # Arrange
+    Coupon.objects.filter(id=coupon.id).update(redemption_count=3)
+    coupon.refresh_from_db()
+
+    # Act
+    data = CouponSerializer(coupon).data
+    response = APIClient().get("/api/v1/coupons/")
+
+    # Assert
+    for coupon_data in [data, response.data["results"][0]]:
+        assert "code" not in coupon_data
+        assert "code_digest" not in coupon_data
+        assert "redemption_count" not in coupon_data
+        assert coupon_data["private_code"] == coupon.decode_coupon_code(coupon.code)
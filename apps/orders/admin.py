@@ -1,7 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.urls import reverse
 from django.utils.html import format_html
 
+from .helpers import lionparcel_batch_booking, send_order_shipping_email
 from .models import (
     Order,
     OrderItem,
@@ -9,6 +10,10 @@ from .models import (
     ReturnImage,
     RefundOrder,
     OrderShipping,
+    ProductSales,
+    StockReservation,
+    PurchasedProduct,
+    ShipmentTracking,
 )
 
 
@@ -22,6 +27,12 @@ class OrderShippingInline(admin.StackedInline):
     extra = 0
 
 
+class StockReservationInline(admin.TabularInline):
+    model = StockReservation
+    extra = 0
+    readonly_fields = ("stock", "quantity", "status", "created_at", "updated_at")
+
+
 class ReturnOrderInline(admin.StackedInline):
     model = ReturnOrder
     extra = 0
@@ -33,8 +44,10 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [
         OrderItemInline,
         OrderShippingInline,
+        StockReservationInline,
         ReturnOrderInline,
     ]
+    actions = ["book_shipments"]
 
     def get_list_display(self, request):
         if request.user.is_superuser:
@@ -65,6 +78,63 @@ class OrderAdmin(admin.ModelAdmin):
         else:
             return "-"
 
+    @admin.action(description="Book shipments of selected confirmed orders")
+    def book_shipments(self, request, queryset):
+        if not request.user.is_superuser:
+            self.message_user(
+                request, "You are not authorized to do this action", messages.ERROR
+            )
+            return None
+
+        order_ids = list(
+            queryset.filter(status="confirmed").values_list("id", flat=True)
+        )
+        skipped = queryset.count() - len(order_ids)
+        booked_orders, errors = lionparcel_batch_booking(order_ids)
+
+        for order in booked_orders:
+            try:
+                send_order_shipping_email(order.id)
+            except Exception as e:
+                errors[order.ref_code] = f"Shipping email not sent: {e}"
+
+        self.message_user(
+            request,
+            f"{len(booked_orders)} orders are shipped successfully.",
+            messages.SUCCESS,
+        )
+        if skipped:
+            self.message_user(
+                request,
+                f"{skipped} orders are not shipped because status is not confirmed.",
+                messages.WARNING,
+            )
+        for ref_code, error in errors.items():
+            self.message_user(
+                request, f"Order with ID {ref_code}: {error}", messages.ERROR
+            )
+
+
+class ProductSalesAdmin(admin.ModelAdmin):
+    list_display = ("product", "brand", "category", "date", "quantity")
+    list_filter = ("date",)
+    search_fields = ("product__name", "brand__name", "category__name")
+    readonly_fields = ("product", "brand", "category", "date", "quantity")
+
+
+class PurchasedProductAdmin(admin.ModelAdmin):
+    list_display = ("user", "product", "is_rated", "created_at")
+    list_filter = ("is_rated",)
+    search_fields = ("user__email", "product__name")
+    readonly_fields = ("user", "product", "is_rated")
+
+
+class ShipmentTrackingAdmin(admin.ModelAdmin):
+    list_display = ("order_shipping", "current_status", "polled_at")
+    list_filter = ("current_status",)
+    search_fields = ("order_shipping__shipping_ref_code",)
+    readonly_fields = ("order_shipping", "current_status", "history", "polled_at")
+
 
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderItem)
@@ -72,3 +142,6 @@ admin.site.register(OrderShipping)
 admin.site.register(ReturnOrder)
 admin.site.register(ReturnImage)
 admin.site.register(RefundOrder)
+admin.site.register(ProductSales, ProductSalesAdmin)
+admin.site.register(PurchasedProduct, PurchasedProductAdmin)
+admin.site.register(ShipmentTracking, ShipmentTrackingAdmin)
@@ -1,14 +1,39 @@
 from rest_framework import serializers, status
 from rest_framework.response import Response
 import datetime
+import hashlib
+import math
+import requests
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Case, When, Value, IntegerField, Exists, OuterRef
+from django.utils import timezone
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.core.mail import EmailMultiAlternatives
 
 from django.conf import settings
 
-from .models import Order, OrderItem, OrderShipping
+from .models import (
+    Order,
+    OrderItem,
+    OrderShipping,
+    ProductSales,
+    StockReservation,
+    PurchasedProduct,
+)
+from apps.products.models import Product, Stock, Rating
+from apps.products.helpers import invalidate_product_detail_cache_by_ids
+from apps.cart.models import CartItem
+from apps.coupons.helpers import evaluate_coupons
+from apps.shipping.models import Shipping, ShippingType
+from apps.shipping.helpers import lionparcel_original_tariff
+from apps.shipping.helpers import lionparcel_tariff_mapping
 from apps.store.models import Contact
 from tools.lionparcel_helper import LionParcelHelper
 
@@ -39,7 +64,27 @@ def lionparcel_booking(order_id):
         )
 
     lionparcel = LionParcelHelper(settings.LIONPARCEL_API_KEY)
+    booking_data = build_booking_data(order, order_items, shipping, contact)
 
+    try:
+        booking = lionparcel.make_booking(booking_data)
+
+        # get shipping ref code
+        if booking["success"]:
+            shipping_ref_code = booking["data"]["stt"][0]["stt_no"]
+
+            # save shipping ref code
+            shipping.shipping_ref_code = shipping_ref_code
+            shipping.save()
+        else:
+            raise serializers.ValidationError(booking["message"]["en"])
+    except Exception as e:
+        raise serializers.ValidationError(str(e))
+
+    return
+
+
+def build_booking_data(order, order_items, shipping, contact):
     # create stt pieces
     stt_pieces = []
     for order_item in order_items:
@@ -53,7 +98,7 @@ def lionparcel_booking(order_id):
         )
 
     # create booking data
-    booking_data = {
+    return {
         "stt_goods_estimate_price": order.total_amount,
         "stt_no_ref_external": order.ref_code,
         "stt_origin": contact.origin,
@@ -69,22 +114,125 @@ def lionparcel_booking(order_id):
         "stt_pieces": stt_pieces,
     }
 
+
+def get_booked_stt_numbers(booking, ref_codes):
+    """
+    Get the STT number of each order ref code from a booking response,
+    matched by the external ref code, or by position when it is missing
+    """
+    if not booking.get("success"):
+        raise Exception(booking.get("message", {}).get("en", "Booking failed"))
+
+    stt_numbers = {}
+    for index, stt in enumerate(booking["data"]["stt"]):
+        ref_code = stt.get("stt_no_ref_external")
+        if not ref_code and index < len(ref_codes):
+            ref_code = ref_codes[index]
+        if ref_code in ref_codes and stt.get("stt_no"):
+            stt_numbers[ref_code] = stt["stt_no"]
+    return stt_numbers
+
+
+def book_single_shipment(lionparcel, booking_data):
+    # book one shipment, for the fallback of a failed batch booking
+    ref_code = booking_data["stt_no_ref_external"]
     try:
         booking = lionparcel.make_booking(booking_data)
+        return get_booked_stt_numbers(booking, [ref_code]), {}
+    except Exception as e:
+        return {}, {ref_code: str(e)}
+
+
+def is_booking_rejected(error):
+    # a 4xx response is a validation error, nothing of the request was booked
+    response = getattr(error, "response", None)
+    return (
+        isinstance(error, requests.HTTPError)
+        and response is not None
+        and 400 <= response.status_code < 500
+    )
+
+
+def lionparcel_batch_booking(order_ids, workers=4):
+    """
+    Book the shipments of the confirmed orders with LionParcel, many orders
+    per request. When a batch request is rejected, its orders are booked one
+    by one by a pool of workers. When it fails in any other way the batch may
+    have been booked, so its orders are left with an error instead. Save the STT numbers and move the booked
+    orders to shipping in bulk.
+    Return the booked orders and the error of each order ref code.
+    """
+    contact = Contact.objects.get(is_active=True)
+    lionparcel = LionParcelHelper(settings.LIONPARCEL_API_KEY)
 
-        # get shipping ref code
-        if booking["success"]:
-            shipping_ref_code = booking["data"]["stt"][0]["stt_no"]
+    # get the orders with their shipping and items
+    orders = list(
+        Order.objects.filter(id__in=order_ids, status="confirmed")
+        .select_related("order_shipping")
+        .prefetch_related("order_items")
+    )
+
+    errors = {}
+    bookings = []
+    for order in orders:
+        order_items = order.order_items.all()
+        if not order_items:
+            errors[order.ref_code] = "Order items not found"
+            continue
+        bookings.append(
+            build_booking_data(order, order_items, order.order_shipping, contact)
+        )
 
-            # save shipping ref code
-            shipping.shipping_ref_code = shipping_ref_code
-            shipping.save()
+    stt_numbers = {}
+    batch_size = LionParcelHelper.BOOKING_BATCH_SIZE
+    for start in range(0, len(bookings), batch_size):
+        batch = bookings[start : start + batch_size]
+        ref_codes = [booking["stt_no_ref_external"] for booking in batch]
+        try:
+            booking = lionparcel.make_bookings(batch)
+            is_rejected = not booking.get("success")
+        except Exception as e:
+            is_rejected = is_booking_rejected(e)
+            if not is_rejected:
+                # timeouts, transport and server errors or an unparsable
+                # response: the batch may have been booked, don't book it again
+                errors.update({ref_code: str(e) for ref_code in ref_codes})
+                continue
+
+        if is_rejected:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    lambda booking_data: book_single_shipment(lionparcel, booking_data),
+                    batch,
+                )
+                for booked, failed in results:
+                    stt_numbers.update(booked)
+                    errors.update(failed)
         else:
-            raise serializers.ValidationError(booking["message"]["en"])
-    except Exception as e:
-        raise serializers.ValidationError(str(e))
+            try:
+                stt_numbers.update(get_booked_stt_numbers(booking, ref_codes))
+            except Exception as e:
+                # the batch was booked but its STT numbers can't be read
+                errors.update({ref_code: str(e) for ref_code in ref_codes})
+
+        for ref_code in ref_codes:
+            if ref_code not in stt_numbers and ref_code not in errors:
+                errors[ref_code] = "STT number not found in the booking"
+
+    # save the STT numbers and move the booked orders to shipping
+    booked_orders = [order for order in orders if order.ref_code in stt_numbers]
+    shippings = []
+    for order in booked_orders:
+        order.order_shipping.shipping_ref_code = stt_numbers[order.ref_code]
+        shippings.append(order.order_shipping)
+
+    with transaction.atomic():
+        OrderShipping.objects.bulk_update(shippings, ["shipping_ref_code"])
+        Order.objects.filter(id__in=[order.id for order in booked_orders]).update(
+            status="shipping"
+        )
 
-    return
+    return booked_orders, errors
 
 
 def send_order_confirmation_email(order_id):
@@ -189,3 +337,554 @@ def send_order_shipping_email(order_id):
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     return
+
+
+SALES_LEADERBOARD_CACHE_PREFIX = "sales_leaderboard"
+
+# leaderboard windows in days, None for all time
+SALES_WINDOWS = {
+    "7d": 7,
+    "30d": 30,
+    "all": None,
+}
+
+SALES_LEADERBOARD_FIELDS = ["brand", "category", "product"]
+
+
+SALES_LEADERBOARD_VERSION_KEY = f"{SALES_LEADERBOARD_CACHE_PREFIX}:version"
+
+
+def get_sales_leaderboard_version():
+    version = cache.get(SALES_LEADERBOARD_VERSION_KEY)
+    if version is None:
+        cache.add(SALES_LEADERBOARD_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(SALES_LEADERBOARD_VERSION_KEY)
+    return version
+
+
+def sales_leaderboard_cache_key(field, window, limit):
+    version = get_sales_leaderboard_version()
+    return f"{SALES_LEADERBOARD_CACHE_PREFIX}:{version}:{field}:{window}:{limit}"
+
+
+def invalidate_sales_leaderboard_cache():
+    # change the version of every leaderboard after the transaction is committed
+    transaction.on_commit(
+        lambda: cache.set(SALES_LEADERBOARD_VERSION_KEY, uuid.uuid4().hex, None)
+    )
+
+
+def add_product_sales(product_id, brand_id, category_id, date, quantity):
+    sales = ProductSales.objects.filter(product_id=product_id, date=date)
+    if sales.update(quantity=F("quantity") + quantity):
+        return
+
+    try:
+        with transaction.atomic():
+            ProductSales.objects.create(
+                product_id=product_id,
+                brand_id=brand_id,
+                category_id=category_id,
+                date=date,
+                quantity=quantity,
+            )
+    except IntegrityError:
+        # created by a concurrent settlement
+        sales.update(quantity=F("quantity") + quantity)
+
+
+def record_order_sales(order, settled_at, sign=1):
+    """
+    Add the items of a settled order to the sales rollup on its settlement
+    day, or remove them with a negative sign when the order leaves settlement
+    """
+    date = timezone.localdate(settled_at)
+    order_items = OrderItem.objects.filter(order=order).values(
+        "product_id", "product__brand_id", "product__category_id", "quantity"
+    )
+
+    # sum the quantity per product first
+    quantities = defaultdict(int)
+    for item in order_items:
+        key = (
+            item["product_id"],
+            item["product__brand_id"],
+            item["product__category_id"],
+        )
+        quantities[key] += item["quantity"]
+
+    for (product_id, brand_id, category_id), quantity in quantities.items():
+        add_product_sales(product_id, brand_id, category_id, date, quantity * sign)
+
+    invalidate_sales_leaderboard_cache()
+
+
+def record_order_settlement(order):
+    """
+    Mark the order as settled now and add it to the sales rollup, only once
+    when concurrent saves settle the same order
+    """
+    settled_at = timezone.now()
+    if not Order.objects.filter(id=order.id, settled_at__isnull=True).update(
+        settled_at=settled_at
+    ):
+        return
+
+    order.settled_at = settled_at
+    record_order_sales(order, settled_at)
+
+
+def revert_order_settlement(order):
+    """
+    Unmark the order as settled and remove it from the sales rollup of its
+    settlement day, only once when concurrent saves unsettle the same order
+    """
+    settled_at = (
+        Order.objects.filter(id=order.id).values_list("settled_at", flat=True).first()
+    )
+    if settled_at is None:
+        return
+    if not Order.objects.filter(id=order.id, settled_at=settled_at).update(
+        settled_at=None
+    ):
+        return
+
+    order.settled_at = None
+    record_order_sales(order, settled_at, sign=-1)
+
+
+def get_sales_leaderboard(field, window="all", limit=5):
+    """
+    Get the top brands, categories or products by units sold in the window,
+    as a list of (id, total sales) sorted from the best seller
+    """
+    if window not in SALES_WINDOWS:
+        raise serializers.ValidationError(
+            f"Window must be one of {', '.join(SALES_WINDOWS)}"
+        )
+
+    sales = ProductSales.objects.all()
+    days = SALES_WINDOWS[window]
+    if days:
+        since = timezone.localdate() - datetime.timedelta(days=days - 1)
+        sales = sales.filter(date__gte=since)
+
+    leaderboard = (
+        sales.values(f"{field}_id")
+        .annotate(total_sales=Sum("quantity"))
+        .filter(total_sales__gt=0)
+        .order_by("-total_sales")[:limit]
+    )
+    return [(row[f"{field}_id"], row["total_sales"]) for row in leaderboard]
+
+
+def get_cached_sales_leaderboard(field, window, limit, build):
+    """
+    Get the serialized leaderboard from cache, or build it with
+    build(leaderboard) and cache it
+    """
+    cache_key = sales_leaderboard_cache_key(field, window, limit)
+    data = cache.get(cache_key)
+    if data is None:
+        data = build(get_sales_leaderboard(field, window, limit))
+        cache.set(cache_key, data, settings.SALES_LEADERBOARD_CACHE_TIMEOUT)
+    return data
+
+
+# payment statuses that commit or release the reserved stock of an order
+RESERVATION_COMMIT_STATUSES = ["capture", "settlement"]
+RESERVATION_RELEASE_STATUSES = ["cancel", "expire", "expired", "deny", "failure"]
+
+
+def update_stock_products(product_ids):
+    # stock is changed by queryset updates, so refresh the products manually
+    Product.update_stock_summaries(list(product_ids))
+    invalidate_product_detail_cache_by_ids(product_ids)
+
+
+def stock_quantity_case(quantities):
+    # the quantity of each stock id, to update many stocks in one query
+    return Case(
+        *[
+            When(id=stock_id, then=Value(quantity))
+            for stock_id, quantity in quantities.items()
+        ],
+        output_field=IntegerField(),
+    )
+
+
+def reserve_stock(order, items):
+    """
+    Reserve the stock of (stock, quantity) items for the order with one
+    conditional decrement, all or nothing. Raise ValidationError when
+    any stock is not sufficient.
+    """
+    quantities = defaultdict(int)
+    stocks = {}
+    for stock, quantity in items:
+        quantities[stock.id] += quantity
+        stocks[stock.id] = stock
+
+    with transaction.atomic():
+        quantity = stock_quantity_case(quantities)
+        updated = Stock.objects.filter(
+            id__in=quantities, quantity__gte=quantity
+        ).update(quantity=F("quantity") - quantity)
+
+        if updated != len(quantities):
+            # raising rolls back the stock already decremented
+            available = dict(
+                Stock.objects.filter(id__in=quantities).values_list("id", "quantity")
+            )
+            short = [
+                stocks[stock_id].sku
+                for stock_id in quantities
+                if available.get(stock_id, 0) < quantities[stock_id]
+            ]
+            raise serializers.ValidationError(
+                f"Stock of {', '.join(short)} is not sufficient"
+            )
+
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(order=order, stock_id=stock_id, quantity=quantity)
+                for stock_id, quantity in quantities.items()
+            ]
+        )
+        update_stock_products({stock.product_id for stock in stocks.values()})
+
+
+def commit_stock_reservation(order):
+    """
+    Keep the reserved stock of a paid order
+    """
+    StockReservation.objects.filter(order=order, status="reserved").update(
+        status="committed"
+    )
+
+
+def release_stock_reservation(order):
+    """
+    Give the reserved stock of an unpaid order back, only once
+    """
+    with transaction.atomic():
+        reservations = list(
+            StockReservation.objects.select_for_update()
+            .filter(order=order, status="reserved")
+            .values_list("id", "stock_id", "quantity")
+        )
+        if not reservations:
+            return
+
+        quantities = {stock_id: quantity for _, stock_id, quantity in reservations}
+        Stock.objects.filter(id__in=quantities).update(
+            quantity=F("quantity") + stock_quantity_case(quantities)
+        )
+
+        StockReservation.objects.filter(
+            id__in=[reservation_id for reservation_id, _, _ in reservations]
+        ).update(status="released")
+
+        product_ids = Stock.objects.filter(id__in=quantities).values_list(
+            "product_id", flat=True
+        )
+        update_stock_products(set(product_ids))
+
+
+def create_order_items(order, cart_items):
+    """
+    Create the order items from cart items selected with their stock and
+    product, in one query
+    """
+    order_items = []
+    for cart_item in cart_items:
+        stock = cart_item.stock
+        order_items.append(
+            OrderItem(
+                order=order,
+                quantity=cart_item.quantity,
+                product=cart_item.product,
+                product_name=cart_item.product.name,
+                stock=stock,
+                stock_discount=stock.discount or 0,
+                stock_sku=stock.sku,
+                stock_price=stock.price,
+                product_cover=cart_item.product.cover or None,
+                stock_size=stock.size or None,
+                stock_color=stock.color or None,
+                stock_color_code=stock.color_code or None,
+                stock_variant=stock.variant or None,
+                stock_weight=stock.weight or 0,
+                stock_length=stock.length or 0,
+                stock_width=stock.width or 0,
+                stock_height=stock.height or 0,
+                # bulk_create skips save(), so set the total price here
+                total_price=stock.price * cart_item.quantity,
+            )
+        )
+    return OrderItem.objects.bulk_create(order_items)
+
+
+def get_rated_product_ids(user, product_ids):
+    """
+    Get the ids of the given products already rated by the user, in one query,
+    from the purchased products, or from the ratings of the products without
+    a purchased product yet (before rebuild_purchased_products has run)
+    """
+    if not user.is_authenticated:
+        return set()
+
+    purchases = PurchasedProduct.objects.filter(user=user, product=OuterRef("pk"))
+    ratings = Rating.objects.filter(user=user, product=OuterRef("pk"))
+    return set(
+        Product.objects.filter(id__in=product_ids)
+        .filter(
+            Exists(purchases.filter(is_rated=True))
+            | (~Exists(purchases) & Exists(ratings))
+        )
+        .values_list("id", flat=True)
+    )
+
+
+def record_purchased_products(order):
+    """
+    Add the products of a settled order to the purchased products of its user
+    """
+    product_ids = set(
+        OrderItem.objects.filter(order=order).values_list("product_id", flat=True)
+    )
+    rated_product_ids = set(
+        Rating.objects.filter(
+            user_id=order.user_id, product_id__in=product_ids
+        ).values_list("product_id", flat=True)
+    )
+
+    # the products bought in an earlier order are kept as they are
+    PurchasedProduct.objects.bulk_create(
+        [
+            PurchasedProduct(
+                user_id=order.user_id,
+                product_id=product_id,
+                is_rated=product_id in rated_product_ids,
+            )
+            for product_id in product_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def remove_purchased_products(order):
+    """
+    Remove the products of an order leaving settlement from the purchased
+    products of its user, unless they are in another settled order
+    """
+    product_ids = OrderItem.objects.filter(order=order).values_list(
+        "product_id", flat=True
+    )
+    settled_product_ids = (
+        OrderItem.objects.filter(
+            order__user_id=order.user_id,
+            order__payment_status="settlement",
+            product_id__in=product_ids,
+        )
+        .exclude(order=order)
+        .values_list("product_id", flat=True)
+    )
+    PurchasedProduct.objects.filter(
+        user_id=order.user_id, product_id__in=product_ids
+    ).exclude(product_id__in=settled_product_ids).delete()
+
+
+def update_purchased_product_rating(user_id, product_id):
+    # set if the user has rated the purchased product
+    PurchasedProduct.objects.filter(user_id=user_id, product_id=product_id).update(
+        is_rated=Exists(Rating.objects.filter(user_id=user_id, product_id=product_id))
+    )
+
+
+def is_purchased_product(user, product_id):
+    return PurchasedProduct.objects.filter(user=user, product_id=product_id).exists()
+
+
+def get_products_to_review(user):
+    # get the purchased products the user hasn't rated yet, newest first
+    return [
+        purchase.product
+        for purchase in PurchasedProduct.objects.filter(user=user, is_rated=False)
+        .select_related("product__brand")
+        .order_by("-created_at")
+    ]
+
+
+CHECKOUT_QUOTE_SALT = "apps.orders.checkout_quote"
+
+
+def get_checkout_cart_items(user):
+    """
+    Get the selected cart lines of the user with their stock and product
+    """
+    cart_items = list(
+        CartItem.objects.filter(cart__user=user, is_selected=True).select_related(
+            "stock", "product"
+        )
+    )
+    if not cart_items:
+        raise serializers.ValidationError({"error": "No item found in the cart"})
+    return cart_items
+
+
+def get_default_shipping(user):
+    try:
+        return Shipping.objects.select_related("destination").get(
+            user=user, is_default=True
+        )
+    except Shipping.DoesNotExist:
+        raise serializers.ValidationError({"error": "Default shipping is not set"})
+
+
+def get_cart_version(cart_items, shipping):
+    """
+    Hash the cart lines, their current price and the shipping destination,
+    so a quote is only used for the cart it was computed for
+    """
+    lines = sorted(
+        f"{cart_item.id}:{cart_item.stock_id}:{cart_item.quantity}:"
+        f"{cart_item.total_price}:{cart_item.stock.weight}"
+        for cart_item in cart_items
+    )
+    lines.append(f"{shipping.id}:{shipping.destination_id}")
+    return hashlib.sha256("|".join(lines).encode()).hexdigest()
+
+
+def get_shipping_tariff(total_weight, shipping, shipping_type_code):
+    """
+    Get the LionParcel tariff of the shipping type to the shipping destination
+    """
+    try:
+        registered_shipping_type = ShippingType.objects.get(code=shipping_type_code)
+    except ShippingType.DoesNotExist:
+        raise serializers.ValidationError({"error": "Shipping type is not found"})
+
+    try:
+        original_tariff = lionparcel_original_tariff(total_weight, shipping)
+        if isinstance(original_tariff, Response):
+            raise serializers.ValidationError(original_tariff.data)
+        response = lionparcel_tariff_mapping(original_tariff)
+        if isinstance(response, Response):
+            raise serializers.ValidationError(response.data)
+    except serializers.ValidationError:
+        raise
+    except Exception as e:
+        raise serializers.ValidationError({"error": str(e)})
+
+    # search the shipping type in response list
+    tariff = {
+        "shipping_type": None,
+        "shipping_type_name": None,
+        "shipping_cost": 0,
+        "shipping_estimation": None,
+    }
+    for item in response:
+        if item.get("shipping_type") == registered_shipping_type.code:
+            tariff = {
+                "shipping_type": item.get("shipping_type"),
+                "shipping_type_name": item.get("shipping_type_name"),
+                "shipping_cost": item.get("total_tariff"),
+                "shipping_estimation": item.get("estimasi_sla"),
+            }
+    return tariff
+
+
+def build_checkout_quote(
+    user, cart_items, shipping, coupon_code_input, coupon_code_input2, shipping_type
+):
+    """
+    Calculate the subtotal, coupon discount, shipping tariff and total of
+    the checkout
+    """
+    subtotal_amount = 0
+    total_weight = 0
+    for cart_item in cart_items:
+        subtotal_amount += cart_item.total_price
+        total_weight += cart_item.stock.weight * cart_item.quantity
+
+    # convert to kg
+    if total_weight > 0:
+        total_weight = math.ceil(total_weight / 1000)
+
+    coupons, total_discount, total_paid = evaluate_coupons(
+        user, subtotal_amount, [coupon_code_input, coupon_code_input2]
+    )
+    tariff = get_shipping_tariff(total_weight, shipping, shipping_type)
+
+    # calculate tax amount
+    # tax_amount = math.ceil(((subtotal_amount + shipping_cost) * 10) / 100)
+    tax_amount = 0
+
+    return {
+        "user": str(user.pk),
+        "cart_version": get_cart_version(cart_items, shipping),
+        "coupon": coupon_code_input or None,
+        "coupon2": coupon_code_input2 or None,
+        "coupons": [str(coupon.id) for coupon in coupons],
+        "requested_shipping_type": shipping_type,
+        **tariff,
+        "subtotal_amount": subtotal_amount,
+        "total_discount": total_discount,
+        "total_paid": total_paid,
+        "tax_amount": tax_amount,
+        "total_amount": total_paid + tariff["shipping_cost"] + tax_amount,
+        "total_weight": total_weight,
+    }
+
+
+def sign_checkout_quote(quote):
+    return signing.dumps(quote, salt=CHECKOUT_QUOTE_SALT, compress=True)
+
+
+def load_checkout_quote(
+    quote_id,
+    user,
+    cart_items,
+    shipping,
+    coupon_code_input,
+    coupon_code_input2,
+    shipping_type,
+):
+    """
+    Get the quote of the signed quote id when it is still fresh and was
+    computed for the same user, cart, coupons and shipping type, with its
+    coupons validated again, otherwise return None to compute it again
+    """
+    try:
+        quote = signing.loads(
+            quote_id, salt=CHECKOUT_QUOTE_SALT, max_age=settings.CHECKOUT_QUOTE_MAX_AGE
+        )
+    except signing.SignatureExpired:
+        return None
+    except signing.BadSignature:
+        raise serializers.ValidationError({"error": "Quote is not valid"})
+
+    if (
+        quote.get("user") != str(user.pk)
+        or quote.get("cart_version") != get_cart_version(cart_items, shipping)
+        or quote.get("coupon") != (coupon_code_input or None)
+        or quote.get("coupon2") != (coupon_code_input2 or None)
+        or quote.get("requested_shipping_type") != shipping_type
+    ):
+        return None
+
+    # check the coupons again, they may be deactivated or expired since,
+    # the coupon limits are checked again when the coupons are redeemed
+    if quote["coupon"] or quote["coupon2"]:
+        coupons, total_discount, total_paid = evaluate_coupons(
+            user, quote["subtotal_amount"], [quote["coupon"], quote["coupon2"]]
+        )
+        quote.update(
+            coupons=[str(coupon.id) for coupon in coupons],
+            total_discount=total_discount,
+            total_paid=total_paid,
+            total_amount=total_paid + quote["shipping_cost"] + quote["tax_amount"],
+        )
+
+    return quote
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.orders.models import OrderItem, PurchasedProduct
+from apps.products.models import Rating
+
+
+class Command(BaseCommand):
+    help = "Rebuild the purchased products of the users from all settled orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of purchased products inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        purchases = (
+            OrderItem.objects.filter(order__payment_status="settlement")
+            .values_list("order__user_id", "product_id")
+            .distinct()
+            .iterator()
+        )
+        rated = set(Rating.objects.values_list("user_id", "product_id").iterator())
+
+        purchased_products = [
+            PurchasedProduct(
+                user_id=user_id,
+                product_id=product_id,
+                is_rated=(user_id, product_id) in rated,
+            )
+            for user_id, product_id in purchases
+        ]
+
+        with transaction.atomic():
+            PurchasedProduct.objects.all().delete()
+            PurchasedProduct.objects.bulk_create(
+                purchased_products, batch_size=options["batch_size"]
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt purchased products with {len(purchased_products)} rows"
+            )
+        )
@@ -0,0 +1,77 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderItem, ProductSales
+from apps.orders.helpers import invalidate_sales_leaderboard_cache
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily product sales rollup from all settled orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rollup rows inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        # mark the settled orders without a settlement time, and unmark the others
+        Order.objects.filter(
+            payment_status="settlement", settled_at__isnull=True
+        ).update(settled_at=F("created_at"))
+        Order.objects.exclude(payment_status="settlement").filter(
+            settled_at__isnull=False
+        ).update(settled_at=None)
+
+        order_items = (
+            OrderItem.objects.filter(order__payment_status="settlement")
+            .values(
+                "product_id",
+                "product__brand_id",
+                "product__category_id",
+                "order__settled_at",
+                "quantity",
+            )
+            .iterator()
+        )
+
+        # sum the quantity per product and local settlement date
+        quantities = defaultdict(int)
+        for item in order_items:
+            key = (
+                item["product_id"],
+                item["product__brand_id"],
+                item["product__category_id"],
+                timezone.localdate(item["order__settled_at"]),
+            )
+            quantities[key] += item["quantity"]
+
+        sales = [
+            ProductSales(
+                product_id=product_id,
+                brand_id=brand_id,
+                category_id=category_id,
+                date=date,
+                quantity=quantity,
+            )
+            for (
+                product_id,
+                brand_id,
+                category_id,
+                date,
+            ), quantity in quantities.items()
+        ]
+
+        with transaction.atomic():
+            ProductSales.objects.all().delete()
+            ProductSales.objects.bulk_create(sales, batch_size=options["batch_size"])
+            invalidate_sales_leaderboard_cache()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt sales rollup with {len(sales)} rows")
+        )
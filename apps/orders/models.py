@@ -4,7 +4,7 @@ import uuid
 import secrets
 from tools.filestorage_helper import GridFSStorage
 
-from apps.products.models import Product, Stock
+from apps.products.models import Product, Stock, Brand, Category
 from apps.shipping.models import Shipping
 
 User = get_user_model()
@@ -30,6 +30,12 @@ PAYMENT_STATUS_CHOICES = (
     ("partial_refund", "Partial Refund"),
 )
 
+RESERVATION_STATUS_CHOICES = (
+    ("reserved", "Reserved"),
+    ("committed", "Committed"),
+    ("released", "Released"),
+)
+
 RETURN_REFUND_STATUS_CHOICES = (
     ("pending", "Pending"),
     ("confirmed", "Confirmed"),
@@ -60,6 +66,12 @@ class Order(models.Model):
     total_amount = models.PositiveIntegerField(default=0)
     total_weight = models.PositiveIntegerField(default=0)
     note = models.TextField(null=True, blank=True)
+    # set once when the payment settles, see record_order_settlement()
+    settled_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        # keyset cursor pagination of the orders of a user
+        indexes = [models.Index(fields=["user", "-created_at", "-id"])]
 
     def __str__(self):
         return f"{self.user.email} - {self.ref_code}"
@@ -76,6 +88,14 @@ class Order(models.Model):
     def save(self, *args, **kwargs):
         if not self.ref_code:
             self.ref_code = self.generate_ref_code()
+
+        # don't write back a settlement mark loaded before the order settled
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "settled_at"
+            ]
         super().save(*args, **kwargs)
 
 
@@ -104,6 +124,26 @@ class OrderShipping(models.Model):
         return f"{self.order.ref_code} - {self.destination_route}"
 
 
+class ShipmentTracking(models.Model):
+    """
+    Latest LionParcel tracking of a shipment, stored by the
+    poll_shipment_tracking command so it is read without calling LionParcel
+    """
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
+    )
+    order_shipping = models.OneToOneField(
+        OrderShipping, on_delete=models.CASCADE, related_name="tracking"
+    )
+    current_status = models.CharField(max_length=100, null=True, blank=True)
+    history = models.JSONField(default=list, blank=True)
+    polled_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.order_shipping.shipping_ref_code} - {self.current_status}"
+
+
 class OrderItem(models.Model):
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4, editable=False, db_index=True
@@ -143,6 +183,37 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class StockReservation(models.Model):
+    """
+    Stock quantity taken by an order at checkout. Committed when the order
+    is paid, or released back to the stock when the payment fails.
+    """
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
+    )
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="stock_reservations"
+    )
+    stock = models.ForeignKey(
+        Stock, on_delete=models.PROTECT, related_name="stock_reservations"
+    )
+    quantity = models.PositiveIntegerField(default=0)
+    status = models.TextField(choices=RESERVATION_STATUS_CHOICES, default="reserved")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "stock"], name="unique_order_stock_reservation"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.order.ref_code} - {self.stock.sku} - {self.status}"
+
+
 class ReturnOrder(models.Model):
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4, editable=False, db_index=True
@@ -207,3 +278,73 @@ class RefundOrder(models.Model):
     def delete(self, *args, **kwargs):
         self.refund_receipt.delete()
         super(RefundOrder, self).delete(*args, **kwargs)
+
+
+class ProductSales(models.Model):
+    """
+    Daily rollup of the units sold per product from settled orders, by the
+    settlement date. Kept in sync when an order enters or leaves settlement,
+    use the rebuild_sales_rollup command to recalculate it.
+    """
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="product_sales"
+    )
+    brand = models.ForeignKey(
+        Brand, on_delete=models.CASCADE, related_name="brand_sales"
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="category_sales"
+    )
+    date = models.DateField(db_index=True)
+    quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "product sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "date"], name="unique_product_sales_date"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["date", "brand"]),
+            models.Index(fields=["date", "category"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product.slug} - {self.date} - {self.quantity}"
+
+
+class PurchasedProduct(models.Model):
+    """
+    Products bought by each user in a settled order, with whether the user
+    has rated them. Kept in sync when an order enters or leaves settlement,
+    use the rebuild_purchased_products command to recalculate it.
+    """
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="purchased_products"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="purchases"
+    )
+    is_rated = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "product"], name="unique_user_purchased_product"
+            )
+        ]
+        indexes = [models.Index(fields=["user", "is_rated"])]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.product.slug}"
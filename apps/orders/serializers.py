@@ -20,6 +20,11 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def get_is_rated(self, obj):
+        # use the rated products of the user when loaded in one query
+        rated_product_ids = self.context.get("rated_product_ids")
+        if rated_product_ids is not None:
+            return obj.product_id in rated_product_ids
+
         request = self.context.get("request")
         user = request.user
         if user.is_authenticated:
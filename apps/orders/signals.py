@@ -0,0 +1,75 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.products.models import Rating
+from .models import Order
+from .helpers import (
+    record_order_settlement,
+    revert_order_settlement,
+    record_purchased_products,
+    remove_purchased_products,
+    update_purchased_product_rating,
+    commit_stock_reservation,
+    release_stock_reservation,
+    RESERVATION_COMMIT_STATUSES,
+    RESERVATION_RELEASE_STATUSES,
+)
+
+
+# Keep the previous payment status to detect settlement changes
+@receiver(pre_save, sender=Order)
+def keep_previous_payment_status(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._previous_payment_status = None
+    else:
+        instance._previous_payment_status = (
+            Order.objects.filter(id=instance.id)
+            .values_list("payment_status", flat=True)
+            .first()
+        )
+
+
+# Update the sales rollup when an order enters or leaves settlement
+@receiver(post_save, sender=Order)
+def update_order_sales(sender, instance, **kwargs):
+    previous_status = getattr(instance, "_previous_payment_status", None)
+    if previous_status == instance.payment_status:
+        return
+
+    if instance.payment_status == "settlement":
+        record_order_settlement(instance)
+    else:
+        revert_order_settlement(instance)
+
+
+# Update the purchased products when an order enters or leaves settlement
+@receiver(post_save, sender=Order)
+def update_order_purchased_products(sender, instance, **kwargs):
+    previous_status = getattr(instance, "_previous_payment_status", None)
+    if previous_status == instance.payment_status:
+        return
+
+    if instance.payment_status == "settlement":
+        record_purchased_products(instance)
+    elif previous_status == "settlement":
+        remove_purchased_products(instance)
+
+
+# Flag the purchased product of the rating as rated or not
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def update_rating_purchased_products(sender, instance, **kwargs):
+    update_purchased_product_rating(instance.user_id, instance.product_id)
+
+
+# Commit or release the reserved stock when the payment status changes
+@receiver(post_save, sender=Order)
+def update_order_stock_reservation(sender, instance, **kwargs):
+    previous_status = getattr(instance, "_previous_payment_status", None)
+    if previous_status == instance.payment_status:
+        return
+
+    if instance.payment_status in RESERVATION_COMMIT_STATUSES:
+        commit_stock_reservation(instance)
+    elif instance.payment_status in RESERVATION_RELEASE_STATUSES:
+        release_stock_reservation(instance)
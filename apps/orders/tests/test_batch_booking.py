@@ -0,0 +1,222 @@
+import pytest
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from apps.orders.helpers import lionparcel_batch_booking
+from apps.orders.models import Order, OrderItem, OrderShipping
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+)
+from apps.shipping.models import Shipping, ShippingRoute
+from apps.store.models import Contact
+from tools.lionparcel_helper import LionParcelHelper
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def contact(db):
+    return Contact.objects.create(
+        name="Store",
+        phone="0800",
+        email="store@example.com",
+        whatsapp="0800",
+        facebook="store",
+        instagram="store",
+        twitter="store",
+        tiktok="store",
+        latitude=0,
+        longitude=0,
+        address="Store Address",
+        origin="Origin",
+        is_active=True,
+    )
+
+
+@pytest.fixture
+def confirmed_orders(db):
+    user = User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    product = Product.objects.create(
+        name="Product",
+        description="Product",
+        brand=brand,
+        category=category,
+        subcategory=subcategory,
+        subsubcategory=subsubcategory,
+    )
+    stock = Stock.objects.create(product=product, sku="SKU-1", price=1000)
+    shipping = Shipping.objects.create(
+        user=user,
+        receiver_name="Receiver",
+        receiver_phone="0800",
+        receiver_address="Address",
+        destination=ShippingRoute.objects.create(route="Route"),
+    )
+
+    def create(count):
+        orders = []
+        for _ in range(count):
+            order = Order.objects.create(user=user, status="confirmed")
+            OrderShipping.objects.create(
+                order=order,
+                shipping=shipping,
+                receiver_name="Receiver",
+                receiver_phone="0800",
+                receiver_address="Address",
+                destination_route="Route",
+                shipping_type="REGPACK",
+            )
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                stock=stock,
+                product_name=product.name,
+                stock_weight=1,
+            )
+            orders.append(order)
+        return orders
+
+    return create
+
+
+def http_error(status_code, message):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(message, response=response)
+
+
+def booked_stt(booking_data):
+    return {
+        "stt_no": f"STT-{booking_data['stt_no_ref_external']}",
+        "stt_no_ref_external": booking_data["stt_no_ref_external"],
+    }
+
+
+@pytest.mark.django_db
+def test_batch_booking_books_orders_in_chunks(
+    contact, confirmed_orders, monkeypatch, django_assert_max_num_queries
+):
+    # Arrange
+    monkeypatch.setattr(LionParcelHelper, "BOOKING_BATCH_SIZE", 2)
+    batches = []
+
+    def make_bookings(self, bookings):
+        batches.append(len(bookings))
+        return {"success": True, "data": {"stt": [booked_stt(b) for b in bookings]}}
+
+    monkeypatch.setattr(LionParcelHelper, "make_bookings", make_bookings)
+    orders = confirmed_orders(5)
+
+    # Act: contact, orders, items, shipping bulk update and status update
+    with django_assert_max_num_queries(7):
+        booked_orders, errors = lionparcel_batch_booking([o.id for o in orders])
+
+    # Assert
+    assert batches == [2, 2, 1]
+    assert errors == {}
+    assert len(booked_orders) == 5
+    for order in orders:
+        order.refresh_from_db()
+        assert order.status == "shipping"
+        assert order.order_shipping.shipping_ref_code == f"STT-{order.ref_code}"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("is_raised", [False, True])
+def test_batch_booking_falls_back_to_single_bookings(
+    contact, confirmed_orders, monkeypatch, is_raised
+):
+    # Arrange: the batch is rejected in the body or with a 4xx
+    orders = confirmed_orders(3)
+    rejected = orders[1].ref_code
+
+    def make_bookings(self, bookings):
+        if is_raised:
+            raise http_error(400, "Batch rejected")
+        return {"success": False, "message": {"en": "Batch rejected"}}
+
+    def make_booking(self, booking_data):
+        if booking_data["stt_no_ref_external"] == rejected:
+            return {"success": False, "message": {"en": "Invalid destination"}}
+        return {"success": True, "data": {"stt": [booked_stt(booking_data)]}}
+
+    monkeypatch.setattr(LionParcelHelper, "make_bookings", make_bookings)
+    monkeypatch.setattr(LionParcelHelper, "make_booking", make_booking)
+
+    # Act
+    booked_orders, errors = lionparcel_batch_booking([o.id for o in orders])
+
+    # Assert
+    assert {order.ref_code for order in booked_orders} == {
+        orders[0].ref_code,
+        orders[2].ref_code,
+    }
+    assert errors == {rejected: "Invalid destination"}
+    assert Order.objects.get(id=orders[1].id).status == "confirmed"
+    assert Order.objects.filter(status="shipping").count() == 2
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "error",
+    [
+        requests.ConnectionError("Connection reset"),
+        http_error(502, "Bad gateway"),
+        requests.JSONDecodeError("Expecting value", "<html>", 0),
+    ],
+)
+def test_batch_booking_does_not_book_a_failed_batch_again(
+    contact, confirmed_orders, monkeypatch, error
+):
+    # Arrange: the batch may have been booked before the request failed
+    orders = confirmed_orders(2)
+    single_bookings = []
+
+    def make_bookings(self, bookings):
+        raise error
+
+    def make_booking(self, booking_data):
+        single_bookings.append(booking_data["stt_no_ref_external"])
+        return {"success": True, "data": {"stt": [booked_stt(booking_data)]}}
+
+    monkeypatch.setattr(LionParcelHelper, "make_bookings", make_bookings)
+    monkeypatch.setattr(LionParcelHelper, "make_booking", make_booking)
+
+    # Act
+    booked_orders, errors = lionparcel_batch_booking([o.id for o in orders])
+
+    # Assert
+    assert single_bookings == []
+    assert booked_orders == []
+    assert errors == {order.ref_code: str(error) for order in orders}
+    assert not Order.objects.filter(status="shipping").exists()
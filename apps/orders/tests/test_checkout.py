@@ -0,0 +1,226 @@
+import datetime
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.cart.models import Cart, CartItem
+from apps.coupons.models import Coupon, DiscountType
+from apps.orders.models import Order, OrderItem, StockReservation
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+)
+from apps.shipping.models import Shipping, ShippingRoute, ShippingType
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def tariff_calls(monkeypatch):
+    # the shipping tariff comes from the LionParcel API
+    calls = []
+
+    def original_tariff(weight, shipping):
+        calls.append(weight)
+        return {}
+
+    monkeypatch.setattr(
+        "apps.orders.helpers.lionparcel_original_tariff", original_tariff
+    )
+    monkeypatch.setattr(
+        "apps.orders.helpers.lionparcel_tariff_mapping",
+        lambda response: [
+            {
+                "shipping_type": "REGPACK",
+                "shipping_type_name": "Regular",
+                "total_tariff": 10000,
+                "estimasi_sla": "2-3 days",
+            }
+        ],
+    )
+    return calls
+
+
+@pytest.fixture
+def taxonomy(db):
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    return brand, category, subcategory, subsubcategory
+
+
+def create_customer(email, taxonomy, lines, quantity=1):
+    brand, category, subcategory, subsubcategory = taxonomy
+    user = User.objects.create_user(
+        email=email, password="password", first_name="Test", last_name="User"
+    )
+    route = ShippingRoute.objects.create(route=f"Route {email}")
+    Shipping.objects.create(
+        user=user,
+        receiver_name="Receiver",
+        receiver_phone="0800",
+        receiver_address="Address",
+        destination=route,
+    )
+    cart, _ = Cart.objects.get_or_create(user=user)
+    for index in range(lines):
+        product = Product.objects.create(
+            name=f"Product {email} {index}",
+            description="Product",
+            brand=brand,
+            category=category,
+            subcategory=subcategory,
+            subsubcategory=subsubcategory,
+            is_active=True,
+        )
+        stock = Stock.objects.create(
+            product=product, sku=f"SKU-{email}-{index}", price=1000, quantity=2
+        )
+        CartItem.objects.create(
+            cart=cart, stock=stock, quantity=quantity, is_selected=True
+        )
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def checkout(client, **data):
+    data = {"shipping_type": "REGPACK", **data}
+    return client.post("/api/v1/order/", data, format="json")
+
+
+def quote(client, **data):
+    data = {"shipping_type": "REGPACK", **data}
+    return client.post("/api/v1/checkout-quote/", data, format="json")
+
+
+@pytest.mark.django_db
+def test_checkout_query_count_is_constant(taxonomy):
+    # Arrange
+    ShippingType.objects.create(name="Regular", code="REGPACK")
+    small_cart = create_customer("small@example.com", taxonomy, lines=1)
+    large_cart = create_customer("large@example.com", taxonomy, lines=6)
+
+    # Act
+    with CaptureQueriesContext(connection) as small_queries:
+        small_response = checkout(small_cart)
+    with CaptureQueriesContext(connection) as large_queries:
+        large_response = checkout(large_cart)
+
+    # Assert
+    assert small_response.status_code == 201
+    assert large_response.status_code == 201
+    assert len(large_queries) == len(small_queries)
+    assert OrderItem.objects.count() == 7
+    assert StockReservation.objects.count() == 7
+    assert set(Stock.objects.values_list("quantity", flat=True)) == {1}
+    assert not CartItem.objects.exists()
+
+
+@pytest.mark.django_db
+def test_checkout_short_stock_rolls_back(taxonomy):
+    # Arrange
+    ShippingType.objects.create(name="Regular", code="REGPACK")
+    client = create_customer("short@example.com", taxonomy, lines=2, quantity=3)
+
+    # Act
+    response = checkout(client)
+
+    # Assert
+    assert response.status_code == 400
+    assert not Order.objects.exists()
+    assert set(Stock.objects.values_list("quantity", flat=True)) == {2}
+    assert CartItem.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_checkout_with_quote_skips_tariff_call(taxonomy, tariff_calls):
+    # Arrange
+    ShippingType.objects.create(name="Regular", code="REGPACK")
+    client = create_customer("quote@example.com", taxonomy, lines=2)
+    quote_response = quote(client)
+
+    # Act
+    response = checkout(client, quote_id=quote_response.data["quote_id"])
+
+    # Assert
+    assert quote_response.status_code == 200
+    assert quote_response.data["total_amount"] == 12000
+    assert response.status_code == 201
+    assert response.data["total_amount"] == 12000
+    assert len(tariff_calls) == 1
+
+
+@pytest.mark.django_db
+def test_checkout_with_stale_quote_recalculates(taxonomy, tariff_calls):
+    # Arrange
+    ShippingType.objects.create(name="Regular", code="REGPACK")
+    client = create_customer("stale@example.com", taxonomy, lines=2)
+    quote_id = quote(client).data["quote_id"]
+    cart_item = CartItem.objects.first()
+    cart_item.increase_quantity()
+
+    # Act
+    tampered_response = checkout(client, quote_id=f"{quote_id}x")
+    response = checkout(client, quote_id=quote_id)
+
+    # Assert
+    assert tampered_response.status_code == 400
+    assert tampered_response.data["error"] == "Quote is not valid"
+    assert response.status_code == 201
+    assert response.data["total_amount"] == 13000
+    assert len(tariff_calls) == 2
+
+
+@pytest.mark.django_db
+def test_checkout_with_quote_checks_coupons_again(taxonomy, tariff_calls):
+    # Arrange
+    ShippingType.objects.create(name="Regular", code="REGPACK")
+    client = create_customer("coupon@example.com", taxonomy, lines=2)
+    now = timezone.now()
+    coupon = Coupon.objects.create(
+        name="Promo",
+        prefix_code="PROMO123",
+        discount_type=DiscountType.objects.create(name="Percent"),
+        discount_value=10,
+        valid_from=now - datetime.timedelta(days=1),
+        valid_to=now + datetime.timedelta(days=1),
+    )
+    code = coupon.prefix_code + coupon.decode_coupon_code(coupon.code)
+    quote_response = quote(client, coupon=code)
+
+    # Act: the coupon is deactivated before the checkout
+    Coupon.objects.filter(pk=coupon.pk).update(is_active=False)
+    response = checkout(client, coupon=code, quote_id=quote_response.data["quote_id"])
+
+    # Assert
+    assert quote_response.status_code == 200
+    assert quote_response.data["total_discount"] == 200
+    assert response.status_code == 400
+    assert response.data["error"] == "Coupon is not valid"
+    assert not Order.objects.exists()
+    assert len(tariff_calls) == 1
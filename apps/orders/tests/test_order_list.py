@@ -0,0 +1,138 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.orders.models import Order, OrderItem, OrderShipping, PurchasedProduct
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+    Rating,
+)
+from apps.shipping.models import Shipping, ShippingRoute
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+
+
+@pytest.fixture
+def create_order(user):
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    shipping = Shipping.objects.create(
+        user=user,
+        receiver_name="Receiver",
+        receiver_phone="0800",
+        receiver_address="Address",
+        destination=ShippingRoute.objects.create(route="Route"),
+    )
+
+    def create(lines):
+        order = Order.objects.create(user=user)
+        OrderShipping.objects.create(
+            order=order,
+            shipping=shipping,
+            receiver_name="Receiver",
+            receiver_phone="0800",
+            receiver_address="Address",
+            destination_route="Route",
+        )
+        for index in range(lines):
+            product = Product.objects.create(
+                name=f"Product {order.ref_code} {index}",
+                description="Product",
+                brand=brand,
+                category=category,
+                subcategory=subcategory,
+                subsubcategory=subsubcategory,
+            )
+            stock = Stock.objects.create(
+                product=product, sku=f"SKU-{order.ref_code}-{index}", price=1000
+            )
+            OrderItem.objects.create(
+                order=order, product=product, stock=stock, product_name=product.name
+            )
+        return order
+
+    return create
+
+
+@pytest.mark.django_db
+def test_order_list_query_count_is_constant(
+    user, create_order, django_assert_num_queries
+):
+    # Arrange
+    client = APIClient()
+    client.force_authenticate(user)
+    rated_order = create_order(lines=2)
+    rated_order.payment_status = "settlement"
+    rated_order.save()
+    rated_item = rated_order.order_items.first()
+    Rating.objects.create(user=user, product=rated_item.product, star=5, review="Ok")
+
+    # Act: count, orders, items with products and rated products
+    with django_assert_num_queries(4):
+        response = client.get("/api/v1/order/")
+    for _ in range(3):
+        create_order(lines=5)
+    with django_assert_num_queries(4):
+        response = client.get("/api/v1/order/")
+
+    # Assert
+    assert response.status_code == 200
+    orders = response.data["results"]
+    assert len(orders) == 4
+    assert all(order["order_shipping"] for order in orders)
+    items = [item for order in orders for item in order["order_items"]]
+    assert len(items) == 17
+    assert [item["id"] for item in items if item["is_rated"]] == [str(rated_item.id)]
+
+
+@pytest.mark.django_db
+def test_order_list_marks_products_rated_before_purchased_products(user, create_order):
+    # Arrange: a settled order without purchased products yet
+    client = APIClient()
+    client.force_authenticate(user)
+    order = create_order(lines=2)
+    order.payment_status = "settlement"
+    order.save()
+    PurchasedProduct.objects.all().delete()
+    rated_item = order.order_items.first()
+    Rating.objects.create(user=user, product=rated_item.product, star=5, review="Ok")
+
+    # Act
+    response = client.get("/api/v1/order/")
+
+    # Assert
+    items = response.data["results"][0]["order_items"]
+    assert [item["id"] for item in items if item["is_rated"]] == [str(rated_item.id)]
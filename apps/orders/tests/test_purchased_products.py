@@ -0,0 +1,114 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.orders.models import Order, OrderItem, PurchasedProduct
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+)
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def products(db):
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    return [
+        Product.objects.create(
+            name=f"Product {index}",
+            description="Product",
+            brand=brand,
+            category=category,
+            subcategory=subcategory,
+            subsubcategory=subsubcategory,
+        )
+        for index in range(2)
+    ]
+
+
+def create_user(email):
+    user = User.objects.create_user(
+        email=email, password="password", first_name="Test", last_name="User"
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+    return user, client
+
+
+def create_order(user, products):
+    order = Order.objects.create(user=user)
+    for product in products:
+        stock = Stock.objects.create(
+            product=product, sku=f"SKU-{order.ref_code}-{product.pk}", price=1000
+        )
+        OrderItem.objects.create(
+            order=order, product=product, stock=stock, product_name=product.name
+        )
+    return order
+
+
+def rate(client, product):
+    data = {"product": str(product.pk), "star": 5, "review": "Good product"}
+    return client.post("/api/v1/rating/", data, format="json")
+
+
+@pytest.mark.django_db
+def test_rating_requires_own_settled_purchase(products):
+    # Arrange
+    buyer, buyer_client = create_user("buyer@example.com")
+    _, other_client = create_user("other@example.com")
+    order = create_order(buyer, products)
+
+    # Act & Assert: only the settled order of the user counts
+    assert rate(buyer_client, products[0]).status_code == 400
+    order.payment_status = "settlement"
+    order.save()
+    assert rate(other_client, products[0]).status_code == 400
+    assert rate(buyer_client, products[0]).status_code == 200
+
+    response = buyer_client.get("/api/v1/purchases-to-review/")
+    assert [product["id"] for product in response.data] == [str(products[1].pk)]
+    assert PurchasedProduct.objects.get(product=products[0]).is_rated
+
+
+@pytest.mark.django_db
+def test_purchased_products_follow_settlement(products):
+    # Arrange
+    user, _ = create_user("user@example.com")
+    first = create_order(user, products)
+    second = create_order(user, products[:1])
+    for order in [first, second]:
+        order.payment_status = "settlement"
+        order.save()
+
+    # Act: the product of the second order is still purchased
+    first.payment_status = "refund"
+    first.save()
+
+    # Assert
+    purchased = PurchasedProduct.objects.filter(user=user)
+    assert list(purchased.values_list("product", flat=True)) == [products[0].pk]
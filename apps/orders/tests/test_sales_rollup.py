@@ -0,0 +1,113 @@
+import datetime
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.orders.helpers import get_cached_sales_leaderboard
+from apps.orders.models import Order, OrderItem, ProductSales
+from apps.orders.signals import update_order_sales
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+)
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def order(db):
+    user = User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    product = Product.objects.create(
+        name="Product",
+        description="Product",
+        brand=brand,
+        category=category,
+        subcategory=subcategory,
+        subsubcategory=subsubcategory,
+    )
+    stock = Stock.objects.create(product=product, sku="SKU-1", price=1000)
+
+    # an order placed a week ago
+    order = Order.objects.create(user=user)
+    Order.objects.filter(id=order.id).update(
+        created_at=timezone.now() - datetime.timedelta(days=7)
+    )
+    OrderItem.objects.create(
+        order=order, product=product, stock=stock, product_name="Product", quantity=3
+    )
+    return Order.objects.get(id=order.id)
+
+
+def save_with_stale_status(order, payment_status, previous_status):
+    # save as a webhook that read the payment status before another one saved
+    order.payment_status = payment_status
+    order.save()
+    order._previous_payment_status = previous_status
+    update_order_sales(Order, order)
+
+
+@pytest.mark.django_db
+def test_settlement_is_counted_once_on_settlement_day(order):
+    # Arrange: two webhooks loaded the order before it settled
+    first = Order.objects.get(id=order.id)
+    second = Order.objects.get(id=order.id)
+
+    # Act
+    save_with_stale_status(first, "settlement", "pending")
+    save_with_stale_status(second, "settlement", "pending")
+
+    # Assert
+    sales = ProductSales.objects.get()
+    assert sales.quantity == 3
+    assert sales.date == timezone.localdate()
+
+    # leaving settlement removes it once from the same day
+    save_with_stale_status(first, "refund", "settlement")
+    save_with_stale_status(second, "refund", "settlement")
+    assert ProductSales.objects.get().quantity == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_settlement_invalidates_every_leaderboard(order):
+    # Arrange: cache a leaderboard of any size
+    def build(leaderboard):
+        return leaderboard
+
+    assert get_cached_sales_leaderboard("product", "7d", 3, build) == []
+
+    # Act
+    order.payment_status = "settlement"
+    order.save()
+
+    # Assert
+    leaderboard = get_cached_sales_leaderboard("product", "7d", 3, build)
+    assert leaderboard == [(order.order_items.get().product_id, 3)]
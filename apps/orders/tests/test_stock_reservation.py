@@ -0,0 +1,105 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+from apps.orders.helpers import reserve_stock, release_stock_reservation
+from apps.orders.models import Order, StockReservation
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+)
+
+User = get_user_model()
+
+
+@pytest.fixture
+def stocks(db):
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    product = Product.objects.create(
+        name="Test Product",
+        description="Product",
+        brand=brand,
+        category=category,
+        subcategory=subcategory,
+        subsubcategory=subsubcategory,
+        is_active=True,
+    )
+    return [
+        Stock.objects.create(product=product, sku="SKU-1", price=1000, quantity=5),
+        Stock.objects.create(product=product, sku="SKU-2", price=1000, quantity=1),
+    ]
+
+
+@pytest.fixture
+def order(db):
+    user = User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+    return Order.objects.create(user=user)
+
+
+def get_quantities(stocks):
+    return [Stock.objects.get(id=stock.id).quantity for stock in stocks]
+
+
+@pytest.mark.django_db
+def test_reserve_stock_is_all_or_nothing(stocks, order):
+    # Act
+    with pytest.raises(serializers.ValidationError):
+        reserve_stock(order, [(stocks[0], 2), (stocks[1], 2)])
+
+    # Assert
+    assert get_quantities(stocks) == [5, 1]
+    assert not StockReservation.objects.filter(order=order).exists()
+
+
+@pytest.mark.django_db
+def test_reserve_and_release_stock(stocks, order):
+    # Act
+    reserve_stock(order, [(stocks[0], 2), (stocks[1], 1)])
+
+    # Assert
+    assert get_quantities(stocks) == [3, 0]
+    assert Product.objects.get(id=stocks[0].product_id).total_quantity == 3
+
+    # Act: the payment expires, releasing the stock only once
+    order.payment_status = "expire"
+    order.save()
+    release_stock_reservation(order)
+
+    # Assert
+    assert get_quantities(stocks) == [5, 1]
+    assert set(
+        StockReservation.objects.filter(order=order).values_list("status", flat=True)
+    ) == {"released"}
+
+
+@pytest.mark.django_db
+def test_paid_order_commits_reserved_stock(stocks, order):
+    # Arrange
+    reserve_stock(order, [(stocks[0], 2)])
+
+    # Act
+    order.payment_status = "settlement"
+    order.save()
+    release_stock_reservation(order)
+
+    # Assert
+    assert get_quantities(stocks) == [3, 1]
+    assert StockReservation.objects.get(order=order).status == "committed"
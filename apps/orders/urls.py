@@ -8,6 +8,9 @@ from .views import (
     ConfirmOrderAPIView,
     BookShipmentAPIView,
     CouponCheckingAPIView,
+    CheckoutQuoteAPIView,
+    BestCouponsAPIView,
+    PurchasesToReviewAPIView,
 )
 
 router = DefaultRouter()
@@ -32,4 +35,19 @@ urlpatterns = [
         CouponCheckingAPIView.as_view(),
         name="coupon_checking",
     ),
+    path(
+        "v1/best-coupons/",
+        BestCouponsAPIView.as_view(),
+        name="best_coupons",
+    ),
+    path(
+        "v1/checkout-quote/",
+        CheckoutQuoteAPIView.as_view(),
+        name="checkout_quote",
+    ),
+    path(
+        "v1/purchases-to-review/",
+        PurchasesToReviewAPIView.as_view(),
+        name="purchases_to_review",
+    ),
 ]
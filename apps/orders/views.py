@@ -2,25 +2,37 @@ from rest_framework import filters, serializers, viewsets, status, views
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.db import transaction
+from django.db.models import Prefetch
 import math
 from django_filters.rest_framework import DjangoFilterBackend
-
-from apps.cart.models import Cart, CartItem
-from apps.coupons.models import Coupon, CouponUser
+from tools.custom_paginations import OptionalCursorPagination
+from tools.idempotency_helper import idempotent
+
+from django.conf import settings
+from apps.cart.models import CartItem
+from apps.coupons.helpers import evaluate_coupons, get_best_coupons, redeem_coupons
+from apps.coupons.serializers import CouponSerializer
+from apps.products.serializers import CompactProductSerializer
 from .models import Order, OrderItem, ReturnOrder, RefundOrder, OrderShipping
 from .serializers import OrderSerializer, ReturnOrderSerializer, RefundOrderSerializer
-from apps.shipping.models import Shipping, ShippingType
-
-from apps.shipping.helpers import lionparcel_original_tariff
-from apps.shipping.helpers import lionparcel_tariff_mapping
 from .helpers import lionparcel_booking
 from .helpers import send_order_confirmation_email
+from .helpers import reserve_stock, create_order_items, get_rated_product_ids
+from .helpers import get_products_to_review
+from .helpers import (
+    get_checkout_cart_items,
+    get_default_shipping,
+    build_checkout_quote,
+    sign_checkout_quote,
+    load_checkout_quote,
+)
 
 
 class OrderViewset(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = OptionalCursorPagination
     filter_backends = [
         filters.SearchFilter,
         filters.OrderingFilter,
@@ -40,206 +52,81 @@ class OrderViewset(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        return Order.objects.filter(user=user)
+        return (
+            Order.objects.filter(user=user)
+            .select_related("order_shipping")
+            .prefetch_related(
+                Prefetch(
+                    "order_items", queryset=OrderItem.objects.select_related("product")
+                )
+            )
+        )
 
-    def create(self, request, *args, **kwargs):
-        # get cart items
-        user = self.request.user
-        cart = Cart.objects.get(user=user)
+    def get_order_serializer_context(self, orders):
+        # get the rated products of all the order items in one query
+        context = self.get_serializer_context()
+        context["rated_product_ids"] = get_rated_product_ids(
+            self.request.user,
+            [item.product_id for order in orders for item in order.order_items.all()],
+        )
+        return context
 
-        cart_items = CartItem.objects.filter(cart=cart, is_selected=True)
-        if not cart_items:
-            return Response(
-                {"error": "No item found in the cart"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
 
-        # calculate subtotal amount and total weight
-        subtotal_amount = 0
-        total_discount = 0
-        total_paid = 0
-        total_weight = 0
+        page = self.paginate_queryset(queryset)
+        orders = page if page is not None else list(queryset)
+        serializer = self.get_serializer(
+            orders, many=True, context=self.get_order_serializer_context(orders)
+        )
 
-        for cart_item in cart_items:
-            subtotal_amount += cart_item.total_price
-            total_weight += cart_item.stock.weight * cart_item.quantity
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
 
-        # set total paid
-        total_paid += subtotal_amount
+    def retrieve(self, request, *args, **kwargs):
+        order = self.get_object()
+        serializer = self.get_serializer(
+            order, context=self.get_order_serializer_context([order])
+        )
+        return Response(serializer.data)
 
-        # convert to kg
-        if total_weight > 0:
-            total_weight = math.ceil(total_weight / 1000)
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        user = self.request.user
+        cart_items = get_checkout_cart_items(user)
+        shipping = get_default_shipping(user)
 
-        # get the coupon
         coupon_code_input = request.data.get("coupon")
         coupon_code_input2 = request.data.get("coupon2")
+        shipping_type = request.data.get("shipping_type")
 
-        # Get the first coupon
-        if coupon_code_input:
-            coupon_prefix = coupon_code_input[:8]
-            coupon_code = coupon_code_input[8:]
-
-            try:
-                coupon = Coupon.objects.get(prefix_code=coupon_prefix)
-            except Coupon.DoesNotExist:
-                return Response(
-                    {"error": "Coupon is not valid"}, status=status.HTTP_400_BAD_REQUEST
-                )
-
-            if not coupon.is_verified(coupon_code) or not coupon.is_valid():
-                return Response(
-                    {"error": "Coupon is not valid"}, status=status.HTTP_400_BAD_REQUEST
-                )
-
-            try:
-                coupon_user = CouponUser.objects.get(coupon=coupon, user=user)
-            except CouponUser.DoesNotExist:
-                coupon_user = None
-
-            if coupon.is_limited and coupon_user:
-                return Response(
-                    {"error": "Coupon is already used"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Check if the coupon is valid for this order and calculate discount
-            if not coupon.is_private and coupon.min_purchase > subtotal_amount:
-                raise serializers.ValidationError(
-                    "Total purchase must be higher than minimum purchase allowed for the first coupon"
-                )
-        else:
-            coupon = None
-
-        # Get the second coupon
-        if coupon_code_input2:
-            coupon_prefix2 = coupon_code_input2[:8]
-            coupon_code2 = coupon_code_input2[8:]
-
-            try:
-                coupon2 = Coupon.objects.get(prefix_code=coupon_prefix2)
-            except Coupon.DoesNotExist:
-                return Response(
-                    {"error": "Coupon is not valid"}, status=status.HTTP_400_BAD_REQUEST
-                )
-
-            if not coupon2.is_verified(coupon_code2) or not coupon2.is_valid():
-                return Response(
-                    {"error": "Coupon is not valid"}, status=status.HTTP_400_BAD_REQUEST
-                )
-
-            try:
-                coupon_user2 = CouponUser.objects.get(coupon=coupon2, user=user)
-            except CouponUser.DoesNotExist:
-                coupon_user2 = None
-
-            if coupon2.is_limited and coupon_user2:
-                return Response(
-                    {"error": "Coupon is already used"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Check if the second coupon is valid for this order and calculate discount
-            if not coupon2.is_private and coupon2.min_purchase > subtotal_amount:
-                raise serializers.ValidationError(
-                    "Total purchase must be higher than the minimum purchase allowed for the second coupon"
-                )
-        else:
-            coupon2 = None
-
-        # Check if both coupons are public, or prioritize the private coupon
-        if coupon and coupon2:
-            if not coupon.is_private and not coupon2.is_private:
-                return Response(
-                    {"error": "Only one free coupon is allowed"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            elif coupon.id == coupon2.id:
-                return Response(
-                    {"error": "Coupon can't be used twice"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            elif not coupon.is_private and coupon2.is_private:
-                coupon, coupon2 = (
-                    coupon2,
-                    coupon,
-                )  # Swap the coupons to prioritize the private one
-
-        if coupon:
-            if coupon.is_private:
-                total_discount += coupon.max_purchase
-                total_paid -= coupon.max_purchase
-            else:
-                total_discount += (coupon.discount_value * subtotal_amount) / 100
-                total_paid -= (coupon.discount_value * subtotal_amount) / 100
-
-        if coupon2:
-            if coupon2.is_private:
-                total_discount += coupon2.max_purchase
-                total_paid -= coupon2.max_purchase
-            else:
-                total_discount += (coupon2.discount_value * subtotal_amount) / 100
-                total_paid -= (coupon2.discount_value * subtotal_amount) / 100
-
-        if total_discount > subtotal_amount:
-            total_discount = subtotal_amount
-            total_paid = 0
-
-        # get shipping details
-        try:
-            shipping = Shipping.objects.get(user=user, is_default=True)
-        except Shipping.DoesNotExist:
-            return Response(
-                {"error": "Default shipping is not set"},
-                status=status.HTTP_400_BAD_REQUEST,
+        # use the quote of the checkout when the cart hasn't changed,
+        # otherwise calculate the discount and shipping tariff again
+        quote = None
+        quote_id = request.data.get("quote_id")
+        if quote_id:
+            quote = load_checkout_quote(
+                quote_id,
+                user,
+                cart_items,
+                shipping,
+                coupon_code_input,
+                coupon_code_input2,
+                shipping_type,
             )
-
-        # get shipping type
-        shipping_type = request.data.get("shipping_type")
-        try:
-            registered_shipping_type = ShippingType.objects.get(code=shipping_type)
-        except ShippingType.DoesNotExist:
-            return Response(
-                {"error": "Shipping type is not found"},
-                status=status.HTTP_400_BAD_REQUEST,
+        if quote is None:
+            quote = build_checkout_quote(
+                user,
+                cart_items,
+                shipping,
+                coupon_code_input,
+                coupon_code_input2,
+                shipping_type,
             )
 
-        try:
-            original_tariff = lionparcel_original_tariff(total_weight, shipping)
-            if isinstance(original_tariff, Response):
-                return original_tariff
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            response = lionparcel_tariff_mapping(original_tariff)
-            if isinstance(response, Response):
-                return response
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-        # shipping cost & estimation
-        shipping_type = None
-        shipping_type_name = None
-        shipping_cost = 0
-        shipping_estimation = None
-
-        # search the shipping type in response list
-        for item in response:
-            if item.get("shipping_type") == registered_shipping_type.code:
-                shipping_type = item.get("shipping_type")
-                shipping_type_name = item.get("shipping_type_name")
-                shipping_cost = item.get("total_tariff")
-                shipping_estimation = item.get("estimasi_sla")
-
-        # calculate tax amount
-        # tax_amount = math.ceil(((subtotal_amount + shipping_cost) * 10) / 100)
-        tax_amount = 0
-
-        # calculate total price
-        total_amount = total_paid + shipping_cost + tax_amount
-
-        # use transaction atomic when creating order
+        # create the order, its items, stock reservation and shipping
+        # in one transaction
         with transaction.atomic():
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
@@ -248,62 +135,49 @@ class OrderViewset(viewsets.ModelViewSet):
                 user=user,
                 coupon=coupon_code_input,
                 coupon2=coupon_code_input2,
-                tax_amount=tax_amount,
-                shipping_amount=shipping_cost,
-                subtotal_amount=subtotal_amount,
-                total_amount=math.ceil(total_amount),
-                total_weight=math.ceil(total_weight),
-                discount_amount=math.ceil(total_discount),
+                tax_amount=quote["tax_amount"],
+                shipping_amount=quote["shipping_cost"],
+                subtotal_amount=quote["subtotal_amount"],
+                total_amount=math.ceil(quote["total_amount"]),
+                total_weight=math.ceil(quote["total_weight"]),
+                discount_amount=math.ceil(quote["total_discount"]),
+            )
+
+            # reserve the stock, the order is rolled back when any stock is short
+            reserve_stock(
+                order,
+                [(cart_item.stock, cart_item.quantity) for cart_item in cart_items],
             )
 
-        # create order items
-        for cart_item in cart_items:
-            OrderItem.objects.create(
+            # create order items
+            create_order_items(order, cart_items)
+
+            # delete cart items
+            CartItem.objects.filter(
+                id__in=[cart_item.id for cart_item in cart_items]
+            ).delete()
+
+            # create shipping order
+            OrderShipping.objects.create(
                 order=order,
-                quantity=cart_item.quantity,
-                product=cart_item.product,
-                product_name=cart_item.product.name,
-                stock=cart_item.stock,
-                stock_discount=cart_item.stock.discount or 0,
-                stock_sku=cart_item.stock.sku,
-                stock_price=cart_item.stock.price,
-                product_cover=cart_item.product.cover or None,
-                stock_size=cart_item.stock.size or None,
-                stock_color=cart_item.stock.color or None,
-                stock_color_code=cart_item.stock.color_code or None,
-                stock_variant=cart_item.stock.variant or None,
-                stock_weight=cart_item.stock.weight or 0,
-                stock_length=cart_item.stock.length or 0,
-                stock_width=cart_item.stock.width or 0,
-                stock_height=cart_item.stock.height or 0,
+                shipping=shipping,
+                receiver_name=shipping.receiver_name,
+                receiver_phone=shipping.receiver_phone,
+                receiver_address=shipping.receiver_address,
+                destination_route=shipping.destination.route,
+                shipping_type=quote["shipping_type"],
+                shipping_type_name=quote["shipping_type_name"],
+                shipping_estimation=quote["shipping_estimation"],
             )
 
-        # recalculating stock
-        for cart_item in cart_items:
-            cart_item.stock.quantity -= cart_item.quantity
-            cart_item.stock.save()
-
-        # delete cart items
-        cart_items.delete()
-
-        # set coupon as used
-        if coupon and coupon.is_limited:
-            CouponUser.objects.create(coupon=coupon, user=user)
-
-        if coupon2 and coupon2.is_limited:
-            CouponUser.objects.create(coupon=coupon2, user=user)
-
-        # create shipping order
-        OrderShipping.objects.create(
-            order=order,
-            shipping=shipping,
-            receiver_name=shipping.receiver_name,
-            receiver_phone=shipping.receiver_phone,
-            receiver_address=shipping.receiver_address,
-            destination_route=shipping.destination.route,
-            shipping_type=shipping_type,
-            shipping_type_name=shipping_type_name,
-            shipping_estimation=shipping_estimation,
+            # count the coupon redemptions last, their rows stay locked
+            # until the order is committed
+            redeem_coupons(user, quote["coupons"])
+
+        # serialize the created order with its items and shipping loaded once
+        order = self.get_queryset().get(id=order.id)
+        serializer = self.get_serializer(
+            order, context=self.get_order_serializer_context([order])
         )
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -441,141 +315,17 @@ class CouponCheckingAPIView(views.APIView):
         Check if the coupon is valid for the order and calculate the discount
         This API requires one or two coupon codes and returns the total discount
         """
-        # get cart items
         user = self.request.user
-        cart = Cart.objects.get(user=user)
-
-        cart_items = CartItem.objects.filter(cart=cart, is_selected=True)
-        if not cart_items:
-            return Response(
-                {"error": "No item found in the cart"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        cart_items = get_checkout_cart_items(user)
 
         # calculate subtotal amount
-        subtotal_amount = 0
-        total_discount = 0
-        total_paid = 0
-
-        for cart_item in cart_items:
-            subtotal_amount += cart_item.total_price
-
-        # set total paid
-        total_paid += subtotal_amount
-
-        # get the coupon
-        coupon_code_input = request.GET.get("coupon")
-        coupon_code_input2 = request.GET.get("coupon2")
-
-        # Get the first coupon
-        if coupon_code_input:
-            coupon_prefix = coupon_code_input[:8]
-            coupon_code = coupon_code_input[8:]
-
-            try:
-                coupon = Coupon.objects.get(prefix_code=coupon_prefix)
-            except Coupon.DoesNotExist:
-                return Response(
-                    {"error": "Coupon is not valid"}, status=status.HTTP_400_BAD_REQUEST
-                )
-
-            if not coupon.is_verified(coupon_code) or not coupon.is_valid():
-                return Response(
-                    {"error": "Coupon is not valid"}, status=status.HTTP_400_BAD_REQUEST
-                )
-
-            try:
-                coupon_user = CouponUser.objects.get(coupon=coupon, user=user)
-            except CouponUser.DoesNotExist:
-                coupon_user = None
-
-            if coupon.is_limited and coupon_user:
-                return Response(
-                    {"error": "Coupon is already used"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Check if the coupon is valid for this order and calculate discount
-            if not coupon.is_private and coupon.min_purchase > subtotal_amount:
-                raise serializers.ValidationError(
-                    "Total purchase must be higher than minimum purchase allowed for the first coupon"
-                )
-        else:
-            coupon = None
-
-        # Get the second coupon
-        if coupon_code_input2:
-            coupon_prefix2 = coupon_code_input2[:8]
-            coupon_code2 = coupon_code_input2[8:]
-
-            try:
-                coupon2 = Coupon.objects.get(prefix_code=coupon_prefix2)
-            except Coupon.DoesNotExist:
-                return Response(
-                    {"error": "Coupon is not valid"}, status=status.HTTP_400_BAD_REQUEST
-                )
-
-            if not coupon2.is_verified(coupon_code2) or not coupon2.is_valid():
-                return Response(
-                    {"error": "Coupon is not valid"}, status=status.HTTP_400_BAD_REQUEST
-                )
-
-            try:
-                coupon_user2 = CouponUser.objects.get(coupon=coupon2, user=user)
-            except CouponUser.DoesNotExist:
-                coupon_user2 = None
+        subtotal_amount = sum(cart_item.total_price for cart_item in cart_items)
 
-            if coupon2.is_limited and coupon_user2:
-                return Response(
-                    {"error": "Coupon is already used"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Check if the second coupon is valid for this order and calculate discount
-            if not coupon2.is_private and coupon2.min_purchase > subtotal_amount:
-                raise serializers.ValidationError(
-                    "Total purchase must be higher than the minimum purchase allowed for the second coupon"
-                )
-        else:
-            coupon2 = None
-
-        # Check if both coupons are public, or prioritize the private coupon
-        if coupon and coupon2:
-            if not coupon.is_private and not coupon2.is_private:
-                return Response(
-                    {"error": "Only one free coupon is allowed"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            elif coupon.id == coupon2.id:
-                return Response(
-                    {"error": "Coupon can't be used twice"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            elif not coupon.is_private and coupon2.is_private:
-                coupon, coupon2 = (
-                    coupon2,
-                    coupon,
-                )  # Swap the coupons to prioritize the private one
-
-        if coupon:
-            if coupon.is_private:
-                total_discount += coupon.max_purchase
-                total_paid -= coupon.max_purchase
-            else:
-                total_discount += (coupon.discount_value * subtotal_amount) / 100
-                total_paid -= (coupon.discount_value * subtotal_amount) / 100
-
-        if coupon2:
-            if coupon2.is_private:
-                total_discount += coupon2.max_purchase
-                total_paid -= coupon2.max_purchase
-            else:
-                total_discount += (coupon2.discount_value * subtotal_amount) / 100
-                total_paid -= (coupon2.discount_value * subtotal_amount) / 100
-
-        if total_discount > subtotal_amount:
-            total_discount = subtotal_amount
-            total_paid = 0
+        _, total_discount, total_paid = evaluate_coupons(
+            user,
+            subtotal_amount,
+            [request.GET.get("coupon"), request.GET.get("coupon2")],
+        )
 
         discount_percentage = 0
         if subtotal_amount > 0:
@@ -590,3 +340,85 @@ class CouponCheckingAPIView(views.APIView):
             },
             status=status.HTTP_200_OK,
         )
+
+
+class BestCouponsAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Rank the public coupons the user can use on the selected cart items
+        by their discount, with the total paid after each coupon
+        """
+        user = self.request.user
+        cart_items = get_checkout_cart_items(user)
+
+        subtotal_amount = sum(cart_item.total_price for cart_item in cart_items)
+
+        best_coupons = []
+        for coupon, discount in get_best_coupons(user, subtotal_amount):
+            best_coupons.append(
+                {
+                    **CouponSerializer(coupon).data,
+                    "total_discount": discount,
+                    "total_paid": subtotal_amount - discount,
+                }
+            )
+
+        return Response(
+            {"subtotal_amount": subtotal_amount, "coupons": best_coupons},
+            status=status.HTTP_200_OK,
+        )
+
+
+class CheckoutQuoteAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Calculate the subtotal, coupon discount, shipping tariff and total of
+        the selected cart items once, and return them with a short-lived
+        signed quote id that order creation accepts instead of recalculating
+        """
+        user = self.request.user
+        cart_items = get_checkout_cart_items(user)
+        shipping = get_default_shipping(user)
+
+        quote = build_checkout_quote(
+            user,
+            cart_items,
+            shipping,
+            request.data.get("coupon"),
+            request.data.get("coupon2"),
+            request.data.get("shipping_type"),
+        )
+
+        return Response(
+            {
+                "quote_id": sign_checkout_quote(quote),
+                "expires_in": settings.CHECKOUT_QUOTE_MAX_AGE,
+                "subtotal_amount": quote["subtotal_amount"],
+                "total_discount": quote["total_discount"],
+                "shipping_type": quote["shipping_type"],
+                "shipping_type_name": quote["shipping_type_name"],
+                "shipping_cost": quote["shipping_cost"],
+                "shipping_estimation": quote["shipping_estimation"],
+                "tax_amount": quote["tax_amount"],
+                "total_amount": math.ceil(quote["total_amount"]),
+                "total_weight": quote["total_weight"],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class PurchasesToReviewAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        """
+        List the products the user bought in a settled order and hasn't rated
+        """
+        products = get_products_to_review(self.request.user)
+        serializer = CompactProductSerializer(products, many=True)
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
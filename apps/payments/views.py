@@ -6,11 +6,13 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 from apps.orders.models import Order
+from tools.idempotency_helper import idempotent
 
 
 class PaymentAPIViews(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         # get order id from request
         ref_code = request.data.get("ref_code")
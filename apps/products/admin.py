@@ -12,6 +12,8 @@ from .models import (
     Stock,
     ExtraProductImage,
     ExtraProductVideo,
+    ProductRatingStats,
+    ProductRecommendation,
 )
 
 from .admin_views import (
@@ -53,11 +55,20 @@ class ProductAdmin(admin.ModelAdmin):
         "subcategory",
         "subsubcategory",
         "brand",
+        "min_price",
+        "total_quantity",
         "created_at",
         "updated_at",
         "is_active",
     )
-    list_filter = ("category", "subcategory", "subsubcategory", "brand", "is_active")
+    list_filter = (
+        "category",
+        "subcategory",
+        "subsubcategory",
+        "brand",
+        "is_active",
+        "in_stock",
+    )
     inlines = [StockInline, ExtraProductImageInline, ExtraProductVideoInline]
     search_fields = ("name", "description")
     ordering = ("-created_at",)
@@ -143,6 +154,25 @@ class RatingAdmin(admin.ModelAdmin):
     autocomplete_fields = ("user", "product")
 
 
+class ProductRatingStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        "product",
+        "total_rating",
+        "average_rating",
+        "updated_at",
+    )
+    search_fields = ("product__name",)
+    ordering = ("-average_rating",)
+    readonly_fields = [field.name for field in ProductRatingStats._meta.fields]
+
+
+class ProductRecommendationAdmin(admin.ModelAdmin):
+    list_display = ("product", "recommended", "score", "rank")
+    search_fields = ("product__name", "recommended__name")
+    ordering = ("product", "rank")
+    readonly_fields = [field.name for field in ProductRecommendation._meta.fields]
+
+
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Subcategory, SubcategoryAdmin)
@@ -153,3 +183,5 @@ admin.site.register(Wishlist, WishlistAdmin)
 admin.site.register(Stock, StockAdmin)
 admin.site.register(ExtraProductImage)
 admin.site.register(ExtraProductVideo)
+admin.site.register(ProductRatingStats, ProductRatingStatsAdmin)
+admin.site.register(ProductRecommendation, ProductRecommendationAdmin)
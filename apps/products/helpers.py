@@ -0,0 +1,442 @@
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, F, Case, When, Value, Count, OuterRef, Subquery
+from django.db.models import IntegerField, Window, Sum
+from django.db.models.functions import Coalesce, RowNumber
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
+
+from .models import (
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Rating,
+    Wishlist,
+    ProductRatingStats,
+    ProductRecommendation,
+)
+from .serializers import (
+    ProductSerializer,
+    StockSerializer,
+    RatingSerializer,
+    ExtraProductImageSerializer,
+    ExtraProductVideoSerializer,
+    ProductRatingStatsSerializer,
+    CategoryTreeSerializer,
+    SubcategoryTreeSerializer,
+    SubsubcategorySerializer,
+)
+
+PRODUCT_DETAIL_CACHE_PREFIX = "product_detail"
+
+LATEST_RATING_LIMIT = 5
+HIGHEST_RATING_LIMIT = 3
+LOWEST_RATING_LIMIT = 3
+RELATED_PRODUCT_LIMIT = 5
+
+
+def product_detail_cache_key(slug):
+    return f"{PRODUCT_DETAIL_CACHE_PREFIX}:{slug}"
+
+
+def get_cached_product_detail(slug):
+    return cache.get(product_detail_cache_key(slug))
+
+
+def set_cached_product_detail(slug, data):
+    cache.set(
+        product_detail_cache_key(slug), data, settings.PRODUCT_DETAIL_CACHE_TIMEOUT
+    )
+
+
+def invalidate_product_detail_cache(slug):
+    """
+    Delete the cached product detail of the given slug,
+    after the current transaction is committed
+    """
+    if not slug:
+        return
+
+    key = product_detail_cache_key(slug)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidate_product_detail_cache_by_id(product_id):
+    slug = Product.objects.filter(id=product_id).values_list("slug", flat=True).first()
+    invalidate_product_detail_cache(slug)
+
+
+def invalidate_product_detail_cache_by_ids(product_ids):
+    slugs = Product.objects.filter(id__in=product_ids).values_list("slug", flat=True)
+    for slug in slugs:
+        invalidate_product_detail_cache(slug)
+
+
+def get_product_rating_slices(product):
+    """
+    Get the latest, highest (>= 4 stars) and lowest (<= 3 stars) ratings
+    of a product with their users from one windowed query
+    """
+    ratings = (
+        Rating.objects.filter(product=product)
+        .select_related("user")
+        .annotate(
+            latest_rank=Window(
+                expression=RowNumber(),
+                order_by=[F("created_at").desc(), F("id").desc()],
+            ),
+            star_rank=Window(
+                expression=RowNumber(),
+                partition_by=[
+                    Case(
+                        When(star__gte=4, then=Value(1)),
+                        default=Value(0),
+                        output_field=IntegerField(),
+                    )
+                ],
+                order_by=[F("star").desc(), F("created_at").desc(), F("id").desc()],
+            ),
+        )
+        .filter(
+            Q(latest_rank__lte=LATEST_RATING_LIMIT)
+            | Q(star_rank__lte=max(HIGHEST_RATING_LIMIT, LOWEST_RATING_LIMIT))
+        )
+    )
+
+    latest_ratings = []
+    highest_ratings = []
+    lowest_ratings = []
+    for rating in ratings:
+        if rating.latest_rank <= LATEST_RATING_LIMIT:
+            latest_ratings.append(rating)
+        if rating.star >= 4 and rating.star_rank <= HIGHEST_RATING_LIMIT:
+            highest_ratings.append(rating)
+        if rating.star <= 3 and rating.star_rank <= LOWEST_RATING_LIMIT:
+            lowest_ratings.append(rating)
+
+    latest_ratings.sort(key=lambda rating: rating.latest_rank)
+    highest_ratings.sort(key=lambda rating: rating.star_rank)
+    lowest_ratings.sort(key=lambda rating: rating.star_rank)
+
+    return latest_ratings, highest_ratings, lowest_ratings
+
+
+def get_related_products(product, limit=RELATED_PRODUCT_LIMIT):
+    """
+    Get the frequently bought together products of a product in one query,
+    filled up with the latest active products of the same brand and category
+    """
+    recommendations = ProductRecommendation.objects.filter(product=product)
+    rank = recommendations.filter(recommended=OuterRef("pk")).values("rank")[:1]
+    return (
+        Product.objects.filter(is_active=True)
+        .filter(
+            Q(id__in=recommendations.values("recommended"))
+            | Q(category_id=product.category_id, brand_id=product.brand_id)
+        )
+        .exclude(id=product.id)
+        .annotate(recommendation_rank=Subquery(rank))
+        .order_by(F("recommendation_rank").asc(nulls_last=True), "-created_at")[:limit]
+    )
+
+
+def get_cart_recommendations(product_ids, limit=RELATED_PRODUCT_LIMIT):
+    """
+    Get the products most frequently bought together with the products of
+    a cart, excluding the cart products, in one query
+    """
+    if not product_ids:
+        return Product.objects.none()
+
+    return (
+        Product.objects.filter(
+            is_active=True, recommended_in__product_id__in=product_ids
+        )
+        .exclude(id__in=product_ids)
+        .annotate(recommendation_score=Sum("recommended_in__score"))
+        .order_by("-recommendation_score", "-created_at")[:limit]
+    )
+
+
+def assemble_product_detail(slug, context=None):
+    """
+    Assemble the product detail payload with a fixed number of queries:
+    the product with its brand, categories, rating stats and wishlist count,
+    its stock, images and videos, the rating slices, and related products
+    """
+    total_wishlist = (
+        Wishlist.objects.filter(product=OuterRef("pk"))
+        .order_by()
+        .values("product")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    queryset = (
+        Product.objects.select_related(
+            "brand", "category", "subcategory", "subsubcategory", "rating_stats"
+        )
+        .prefetch_related(
+            "product_stock", "product_extra_images", "product_extra_videos"
+        )
+        .annotate(total_wishlist=Coalesce(Subquery(total_wishlist), 0))
+    )
+    product = get_object_or_404(queryset, slug=slug)
+
+    # get the denormalized rating stats
+    try:
+        rating_stats = product.rating_stats
+    except ProductRatingStats.DoesNotExist:
+        rating_stats = ProductRatingStats(product=product)
+    product.average_rating = rating_stats.average_rating
+    product.total_rating = rating_stats.total_rating
+
+    latest_ratings, highest_ratings, lowest_ratings = get_product_rating_slices(product)
+
+    related_products = get_related_products(product)
+
+    return {
+        "product": ProductSerializer(product, context=context).data,
+        "images": ExtraProductImageSerializer(
+            product.product_extra_images.all(), many=True
+        ).data,
+        "videos": ExtraProductVideoSerializer(
+            product.product_extra_videos.all(), many=True
+        ).data,
+        "stock": StockSerializer(product.product_stock.all(), many=True).data,
+        "total_rating": rating_stats.average_rating,
+        "rating_stats": ProductRatingStatsSerializer(rating_stats).data,
+        "latest_rating": RatingSerializer(latest_ratings, many=True).data,
+        "highest_rating": RatingSerializer(highest_ratings, many=True).data,
+        "lowest_rating": RatingSerializer(lowest_ratings, many=True).data,
+        "total_wishlist": product.total_wishlist,
+        "related_products": ProductSerializer(related_products, many=True).data,
+    }
+
+
+PRODUCT_FACETS_CACHE_PREFIX = "product_facets"
+
+# query params that keep a category listing cacheable
+PRODUCT_FACETS_CACHEABLE_PARAMS = {
+    "category__slug",
+    "subcategory__slug",
+    "subsubcategory__slug",
+}
+
+# query params that don't change the filtered product set
+PRODUCT_FACETS_IGNORED_PARAMS = {"facets", "page", "cursor", "ordering"}
+
+# (label, lower bound, upper bound) of the price buckets, in rupiah
+PRODUCT_PRICE_BUCKETS = [
+    ("0-50000", 0, 50000),
+    ("50000-100000", 50000, 100000),
+    ("100000-250000", 100000, 250000),
+    ("250000-500000", 250000, 500000),
+    ("500000+", 500000, None),
+]
+
+PRODUCT_TAXONOMY_FACETS = {
+    "brand": "brand",
+    "category": "category",
+    "subcategory": "subcategory",
+    "subsubcategory": "subsubcategory",
+}
+
+
+def get_taxonomy_facet(product_ids, field):
+    """
+    Count the products per brand or category level in one grouped query
+    """
+    rows = (
+        Product.objects.filter(id__in=product_ids)
+        .values(f"{field}__id", f"{field}__name", f"{field}__slug")
+        .annotate(count=Count("id"))
+        .order_by("-count", f"{field}__name")
+    )
+    return [
+        {
+            "id": row[f"{field}__id"],
+            "name": row[f"{field}__name"],
+            "slug": row[f"{field}__slug"],
+            "count": row["count"],
+        }
+        for row in rows
+    ]
+
+
+def get_price_facet(product_ids):
+    """
+    Count the products per price bucket of their lowest price in one query
+    """
+    buckets = {}
+    for label, lower, upper in PRODUCT_PRICE_BUCKETS:
+        condition = Q(min_price__gte=lower)
+        if upper is not None:
+            condition &= Q(min_price__lt=upper)
+        buckets[label] = Count("id", filter=condition)
+
+    counts = Product.objects.filter(id__in=product_ids).aggregate(**buckets)
+    return [
+        {"label": label, "min": lower, "max": upper, "count": counts[label]}
+        for label, lower, upper in PRODUCT_PRICE_BUCKETS
+    ]
+
+
+def get_rating_facet(product_ids):
+    """
+    Count the products rated at least 1 to 5 stars on average in one query
+    """
+    stars = {
+        f"star_{star}": Count("id", filter=Q(rating_stats__average_rating__gte=star))
+        for star in range(1, 6)
+    }
+    counts = Product.objects.filter(id__in=product_ids).aggregate(**stars)
+    return [{"star": star, "count": counts[f"star_{star}"]} for star in range(5, 0, -1)]
+
+
+def get_product_facets(queryset, facets):
+    """
+    Get the facet counts of the filtered product queryset, one aggregate
+    query per requested facet over the filtered product ids
+    """
+    product_ids = queryset.order_by().values("id")
+
+    result = {}
+    for facet in facets:
+        if facet in PRODUCT_TAXONOMY_FACETS:
+            result[facet] = get_taxonomy_facet(
+                product_ids, PRODUCT_TAXONOMY_FACETS[facet]
+            )
+        elif facet == "price":
+            result[facet] = get_price_facet(product_ids)
+        elif facet == "rating":
+            result[facet] = get_rating_facet(product_ids)
+    return result
+
+
+def parse_product_facets(value):
+    supported = list(PRODUCT_TAXONOMY_FACETS) + ["price", "rating"]
+    facets = [facet.strip() for facet in value.split(",") if facet.strip()]
+    unknown = [facet for facet in facets if facet not in supported]
+    if unknown:
+        raise ValidationError(
+            f"Unknown facets: {', '.join(unknown)}. "
+            f"Supported facets: {', '.join(supported)}"
+        )
+    return facets
+
+
+def product_facets_cache_key(query_params, facets):
+    """
+    Get the cache key of the facet counts, only for unfiltered category
+    pages, otherwise return None
+    """
+    params = {
+        key: value
+        for key, value in query_params.items()
+        if key not in PRODUCT_FACETS_IGNORED_PARAMS
+    }
+    if not set(params).issubset(PRODUCT_FACETS_CACHEABLE_PARAMS):
+        return None
+
+    filters = ":".join(f"{key}={params[key]}" for key in sorted(params))
+    return f"{PRODUCT_FACETS_CACHE_PREFIX}:{','.join(sorted(facets))}:{filters}"
+
+
+def get_cached_product_facets(queryset, query_params, facets):
+    cache_key = product_facets_cache_key(query_params, facets)
+    if cache_key is None:
+        return get_product_facets(queryset, facets)
+
+    result = cache.get(cache_key)
+    if result is None:
+        result = get_product_facets(queryset, facets)
+        cache.set(cache_key, result, settings.PRODUCT_FACETS_CACHE_TIMEOUT)
+    return result
+
+
+CATEGORY_TREE_CACHE_PREFIX = "category_tree"
+
+
+def category_tree_cache_key(product_count):
+    return f"{CATEGORY_TREE_CACHE_PREFIX}:{int(product_count)}"
+
+
+def invalidate_category_tree_cache(product_count_only=False):
+    """
+    Delete the cached category tree after the current transaction is
+    committed, only the tree with product counts when product_count_only
+    """
+    keys = [category_tree_cache_key(True)]
+    if not product_count_only:
+        keys.append(category_tree_cache_key(False))
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_category_product_counts():
+    """
+    Count the active products per category, subcategory and subsubcategory
+    from one grouped query
+    """
+    counts = defaultdict(int)
+    rows = (
+        Product.objects.filter(is_active=True)
+        .values("category_id", "subcategory_id", "subsubcategory_id")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for row in rows:
+        counts[str(row["category_id"])] += row["count"]
+        counts[str(row["subcategory_id"])] += row["count"]
+        counts[str(row["subsubcategory_id"])] += row["count"]
+    return counts
+
+
+def build_category_tree(product_count=False):
+    """
+    Build the category > subcategory > subsubcategory tree from one flat
+    query per level, stitched together in memory
+    """
+    categories = CategoryTreeSerializer(
+        Category.objects.order_by("name"), many=True
+    ).data
+    subcategories = SubcategoryTreeSerializer(
+        Subcategory.objects.order_by("name"), many=True
+    ).data
+    subsubcategories = SubsubcategorySerializer(
+        Subsubcategory.objects.order_by("name"), many=True
+    ).data
+
+    counts = get_category_product_counts() if product_count else None
+
+    # group the children by their parent id
+    subsubcategory_map = defaultdict(list)
+    for subsubcategory in subsubcategories:
+        if counts is not None:
+            subsubcategory["product_count"] = counts[str(subsubcategory["id"])]
+        subsubcategory_map[str(subsubcategory["subcategory"])].append(subsubcategory)
+
+    subcategory_map = defaultdict(list)
+    for subcategory in subcategories:
+        if counts is not None:
+            subcategory["product_count"] = counts[str(subcategory["id"])]
+        subcategory["subsubcategory"] = subsubcategory_map[str(subcategory["id"])]
+        subcategory_map[str(subcategory["category"])].append(subcategory)
+
+    for category in categories:
+        if counts is not None:
+            category["product_count"] = counts[str(category["id"])]
+        category["subcategory"] = subcategory_map[str(category["id"])]
+
+    return categories
+
+
+def get_cached_category_tree(product_count=False):
+    cache_key = category_tree_cache_key(product_count)
+    tree = cache.get(cache_key)
+    if tree is None:
+        tree = build_category_tree(product_count)
+        cache.set(cache_key, tree, settings.CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
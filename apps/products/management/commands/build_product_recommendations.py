@@ -0,0 +1,136 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.orders.models import OrderItem
+from apps.products.models import ProductRecommendation
+
+
+def get_copurchase_pairs(order_indexes, product_indexes):
+    """
+    Expand the (order, product) rows, sorted by order, into every ordered
+    pair of distinct products bought in the same order
+    """
+    _, starts, sizes = np.unique(order_indexes, return_index=True, return_counts=True)
+
+    # every product is paired with all products of its order
+    item_sizes = np.repeat(sizes, sizes)
+    item_starts = np.repeat(starts, sizes)
+    left = np.repeat(product_indexes, item_sizes)
+    block_starts = np.repeat(np.cumsum(item_sizes) - item_sizes, item_sizes)
+    offsets = np.arange(item_sizes.sum()) - block_starts
+    right = product_indexes[np.repeat(item_starts, item_sizes) + offsets]
+
+    distinct = left != right
+    return left[distinct], right[distinct]
+
+
+def get_top_similar_products(order_indexes, product_indexes, product_count, top_k):
+    """
+    Build the sparse co-purchase matrix of the products and get the top-K
+    most similar products of each product by cosine similarity, as arrays
+    of (product, similar product, score, rank)
+    """
+    left, right = get_copurchase_pairs(order_indexes, product_indexes)
+    if not len(left):
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float64), empty
+
+    # count the co-purchases of every pair as sparse (row, column, value)
+    pairs, copurchases = np.unique(left * product_count + right, return_counts=True)
+    rows = pairs // product_count
+    columns = pairs % product_count
+
+    # normalize by the number of orders of both products
+    purchases = np.bincount(product_indexes, minlength=product_count)
+    scores = copurchases / np.sqrt(purchases[rows] * purchases[columns])
+
+    # sort by product then by descending score, and keep the first K
+    ordering = np.lexsort((columns, -scores, rows))
+    rows, columns, scores = rows[ordering], columns[ordering], scores[ordering]
+    _, starts, sizes = np.unique(rows, return_index=True, return_counts=True)
+    ranks = np.arange(len(rows)) - np.repeat(starts, sizes)
+    top = ranks < top_k
+
+    return rows[top], columns[top], scores[top], ranks[top]
+
+
+class Command(BaseCommand):
+    help = "Build the frequently bought together recommendations from settled orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top-k",
+            type=int,
+            default=10,
+            help="Number of recommendations stored per product",
+        )
+        parser.add_argument(
+            "--max-order-items",
+            type=int,
+            default=50,
+            help="Skip orders with more distinct products than this",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of recommendation rows inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        # get the distinct active products of every settled order
+        order_items = (
+            OrderItem.objects.filter(
+                order__payment_status="settlement", product__is_active=True
+            )
+            .values_list("order_id", "product_id")
+            .order_by("order_id")
+            .distinct()
+        )
+
+        order_ids = {}
+        product_ids = {}
+        order_indexes = []
+        product_indexes = []
+        for order_id, product_id in order_items.iterator():
+            order_indexes.append(order_ids.setdefault(order_id, len(order_ids)))
+            product_indexes.append(product_ids.setdefault(product_id, len(product_ids)))
+
+        order_indexes = np.array(order_indexes, dtype=np.int64)
+        product_indexes = np.array(product_indexes, dtype=np.int64)
+
+        # skip the bulk orders, they pair everything with everything
+        order_sizes = np.bincount(order_indexes, minlength=len(order_ids))
+        keep = order_sizes[order_indexes] <= options["max_order_items"]
+
+        rows, columns, scores, ranks = get_top_similar_products(
+            order_indexes[keep],
+            product_indexes[keep],
+            len(product_ids),
+            options["top_k"],
+        )
+
+        products = list(product_ids)
+        recommendations = [
+            ProductRecommendation(
+                product_id=products[row],
+                recommended_id=products[column],
+                score=float(score),
+                rank=int(rank),
+            )
+            for row, column, score, rank in zip(rows, columns, scores, ranks)
+        ]
+
+        with transaction.atomic():
+            ProductRecommendation.objects.all().delete()
+            ProductRecommendation.objects.bulk_create(
+                recommendations, batch_size=options["batch_size"]
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built {len(recommendations)} recommendations "
+                f"for {len(np.unique(rows))} products"
+            )
+        )
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum, Q
+
+from apps.products.models import Rating, ProductRatingStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized product rating stats from all ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of stats rows inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        # aggregate all ratings per product in one grouped query
+        aggregates = (
+            Rating.objects.values("product_id")
+            .annotate(
+                total_rating=Count("id"),
+                total_star=Sum("star"),
+                star_1=Count("id", filter=Q(star=1)),
+                star_2=Count("id", filter=Q(star=2)),
+                star_3=Count("id", filter=Q(star=3)),
+                star_4=Count("id", filter=Q(star=4)),
+                star_5=Count("id", filter=Q(star=5)),
+            )
+            .order_by()
+        )
+
+        stats = []
+        for aggregate in aggregates:
+            total_rating = aggregate["total_rating"]
+            total_star = aggregate["total_star"] or 0
+            stats.append(
+                ProductRatingStats(
+                    product_id=aggregate["product_id"],
+                    total_rating=total_rating,
+                    total_star=total_star,
+                    star_1=aggregate["star_1"],
+                    star_2=aggregate["star_2"],
+                    star_3=aggregate["star_3"],
+                    star_4=aggregate["star_4"],
+                    star_5=aggregate["star_5"],
+                    average_rating=total_star / total_rating if total_rating else 0,
+                )
+            )
+
+        with transaction.atomic():
+            ProductRatingStats.objects.all().delete()
+            ProductRatingStats.objects.bulk_create(
+                stats, batch_size=options["batch_size"]
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt rating stats for {len(stats)} products")
+        )
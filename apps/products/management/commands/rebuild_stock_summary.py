@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min, Max, Sum
+
+from apps.products.models import Product, Stock
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized price range and availability of all products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of products updated per query",
+        )
+
+    def handle(self, *args, **options):
+        # aggregate all stock per product in one grouped query
+        aggregates = (
+            Stock.objects.values("product_id")
+            .annotate(
+                min_price=Min("price"),
+                max_price=Max("price"),
+                max_discount=Max("discount"),
+                total_quantity=Sum("quantity"),
+            )
+            .order_by()
+        )
+
+        products = []
+        for aggregate in aggregates:
+            total_quantity = aggregate["total_quantity"] or 0
+            products.append(
+                Product(
+                    id=aggregate["product_id"],
+                    min_price=aggregate["min_price"] or 0,
+                    max_price=aggregate["max_price"] or 0,
+                    max_discount=aggregate["max_discount"] or 0,
+                    total_quantity=total_quantity,
+                    in_stock=total_quantity > 0,
+                )
+            )
+
+        with transaction.atomic():
+            # reset products without any stock
+            Product.objects.update(
+                min_price=0,
+                max_price=0,
+                max_discount=0,
+                total_quantity=0,
+                in_stock=False,
+            )
+            Product.objects.bulk_update(
+                products,
+                [
+                    "min_price",
+                    "max_price",
+                    "max_discount",
+                    "total_quantity",
+                    "in_stock",
+                ],
+                batch_size=options["batch_size"],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt stock summary for {len(products)} products")
+        )
@@ -1,4 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    F,
+    ExpressionWrapper,
+    Min,
+    Max,
+    Sum,
+    OuterRef,
+    Subquery,
+)
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan
 from django.utils.text import slugify
 from django.contrib.auth import get_user_model
 import uuid
@@ -234,9 +245,42 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=False)
+    # denormalized from the product stock, see update_stock_summary()
+    min_price = models.IntegerField(default=0, editable=False, db_index=True)
+    max_price = models.IntegerField(default=0, editable=False, db_index=True)
+    max_discount = models.IntegerField(default=0, editable=False, db_index=True)
+    total_quantity = models.IntegerField(default=0, editable=False, db_index=True)
+    in_stock = models.BooleanField(default=False, editable=False, db_index=True)
+
+    class Meta:
+        # keyset cursor pagination, see KeysetCursorPagination
+        indexes = [models.Index(fields=["-created_at", "-id"])]
+
+    # maintained from the stock by update_stock_summaries() only
+    STOCK_SUMMARY_FIELDS = [
+        "min_price",
+        "max_price",
+        "max_discount",
+        "total_quantity",
+        "in_stock",
+    ]
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
+
+        # don't write back stock summary columns loaded before a stock change
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STOCK_SUMMARY_FIELDS
+            ]
+        elif kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = [
+                field
+                for field in kwargs["update_fields"]
+                if field not in self.STOCK_SUMMARY_FIELDS
+            ]
         super(Product, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -246,6 +290,39 @@ class Product(models.Model):
         self.cover.delete()
         super(Product, self).delete(*args, **kwargs)
 
+    @classmethod
+    def update_stock_summary(cls, product_id):
+        """
+        Recalculate the price range and availability columns of a product
+        from its stock
+        """
+        cls.update_stock_summaries([product_id])
+
+    @classmethod
+    def update_stock_summaries(cls, product_ids):
+        """
+        Recalculate the price range and availability columns of many
+        products from their stock in one update query, so the stock is
+        aggregated with the product rows locked by the update itself
+        """
+        stock = (
+            Stock.objects.filter(product=OuterRef("pk")).order_by().values("product")
+        )
+
+        def aggregate_stock(aggregate):
+            return Coalesce(
+                Subquery(stock.annotate(value=aggregate).values("value")), 0
+            )
+
+        total_quantity = aggregate_stock(Sum("quantity"))
+        cls.objects.filter(id__in=product_ids).update(
+            min_price=aggregate_stock(Min("price")),
+            max_price=aggregate_stock(Max("price")),
+            max_discount=aggregate_stock(Max("discount")),
+            total_quantity=total_quantity,
+            in_stock=GreaterThan(total_quantity, 0),
+        )
+
 
 class Rating(models.Model):
     id = models.UUIDField(
@@ -270,18 +347,122 @@ class Rating(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "product"]),
+            # keyset cursor pagination, see KeysetCursorPagination
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["product", "-created_at", "-id"]),
+        ]
+
     def __str__(self):
         return f"{self.product.slug} - {self.user.pk} - {self.star}"
 
     def save(self, *args, **kwargs):
         profanity_filter = AdvancedProfanityFilter()
         self.review = profanity_filter.censor(self.review)
-        super(Rating, self).save(*args, **kwargs)
+
+        with transaction.atomic():
+            # lock the previous product and star to revert them from the stats
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    Rating.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values("product_id", "star")
+                    .first()
+                )
+
+            super(Rating, self).save(*args, **kwargs)
+
+            # update the product rating stats when the star or product changed
+            if previous != {"product_id": self.product_id, "star": self.star}:
+                if previous:
+                    ProductRatingStats.add_rating(
+                        previous["product_id"], previous["star"], -1
+                    )
+                ProductRatingStats.add_rating(self.product_id, self.star, 1)
 
     def delete(self, *args, **kwargs):
         self.image.delete()
         self.video.delete()
-        super(Rating, self).delete(*args, **kwargs)
+        with transaction.atomic():
+            # lock the stored product and star, this instance may be stale
+            stored = (
+                Rating.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values("product_id", "star")
+                .first()
+            )
+            super(Rating, self).delete(*args, **kwargs)
+            if stored:
+                ProductRatingStats.add_rating(stored["product_id"], stored["star"], -1)
+
+
+class ProductRatingStats(models.Model):
+    """
+    Denormalized rating statistics of a product, updated incrementally
+    by Rating.save() and Rating.delete(). Use the rebuild_rating_stats
+    command to recalculate it from the ratings.
+    """
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
+    )
+    product = models.OneToOneField(
+        Product, related_name="rating_stats", on_delete=models.CASCADE
+    )
+    total_rating = models.IntegerField(default=0)
+    total_star = models.IntegerField(default=0)
+    star_1 = models.IntegerField(default=0)
+    star_2 = models.IntegerField(default=0)
+    star_3 = models.IntegerField(default=0)
+    star_4 = models.IntegerField(default=0)
+    star_5 = models.IntegerField(default=0)
+    average_rating = models.FloatField(default=0, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "product rating stats"
+
+    def __str__(self):
+        return f"{self.product.slug} - {self.average_rating}"
+
+    @staticmethod
+    def star_field(star):
+        if 1 <= star <= 5:
+            return f"star_{star}"
+        return None
+
+    @classmethod
+    def add_rating(cls, product_id, star, count=1):
+        """
+        Add (or remove, with a negative count) ratings with the given star
+        to the stats of a product using atomic column updates.
+        """
+        cls.objects.get_or_create(product_id=product_id)
+        stats = cls.objects.filter(product_id=product_id)
+
+        changes = {
+            "total_rating": F("total_rating") + count,
+            "total_star": F("total_star") + star * count,
+        }
+        field = cls.star_field(star)
+        if field:
+            changes[field] = F(field) + count
+        stats.update(**changes)
+
+        # recalculate the average from the updated columns
+        stats.filter(total_rating__gt=0).update(
+            average_rating=ExpressionWrapper(
+                F("total_star") * 1.0 / F("total_rating"),
+                output_field=models.FloatField(),
+            )
+        )
+        stats.filter(total_rating__lte=0).update(average_rating=0)
+
+    def get_histogram(self):
+        return {star: getattr(self, f"star_{star}") for star in range(1, 6)}
 
 
 class Wishlist(models.Model):
@@ -333,9 +514,27 @@ class Stock(models.Model):
     def __str__(self):
         return f"{self.product.slug} - {self.price}"
 
+    def save(self, *args, **kwargs):
+        # get the previous product to update its summary when stock is moved
+        previous_product_id = None
+        if not self._state.adding:
+            previous_product_id = (
+                Stock.objects.filter(pk=self.pk)
+                .values_list("product_id", flat=True)
+                .first()
+            )
+
+        with transaction.atomic():
+            super(Stock, self).save(*args, **kwargs)
+            Product.update_stock_summary(self.product_id)
+            if previous_product_id and previous_product_id != self.product_id:
+                Product.update_stock_summary(previous_product_id)
+
     def delete(self, *args, **kwargs):
         self.variant_image.delete()
-        super(Stock, self).delete(*args, **kwargs)
+        with transaction.atomic():
+            super(Stock, self).delete(*args, **kwargs)
+            Product.update_stock_summary(self.product_id)
 
 
 class ExtraProductImage(models.Model):
@@ -378,3 +577,36 @@ class ExtraProductVideo(models.Model):
     def delete(self, *args, **kwargs):
         self.video.delete()
         super(ExtraProductVideo, self).delete(*args, **kwargs)
+
+
+class ProductRecommendation(models.Model):
+    """
+    Top-K "frequently bought together" products of a product, by cosine
+    similarity of their co-purchases in settled orders. Use the
+    build_product_recommendations command to rebuild it.
+    """
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
+    )
+    product = models.ForeignKey(
+        Product, related_name="recommendations", on_delete=models.CASCADE
+    )
+    recommended = models.ForeignKey(
+        Product, related_name="recommended_in", on_delete=models.CASCADE
+    )
+    score = models.FloatField(default=0)
+    rank = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "recommended"],
+                name="unique_product_recommendation",
+            )
+        ]
+        indexes = [models.Index(fields=["product", "rank"])]
+
+    def __str__(self):
+        return f"{self.product.slug} - {self.recommended.slug} - {self.rank}"
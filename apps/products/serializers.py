@@ -12,6 +12,7 @@ from .models import (
     Stock,
     ExtraProductImage,
     ExtraProductVideo,
+    ProductRatingStats,
 )
 from apps.accounts.serializers import BasicUserSerializer
 
@@ -71,6 +72,18 @@ class CategorySerializer(serializers.ModelSerializer):
         return subcategory_serializer.data
 
 
+class CategoryTreeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = "__all__"
+
+
+class SubcategoryTreeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Subcategory
+        fields = "__all__"
+
+
 class SearchCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -102,19 +115,34 @@ class StockSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class CompactProductSerializer(serializers.ModelSerializer):
+    brand_name = serializers.CharField(source="brand.name", read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            "id",
+            "name",
+            "slug",
+            "cover",
+            "brand",
+            "brand_name",
+            "min_price",
+            "max_price",
+            "max_discount",
+            "in_stock",
+            "is_active",
+        ]
+
+
 class RatingSerializer(serializers.ModelSerializer):
-    user_data = serializers.SerializerMethodField()
+    user_data = BasicUserSerializer(source="user", read_only=True)
 
     class Meta:
         model = Rating
         fields = "__all__"
         read_only_fields = ["user"]
 
-    def get_user_data(self, obj):
-        user = obj.user
-        user_serializer = BasicUserSerializer(user)
-        return user_serializer.data
-
     def validate_image(self, value):
         if value:
             value = FileUploadHelper(value, webp=True).validate()
@@ -127,28 +155,18 @@ class RatingSerializer(serializers.ModelSerializer):
 
 
 class WishlistSerializer(serializers.ModelSerializer):
-    user_data = serializers.SerializerMethodField()
-    product_details = serializers.SerializerMethodField()
+    user_data = BasicUserSerializer(source="user", read_only=True)
+    product_details = CompactProductSerializer(source="product", read_only=True)
 
     class Meta:
         model = Wishlist
         fields = "__all__"
         read_only_fields = ["user"]
 
-    def get_user_data(self, obj):
-        user = obj.user
-        user_serializer = BasicUserSerializer(user)
-        return user_serializer.data
-
-    def get_product_details(self, obj):
-        product = obj.product
-        product_serializer = ProductSerializer(product)
-        return product_serializer.data
-
 
 class ProductSerializer(serializers.ModelSerializer):
-    min_price = serializers.IntegerField(read_only=True)
-    max_price = serializers.IntegerField(read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+    total_rating = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
@@ -160,6 +178,17 @@ class ProductSerializer(serializers.ModelSerializer):
             return value
 
 
+class ProductRatingStatsSerializer(serializers.ModelSerializer):
+    histogram = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductRatingStats
+        fields = ["total_rating", "average_rating", "histogram"]
+
+    def get_histogram(self, obj):
+        return obj.get_histogram()
+
+
 class ExtraProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExtraProductImage
@@ -182,30 +211,32 @@ class ExtraProductVideoSerializer(serializers.ModelSerializer):
             return value
 
 
+def get_file_url(file):
+    # get the file url, or None when the file is empty
+    return file.url if file else None
+
+
 class TopCategorySerializer(serializers.Serializer):
-    category_id = serializers.UUIDField()
-    category_name = serializers.CharField()
+    category_id = serializers.UUIDField(source="category.id")
+    category_name = serializers.CharField(source="category.name")
     category_cover = serializers.SerializerMethodField()
     category_cover_mobile = serializers.SerializerMethodField()
     category_cover_homepage = serializers.SerializerMethodField()
     total_sales = serializers.IntegerField()
 
     def get_category_cover(self, obj):
-        category = Category.objects.get(id=obj["category_id"])
-        return category.cover.url
+        return get_file_url(obj["category"].cover)
 
     def get_category_cover_mobile(self, obj):
-        category = Category.objects.get(id=obj["category_id"])
-        return category.cover_mobile.url
+        return get_file_url(obj["category"].cover_mobile)
 
     def get_category_cover_homepage(self, obj):
-        category = Category.objects.get(id=obj["category_id"])
-        return category.cover_homepage.url
+        return get_file_url(obj["category"].cover_homepage)
 
 
 class TopBrandSerializer(serializers.Serializer):
-    brand_id = serializers.UUIDField()
-    brand_name = serializers.CharField()
+    brand_id = serializers.UUIDField(source="brand.id")
+    brand_name = serializers.CharField(source="brand.name")
     brand_logo = serializers.SerializerMethodField()
     brand_cover = serializers.SerializerMethodField()
     brand_cover_mobile = serializers.SerializerMethodField()
@@ -213,17 +244,26 @@ class TopBrandSerializer(serializers.Serializer):
     total_sales = serializers.IntegerField()
 
     def get_brand_logo(self, obj):
-        brand = Brand.objects.get(id=obj["brand_id"])
-        return brand.logo.url
+        return get_file_url(obj["brand"].logo)
 
     def get_brand_cover(self, obj):
-        brand = Brand.objects.get(id=obj["brand_id"])
-        return brand.cover.url
+        return get_file_url(obj["brand"].cover)
 
     def get_brand_cover_mobile(self, obj):
-        brand = Brand.objects.get(id=obj["brand_id"])
-        return brand.cover_mobile.url
+        return get_file_url(obj["brand"].cover_mobile)
 
     def get_brand_cover_homepage(self, obj):
-        brand = Brand.objects.get(id=obj["brand_id"])
-        return brand.cover_homepage.url
+        return get_file_url(obj["brand"].cover_homepage)
+
+
+class TopProductSerializer(serializers.Serializer):
+    product_id = serializers.UUIDField(source="product.id")
+    product_name = serializers.CharField(source="product.name")
+    product_slug = serializers.CharField(source="product.slug")
+    product_cover = serializers.SerializerMethodField()
+    min_price = serializers.IntegerField(source="product.min_price")
+    max_price = serializers.IntegerField(source="product.max_price")
+    total_sales = serializers.IntegerField()
+
+    def get_product_cover(self, obj):
+        return get_file_url(obj["product"].cover)
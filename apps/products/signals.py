@@ -0,0 +1,72 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+    ExtraProductImage,
+    ExtraProductVideo,
+    Rating,
+    Wishlist,
+)
+from .helpers import (
+    invalidate_product_detail_cache,
+    invalidate_product_detail_cache_by_id,
+    invalidate_category_tree_cache,
+)
+
+
+# Keep the previous slug to invalidate it when the product is renamed
+@receiver(pre_save, sender=Product)
+def keep_previous_product_slug(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._previous_slug = None
+    else:
+        instance._previous_slug = (
+            Product.objects.filter(id=instance.id)
+            .values_list("slug", flat=True)
+            .first()
+        )
+
+
+# Invalidate product detail cache when product is saved or deleted
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_detail(sender, instance, **kwargs):
+    invalidate_product_detail_cache(instance.slug)
+
+    previous_slug = getattr(instance, "_previous_slug", None)
+    if previous_slug and previous_slug != instance.slug:
+        invalidate_product_detail_cache(previous_slug)
+
+    # the product counts of the category tree may have changed
+    invalidate_category_tree_cache(product_count_only=True)
+
+
+# Invalidate product detail cache when related data of a product is changed
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+@receiver(post_save, sender=ExtraProductImage)
+@receiver(post_delete, sender=ExtraProductImage)
+@receiver(post_save, sender=ExtraProductVideo)
+@receiver(post_delete, sender=ExtraProductVideo)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def invalidate_related_product_detail(sender, instance, **kwargs):
+    invalidate_product_detail_cache_by_id(instance.product_id)
+
+
+# Invalidate category tree cache when the taxonomy is saved or deleted
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+@receiver(post_save, sender=Subsubcategory)
+@receiver(post_delete, sender=Subsubcategory)
+def invalidate_category_tree(sender, instance, **kwargs):
+    invalidate_category_tree_cache()
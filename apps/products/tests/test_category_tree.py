@@ -0,0 +1,97 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+)
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def taxonomy(db):
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    for category_index in range(3):
+        category = Category.objects.create(
+            name=f"Category {category_index}", description="Category"
+        )
+        for subcategory_index in range(2):
+            subcategory = Subcategory.objects.create(
+                name=f"Subcategory {category_index}-{subcategory_index}",
+                description="Subcategory",
+                category=category,
+            )
+            subsubcategory = Subsubcategory.objects.create(
+                name=f"Subsubcategory {category_index}-{subcategory_index}",
+                description="Subsubcategory",
+                subcategory=subcategory,
+            )
+            Product.objects.create(
+                name=f"Product {category_index}-{subcategory_index}",
+                description="Product",
+                brand=brand,
+                category=category,
+                subcategory=subcategory,
+                subsubcategory=subsubcategory,
+                is_active=True,
+            )
+
+
+def get_category_tree(query=""):
+    return APIClient().get(f"/api/v1/category-tree/{query}")
+
+
+@pytest.mark.django_db
+def test_category_tree_query_count(taxonomy, django_assert_num_queries):
+    # Act: one query per taxonomy level, plus one for the product counts
+    with django_assert_num_queries(3):
+        response = get_category_tree()
+    with django_assert_num_queries(4):
+        get_category_tree("?product_count=true")
+
+    # Assert
+    assert response.status_code == 200
+    assert [category["name"] for category in response.data] == [
+        "Category 0",
+        "Category 1",
+        "Category 2",
+    ]
+    subcategories = response.data[0]["subcategory"]
+    assert [subcategory["name"] for subcategory in subcategories] == [
+        "Subcategory 0-0",
+        "Subcategory 0-1",
+    ]
+    assert subcategories[0]["subsubcategory"][0]["name"] == "Subsubcategory 0-0"
+    assert "product_count" not in response.data[0]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_category_tree_product_count_and_invalidation(taxonomy):
+    # Arrange
+    response = get_category_tree("?product_count=true")
+    assert response.data[0]["product_count"] == 2
+    assert response.data[0]["subcategory"][0]["product_count"] == 1
+    assert response.data[0]["subcategory"][0]["subsubcategory"][0]["product_count"] == 1
+
+    # Act
+    Product.objects.filter(name="Product 0-0").first().delete()
+    Category.objects.create(name="Category 3", description="Category")
+
+    # Assert
+    response = get_category_tree("?product_count=true")
+    assert response.data[0]["product_count"] == 1
+    assert response.data[-1]["name"] == "Category 3"
+    assert response.data[-1]["subcategory"] == []
+    assert get_category_tree().data[-1]["name"] == "Category 3"
@@ -0,0 +1,161 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+    Rating,
+    Wishlist,
+    ExtraProductImage,
+)
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def product(db):
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    product = Product.objects.create(
+        name="Test Product",
+        description="Product",
+        brand=brand,
+        category=category,
+        subcategory=subcategory,
+        subsubcategory=subsubcategory,
+        is_active=True,
+    )
+    Product.objects.create(
+        name="Related Product",
+        description="Product",
+        brand=brand,
+        category=category,
+        subcategory=subcategory,
+        subsubcategory=subsubcategory,
+        is_active=True,
+    )
+    return product
+
+
+def create_ratings(product, stars):
+    for index, star in enumerate(stars):
+        user = User.objects.create_user(
+            email=f"user{index}@example.com",
+            password="password",
+            first_name="Test",
+            last_name="User",
+        )
+        Rating.objects.create(user=user, product=product, star=star, review="Review")
+        Wishlist.objects.create(user=user, product=product)
+
+
+def get_product_detail(product):
+    return APIClient().get(f"/api/v1/product/{product.slug}/")
+
+
+@pytest.mark.django_db
+def test_product_detail_query_count(product, django_assert_num_queries):
+    # Arrange
+    Stock.objects.create(product=product, sku="SKU-1", price=1000)
+    Stock.objects.create(product=product, sku="SKU-2", price=3000)
+    ExtraProductImage.objects.create(product=product)
+    create_ratings(product, [5, 4, 3, 2, 1, 5, 4])
+
+    # Act & Assert: the product lookup, then the detail payload
+    with django_assert_num_queries(7):
+        response = get_product_detail(product)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_product_detail_query_count_is_constant(product, django_assert_num_queries):
+    # Arrange
+    create_ratings(product, [5, 4, 3, 2, 1] * 4)
+
+    # Act & Assert
+    with django_assert_num_queries(7):
+        response = get_product_detail(product)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_product_detail_payload(product):
+    # Arrange
+    Stock.objects.create(product=product, sku="SKU-1", price=1000)
+    Stock.objects.create(product=product, sku="SKU-2", price=3000)
+    create_ratings(product, [5, 4, 3, 2, 1, 5, 4])
+
+    # Act
+    data = get_product_detail(product).json()
+
+    # Assert
+    assert data["product"]["min_price"] == 1000
+    assert data["product"]["max_price"] == 3000
+    assert data["total_wishlist"] == 7
+    assert len(data["stock"]) == 2
+    assert len(data["latest_rating"]) == 5
+    assert [rating["star"] for rating in data["highest_rating"]] == [5, 5, 4]
+    assert [rating["star"] for rating in data["lowest_rating"]] == [3, 2, 1]
+    assert data["latest_rating"][0]["user_data"]["email"] == "user6@example.com"
+    assert len(data["related_products"]) == 1
+
+
+@pytest.mark.django_db
+def test_cached_product_detail_is_served_after_lookup(
+    product, django_assert_num_queries
+):
+    # Arrange: cache the detail, then hide the product from the queryset
+    get_product_detail(product)
+    slug = product.slug
+
+    # Act & Assert: a cache hit still looks the product up
+    with django_assert_num_queries(1):
+        response = get_product_detail(product)
+    assert response.status_code == 200
+
+    Product.objects.filter(pk=product.pk).update(slug="hidden-product")
+    response = APIClient().get(f"/api/v1/product/{slug}/")
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_product_save_keeps_stock_summary(product):
+    # Arrange: a product loaded before its stock changes
+    stale = Product.objects.get(pk=product.pk)
+    Stock.objects.create(product=product, sku="SKU-1", price=1000, quantity=5)
+
+    # Act
+    stale.description = "Updated"
+    stale.save()
+
+    # Assert
+    product.refresh_from_db()
+    assert product.description == "Updated"
+    assert product.min_price == 1000
+    assert product.total_quantity == 5
+    assert product.in_stock
@@ -0,0 +1,119 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+)
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def products(db):
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+
+    def create(category_name, name, price):
+        category, _ = Category.objects.get_or_create(
+            name=category_name, defaults={"description": "Category"}
+        )
+        subcategory, _ = Subcategory.objects.get_or_create(
+            name=f"{category_name} Subcategory",
+            defaults={"description": "Subcategory", "category": category},
+        )
+        subsubcategory, _ = Subsubcategory.objects.get_or_create(
+            name=f"{category_name} Subsubcategory",
+            defaults={"description": "Subsubcategory", "subcategory": subcategory},
+        )
+        product = Product.objects.create(
+            name=name,
+            description="Product",
+            brand=brand,
+            category=category,
+            subcategory=subcategory,
+            subsubcategory=subsubcategory,
+            is_active=True,
+        )
+        Stock.objects.create(product=product, sku=f"SKU-{name}", price=price)
+        return product
+
+    return [
+        create("Shoes", "Cheap Shoes", 10000),
+        create("Shoes", "Fancy Shoes", 300000),
+        create("Bags", "Bag", 60000),
+    ]
+
+
+def price_counts(response):
+    return {
+        bucket["label"]: bucket["count"] for bucket in response.data["facets"]["price"]
+    }
+
+
+@pytest.mark.django_db
+def test_product_facets_count_the_filtered_products(products):
+    # Arrange
+    client = APIClient()
+
+    # Act
+    response = client.get("/api/v1/product/?category__slug=shoes&facets=category,price")
+
+    # Assert
+    assert response.status_code == 200
+    assert response.data["facets"]["category"] == [
+        {
+            "id": products[0].category_id,
+            "name": "Shoes",
+            "slug": "shoes",
+            "count": 2,
+        }
+    ]
+    assert price_counts(response) == {
+        "0-50000": 1,
+        "50000-100000": 0,
+        "100000-250000": 0,
+        "250000-500000": 1,
+        "500000+": 0,
+    }
+
+
+@pytest.mark.django_db
+def test_product_facets_reject_unknown_facets(products):
+    # Act
+    response = APIClient().get("/api/v1/product/?facets=category,color")
+
+    # Assert
+    assert response.status_code == 400
+    assert "color" in str(response.data)
+
+
+@pytest.mark.django_db
+def test_product_facets_are_cached_for_category_pages_only(products):
+    # Arrange: facets of a category page and of a filtered page
+    client = APIClient()
+    category_page = "/api/v1/product/?category__slug=shoes&facets=price"
+    filtered_page = category_page + "&min_price__lte=400000"
+    client.get(category_page + "&ordering=name")
+    client.get(filtered_page)
+
+    # Act: a product moves to another price bucket
+    Product.objects.filter(id=products[0].id).update(min_price=200000)
+    cached = client.get(category_page)
+    filtered = client.get(filtered_page)
+
+    # Assert: only the category page is served from the cache
+    assert price_counts(cached)["0-50000"] == 1
+    assert price_counts(filtered)["0-50000"] == 0
+    assert price_counts(filtered)["100000-250000"] == 1
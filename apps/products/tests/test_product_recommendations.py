@@ -0,0 +1,87 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from apps.orders.models import Order, OrderItem
+from apps.products.helpers import get_related_products, get_cart_recommendations
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    ProductRecommendation,
+    Stock,
+)
+
+User = get_user_model()
+
+
+@pytest.fixture
+def products(db):
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    products = {}
+    for name in ["A", "B", "C", "D"]:
+        # every product has its own brand so there is no fallback
+        brand = Brand.objects.create(name=f"Brand {name}", description="Brand")
+        products[name] = Product.objects.create(
+            name=name,
+            description="Product",
+            brand=brand,
+            category=category,
+            subcategory=subcategory,
+            subsubcategory=subsubcategory,
+            is_active=True,
+        )
+        Stock.objects.create(product=products[name], sku=f"SKU-{name}", price=1000)
+    return products
+
+
+def create_order(user, products, payment_status="settlement"):
+    order = Order.objects.create(user=user, payment_status=payment_status)
+    for product in products:
+        OrderItem.objects.create(
+            order=order,
+            product=product,
+            product_name=product.name,
+            stock=product.product_stock.first(),
+        )
+    return order
+
+
+@pytest.mark.django_db
+def test_build_product_recommendations(products):
+    # Arrange
+    user = User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+    a, b, c, d = products["A"], products["B"], products["C"], products["D"]
+    create_order(user, [a, b])
+    create_order(user, [a, b])
+    create_order(user, [a, c])
+    create_order(user, [a, d], payment_status="pending")
+
+    # Act
+    call_command("build_product_recommendations", "--top-k", "2")
+
+    # Assert
+    recommendations = ProductRecommendation.objects.filter(product=a).order_by("rank")
+    assert [recommendation.recommended for recommendation in recommendations] == [
+        b,
+        c,
+    ]
+    assert recommendations[0].score == pytest.approx(2 / (3 * 2) ** 0.5)
+    assert not ProductRecommendation.objects.filter(recommended=d).exists()
+    assert list(get_related_products(b)) == [a]
+    assert list(get_cart_recommendations({b.id, c.id})) == [a]
@@ -0,0 +1,99 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Rating,
+    ProductRatingStats,
+)
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def products(db):
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    return [
+        Product.objects.create(
+            name=f"Product {index}",
+            description="Product",
+            brand=brand,
+            category=category,
+            subcategory=subcategory,
+            subsubcategory=subsubcategory,
+            is_active=True,
+        )
+        for index in range(3)
+    ]
+
+
+def rate(product, star, email):
+    user, _ = User.objects.get_or_create(
+        email=email, defaults={"first_name": "Test", "last_name": "User"}
+    )
+    return Rating.objects.create(user=user, product=product, star=star, review="Ok")
+
+
+def names(response):
+    return [product["name"] for product in response.data["results"]]
+
+
+@pytest.mark.django_db
+def test_rating_stats_revert_the_stored_star(products):
+    # Arrange: two copies of the same rating
+    rating = rate(products[0], 5, "user@example.com")
+    stale = Rating.objects.get(pk=rating.pk)
+
+    # Act: edit one copy, then delete the other
+    rating.star = 2
+    rating.save()
+    stale.delete()
+
+    # Assert
+    stats = ProductRatingStats.objects.get(product=products[0])
+    assert stats.total_rating == 0
+    assert stats.total_star == 0
+    assert stats.get_histogram() == {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+
+
+@pytest.mark.django_db
+def test_product_list_filters_and_orders_by_rating_star(products):
+    # Arrange
+    rate(products[0], 5, "first@example.com")
+    rate(products[1], 2, "first@example.com")
+    rate(products[1], 4, "second@example.com")
+    client = APIClient()
+
+    # Act
+    at_least_4 = client.get("/api/v1/product/?product_ratings__star__gte=4")
+    exactly_2 = client.get("/api/v1/product/?product_ratings__star=2")
+    ordered = client.get("/api/v1/product/?ordering=-product_ratings__star")
+
+    # Assert
+    assert sorted(names(at_least_4)) == ["Product 0", "Product 1"]
+    assert names(exactly_2) == ["Product 1"]
+    assert names(ordered) == ["Product 0", "Product 1", "Product 2"]
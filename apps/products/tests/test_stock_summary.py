@@ -0,0 +1,101 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Stock,
+)
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def products(db):
+    brand = Brand.objects.create(name="Test Brand", description="Brand")
+    category = Category.objects.create(name="Test Category", description="Category")
+    subcategory = Subcategory.objects.create(
+        name="Test Subcategory", description="Subcategory", category=category
+    )
+    subsubcategory = Subsubcategory.objects.create(
+        name="Test Subsubcategory",
+        description="Subsubcategory",
+        subcategory=subcategory,
+    )
+    return [
+        Product.objects.create(
+            name=f"Product {index}",
+            description="Product",
+            brand=brand,
+            category=category,
+            subcategory=subcategory,
+            subsubcategory=subsubcategory,
+            is_active=True,
+        )
+        for index in range(3)
+    ]
+
+
+def names(response):
+    return [product["name"] for product in response.data["results"]]
+
+
+@pytest.mark.django_db
+def test_stock_summaries_are_updated_in_one_query(products, django_assert_num_queries):
+    # Arrange: stock changed by queryset updates
+    Stock.objects.bulk_create(
+        [
+            Stock(product=products[0], sku="SKU-1", price=3000, quantity=2),
+            Stock(product=products[0], sku="SKU-2", price=1000, discount=10),
+            Stock(product=products[1], sku="SKU-3", price=2000, discount=5),
+        ]
+    )
+
+    # Act
+    with django_assert_num_queries(1):
+        Product.update_stock_summaries([product.id for product in products])
+
+    # Assert
+    summaries = {
+        product.name: [
+            getattr(product, field) for field in Product.STOCK_SUMMARY_FIELDS
+        ]
+        for product in Product.objects.all()
+    }
+    assert summaries == {
+        "Product 0": [1000, 3000, 10, 2, True],
+        "Product 1": [2000, 2000, 5, 0, False],
+        "Product 2": [0, 0, 0, 0, False],
+    }
+
+
+@pytest.mark.django_db
+def test_product_list_filters_and_orders_by_stock_price_and_discount(products):
+    # Arrange
+    Stock.objects.create(product=products[0], sku="SKU-1", price=3000)
+    Stock.objects.create(product=products[1], sku="SKU-2", price=1000, discount=20)
+    Stock.objects.create(product=products[2], sku="SKU-3", price=2000, discount=10)
+    client = APIClient()
+
+    # Act
+    cheap = client.get("/api/v1/product/?product_stock__price__lte=2000")
+    discounted = client.get("/api/v1/product/?product_stock__discount__gte=10")
+    by_price = client.get("/api/v1/product/?ordering=-product_stock__price")
+    by_discount = client.get("/api/v1/product/?ordering=product_stock__discount")
+
+    # Assert
+    assert sorted(names(cheap)) == ["Product 1", "Product 2"]
+    assert sorted(names(discounted)) == ["Product 1", "Product 2"]
+    assert names(by_price) == ["Product 0", "Product 2", "Product 1"]
+    assert names(by_discount) == ["Product 0", "Product 2", "Product 1"]
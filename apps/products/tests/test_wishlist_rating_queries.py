@@ -0,0 +1,107 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.products.models import (
+    Brand,
+    Category,
+    Subcategory,
+    Subsubcategory,
+    Product,
+    Rating,
+    Wishlist,
+)
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+
+
+def create_products(count):
+    category, _ = Category.objects.get_or_create(
+        name="Test Category", defaults={"description": "Category"}
+    )
+    subcategory, _ = Subcategory.objects.get_or_create(
+        name="Test Subcategory",
+        defaults={"description": "Subcategory", "category": category},
+    )
+    subsubcategory, _ = Subsubcategory.objects.get_or_create(
+        name="Test Subsubcategory",
+        defaults={"description": "Subsubcategory", "subcategory": subcategory},
+    )
+    start = Product.objects.count()
+    return [
+        Product.objects.create(
+            name=f"Product {index}",
+            description="Product",
+            brand=Brand.objects.create(name=f"Brand {index}", description="Brand"),
+            category=category,
+            subcategory=subcategory,
+            subsubcategory=subsubcategory,
+            is_active=True,
+        )
+        for index in range(start, start + count)
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("count", [1, 5])
+def test_wishlist_list_query_count(user, count, django_assert_num_queries):
+    # Arrange
+    for product in create_products(count):
+        Wishlist.objects.create(user=user, product=product)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    # Act: count and page, whatever the number of rows
+    with django_assert_num_queries(2):
+        response = client.get("/api/v1/wishlist/")
+
+    # Assert
+    assert response.status_code == 200
+    assert len(response.data["results"]) == count
+    result = response.data["results"][0]
+    assert result["user_data"]["email"] == user.email
+    assert result["product_details"]["brand_name"].startswith("Brand")
+    assert "min_price" in result["product_details"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("count", [1, 5])
+def test_rating_list_query_count(count, django_assert_num_queries):
+    # Arrange
+    for index, product in enumerate(create_products(count)):
+        user = User.objects.create_user(
+            email=f"user{index}@example.com",
+            password="password",
+            first_name="Test",
+            last_name="User",
+        )
+        Rating.objects.create(user=user, product=product, star=5, review="Review")
+
+    # Act: count and page, whatever the number of rows
+    with django_assert_num_queries(2):
+        response = APIClient().get("/api/v1/rating/")
+
+    # Assert
+    assert response.status_code == 200
+    assert len(response.data["results"]) == count
+    assert response.data["results"][0]["user_data"]["first_name"] == "Test"
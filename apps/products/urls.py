@@ -12,6 +12,8 @@ from .views import (
     StockViewSet,
     TopBrandsAPIView,
     TopCategoryAPIView,
+    TopProductsAPIView,
+    CategoryTreeAPIView,
 )
 
 router = DefaultRouter()
@@ -26,6 +28,8 @@ router.register("stock", StockViewSet, basename="stock")
 
 urlpatterns = [
     path("v1/", include(router.urls)),
+    path("v1/category-tree/", CategoryTreeAPIView.as_view(), name="category-tree"),
     path("v1/top-brands/", TopBrandsAPIView.as_view(), name="top-brands"),
     path("v1/top-category/", TopCategoryAPIView.as_view(), name="top-category"),
+    path("v1/top-products/", TopProductsAPIView.as_view(), name="top-products"),
 ]
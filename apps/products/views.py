@@ -1,13 +1,14 @@
 from rest_framework import viewsets, views, permissions
 from django.contrib.auth import get_user_model
 from rest_framework import filters
+from django_filters import rest_framework as django_filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
-from django.db.models import Min, Max, Sum, F
+from django.db.models import F, Q
 from django.db.models.functions import Coalesce
 from rest_framework import serializers
 
-from apps.orders.models import Order, OrderItem
+from apps.orders.helpers import is_purchased_product
 from .models import (
     Category,
     Product,
@@ -17,8 +18,7 @@ from .models import (
     Rating,
     Wishlist,
     Stock,
-    ExtraProductImage,
-    ExtraProductVideo,
+    ProductRatingStats,
 )
 from .serializers import (
     CategorySerializer,
@@ -29,45 +29,138 @@ from .serializers import (
     RatingSerializer,
     WishlistSerializer,
     StockSerializer,
-    ExtraProductImageSerializer,
-    ExtraProductVideoSerializer,
     TopCategorySerializer,
     TopBrandSerializer,
+    TopProductSerializer,
 )
 
+from .helpers import (
+    assemble_product_detail,
+    get_cached_product_detail,
+    set_cached_product_detail,
+    get_cached_product_facets,
+    parse_product_facets,
+    get_cached_category_tree,
+)
+from apps.orders.helpers import get_cached_sales_leaderboard
 from tools.custom_permissions import IsAdminOrReadOnly, IsAuthenticatedOrReadOnly
+from tools.custom_paginations import OptionalCursorPagination
 
 User = get_user_model()
 
 
+class ProductFilter(django_filters.FilterSet):
+    """
+    Filter the products with a rating of the given star (or at least, or at
+    most the given star) from the star histogram of their rating stats, and
+    by the stock price and discount from the stock summary columns
+    """
+
+    product_stock__price = django_filters.NumberFilter(field_name="min_price")
+    product_stock__price__gte = django_filters.NumberFilter(
+        field_name="min_price", lookup_expr="gte"
+    )
+    product_stock__price__lte = django_filters.NumberFilter(
+        field_name="min_price", lookup_expr="lte"
+    )
+    product_stock__discount = django_filters.NumberFilter(field_name="max_discount")
+    product_stock__discount__gte = django_filters.NumberFilter(
+        field_name="max_discount", lookup_expr="gte"
+    )
+    product_stock__discount__lte = django_filters.NumberFilter(
+        field_name="max_discount", lookup_expr="lte"
+    )
+
+    product_ratings__star = django_filters.NumberFilter(method="filter_rating_star")
+    product_ratings__star__gte = django_filters.NumberFilter(
+        method="filter_rating_star"
+    )
+    product_ratings__star__lte = django_filters.NumberFilter(
+        method="filter_rating_star"
+    )
+
+    class Meta:
+        model = Product
+        fields = {
+            "category__slug": ["exact"],
+            "subcategory__slug": ["exact"],
+            "subsubcategory__slug": ["exact"],
+            "brand__slug": ["exact"],
+            "brand__name": ["istartswith"],
+            "name": ["istartswith"],
+            "min_price": ["exact", "gte", "lte"],
+            "max_price": ["exact", "gte", "lte"],
+            "max_discount": ["exact", "gte", "lte"],
+            "in_stock": ["exact"],
+            "created_at": ["exact", "gte", "lte"],
+            "rating_stats__average_rating": ["gte", "lte"],
+        }
+
+    def filter_rating_star(self, queryset, name, value):
+        star = int(value)
+        if name.endswith("__gte"):
+            stars = range(star, 6)
+        elif name.endswith("__lte"):
+            stars = range(1, star + 1)
+        else:
+            stars = [star]
+
+        # get the products with a rating of any of the stars
+        condition = Q()
+        for star in stars:
+            field = ProductRatingStats.star_field(star)
+            if field:
+                condition |= Q(**{f"rating_stats__{field}__gt": 0})
+        if not condition:
+            return queryset.none()
+        return queryset.filter(condition)
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    # order by a rating star from the average rating of the rating stats,
+    # and by the stock price and discount from the stock summary columns
+    ordering_aliases = {
+        "product_ratings__star": "average_rating",
+        "product_stock__price": "min_price",
+        "product_stock__discount": "max_discount",
+    }
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+
+        aliased = []
+        for term in ordering:
+            prefix = "-" if term.startswith("-") else ""
+            field = term.lstrip("-")
+            aliased.append(prefix + self.ordering_aliases.get(field, field))
+        return aliased
+
+
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = OptionalCursorPagination
     filter_backends = [
         filters.SearchFilter,
-        filters.OrderingFilter,
+        ProductOrderingFilter,
         DjangoFilterBackend,
     ]
     search_fields = ["name", "product_stock__sku", "description"]
-    filterset_fields = {
-        "category__slug": ["exact"],
-        "subcategory__slug": ["exact"],
-        "subsubcategory__slug": ["exact"],
-        "brand__slug": ["exact"],
-        "brand__name": ["istartswith"],
-        "name": ["istartswith"],
-        "product_stock__price": ["exact", "gte", "lte"],
-        "product_stock__discount": ["exact", "gte", "lte"],
-        "created_at": ["exact", "gte", "lte"],
-        "product_ratings__star": ["exact", "gte", "lte"],
-    }
+    filterset_class = ProductFilter
     ordering_fields = [
         "name",
-        "product_stock__price",
-        "product_stock__discount",
+        "min_price",
+        "max_price",
+        "max_discount",
         "created_at",
+        "average_rating",
+        "total_rating",
         "product_ratings__star",
+        "product_stock__price",
+        "product_stock__discount",
     ]
     ordering = ["-created_at"]
     lookup_field = "slug"
@@ -75,76 +168,35 @@ class ProductViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = Product.objects.all()
         return queryset.annotate(
-            min_price=Coalesce(Min("product_stock__price"), 0),
-            max_price=Coalesce(Max("product_stock__price"), 0),
+            average_rating=Coalesce(F("rating_stats__average_rating"), 0.0),
+            total_rating=Coalesce(F("rating_stats__total_rating"), 0),
         )
 
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+
+        # add the facet counts of the filtered products when requested
+        facets = request.query_params.get("facets")
+        if facets:
+            facets = parse_product_facets(facets)
+            queryset = self.filter_queryset(self.get_queryset())
+            response.data["facets"] = get_cached_product_facets(
+                queryset, request.query_params, facets
+            )
+
+        return response
+
     def retrieve(self, request, *args, **kwargs):
+        # get and authorize the product before serving it from cache
         instance = self.get_object()
-        serializer = self.get_serializer(instance)
-
-        # get product images
-        images = ExtraProductImage.objects.filter(product=instance)
-        images_serializer = ExtraProductImageSerializer(images, many=True)
-
-        # get product videos
-        videos = ExtraProductVideo.objects.filter(product=instance)
-        videos_serializer = ExtraProductVideoSerializer(videos, many=True)
-
-        # get product stock
-        stock = Stock.objects.filter(product=instance)
-        stock_serializer = StockSerializer(stock, many=True)
-
-        # get 5 latest ratings
-        ratings = Rating.objects.filter(product=instance).order_by("-created_at")[:5]
-        ratings_serializer = RatingSerializer(ratings, many=True)
-
-        # get 3 ratings with >= 4 stars
-        highest_ratings = Rating.objects.filter(product=instance, star__gte=4).order_by(
-            "-star", "-created_at"
-        )[:3]
-        highest_ratings_serializer = RatingSerializer(highest_ratings, many=True)
-
-        # get 3 ratings with <= 3 stars
-        lowest_ratings = Rating.objects.filter(product=instance, star__lte=3).order_by(
-            "-star", "-created_at"
-        )[:3]
-        lowest_ratings_serializer = RatingSerializer(lowest_ratings, many=True)
-
-        # acumulate all ratings
-        ratings = Rating.objects.filter(product=instance)
-        total_ratings = ratings.count()
-        total_stars = sum([rating.star for rating in ratings])
-
-        # calculate average rating
-        try:
-            average_rating = total_stars / total_ratings
-        except ZeroDivisionError:
-            average_rating = 0
-
-        # count wishlist
-        wishlist = Wishlist.objects.filter(product=instance)
-        total_wishlist = wishlist.count()
-
-        # get 5 latest product with same category and brand
-        related_products = Product.objects.filter(
-            category=instance.category, brand=instance.brand
-        ).exclude(id=instance.id)[:5]
-
-        return Response(
-            {
-                "product": serializer.data,
-                "images": images_serializer.data,
-                "videos": videos_serializer.data,
-                "stock": stock_serializer.data,
-                "total_rating": average_rating,
-                "latest_rating": ratings_serializer.data,
-                "highest_rating": highest_ratings_serializer.data,
-                "lowest_rating": lowest_ratings_serializer.data,
-                "total_wishlist": total_wishlist,
-                "related_products": ProductSerializer(related_products, many=True).data,
-            }
-        )
+
+        # serve the product detail from cache when available
+        data = get_cached_product_detail(instance.slug)
+        if data is None:
+            data = assemble_product_detail(instance.slug, self.get_serializer_context())
+            set_cached_product_detail(instance.slug, data)
+
+        return Response(data)
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -158,6 +210,24 @@ class CategoryViewSet(viewsets.ModelViewSet):
     lookup_field = "slug"
 
 
+class CategoryTreeAPIView(views.APIView):
+    """
+    Get the whole category > subcategory > subsubcategory tree,
+    with the active product count of every node when ?product_count=true
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        product_count = request.query_params.get("product_count", "").lower() in (
+            "1",
+            "true",
+        )
+        tree = get_cached_category_tree(product_count)
+
+        return Response(tree)
+
+
 class SubcategoryViewSet(viewsets.ModelViewSet):
     queryset = Subcategory.objects.all()
     serializer_class = SubcategorySerializer
@@ -199,9 +269,10 @@ class BrandViewSet(viewsets.ModelViewSet):
 
 
 class RatingViewSet(viewsets.ModelViewSet):
-    queryset = Rating.objects.all()
+    queryset = Rating.objects.select_related("user")
     serializer_class = RatingSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = OptionalCursorPagination
     filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
     filterset_fields = {
         "product": ["exact"],
@@ -218,10 +289,8 @@ class RatingViewSet(viewsets.ModelViewSet):
         except Product.DoesNotExist:
             raise serializers.ValidationError("Product does not exist")
 
-        # check the product is exist in previous order
-        if not Order.objects.filter(
-            payment_status="settlement", order_items__product_id=product.pk
-        ).exists():
+        # check the product is purchased by the user in a settled order
+        if not is_purchased_product(request.user, product.pk):
             raise serializers.ValidationError("Please buy this product first")
 
         # check if product is already rated
@@ -249,7 +318,9 @@ class WishlistViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        return Wishlist.objects.filter(user=user)
+        return Wishlist.objects.filter(user=user).select_related(
+            "user", "product", "product__brand"
+        )
 
     def create(self, request, *args, **kwargs):
         # get product
@@ -286,65 +357,49 @@ class StockViewSet(viewsets.ModelViewSet):
     ordering = ["-created_at"]
 
 
-class TopBrandsAPIView(views.APIView):
+class SalesLeaderboardAPIView(views.APIView):
+    """
+    Base view for the top sellers read from the materialized sales rollup,
+    filtered by ?window=7d|30d|all (default all)
+    """
+
     permission_classes = [permissions.AllowAny]
+    model = None
+    field = None
+    serializer_class = None
+    limit = 5
 
     def get(self, request):
-        # get top 5 brands based on total sales and payment status
-        top_brands = (
-            OrderItem.objects.filter(order__payment_status="settlement")
-            .annotate(
-                brand_id=F("product__brand"),
-                brand_name=F("product__brand__name"),
-                brand_logo=F("product__brand__logo"),
-                brand_cover=F("product__brand__cover"),
-                brand_cover_mobile=F("product__brand__cover_mobile"),
-                brand_cover_homepage=F("product__brand__cover_homepage"),
-                brand_origin=F("product__brand__origin"),
-            )
-            .values(
-                "brand_id",
-                "brand_name",
-                "brand_cover",
-                "brand_logo",
-                "brand_cover_mobile",
-                "brand_cover_homepage",
-                "brand_origin",
-            )
-            .annotate(total_sales=Sum("quantity"))
-            .order_by("-total_sales")[:5]
-        )
+        window = request.query_params.get("window", "all")
 
-        serializer = TopBrandSerializer(top_brands, many=True)
+        def build(leaderboard):
+            # get the leaderboard instances in one query
+            instances = self.model.objects.in_bulk([pk for pk, _ in leaderboard])
+            top_sellers = [
+                {self.field: instances[pk], "total_sales": total_sales}
+                for pk, total_sales in leaderboard
+                if pk in instances
+            ]
+            return self.serializer_class(top_sellers, many=True).data
 
-        return Response(serializer.data)
+        data = get_cached_sales_leaderboard(self.field, window, self.limit, build)
 
+        return Response(data)
 
-class TopCategoryAPIView(views.APIView):
-    permission_classes = [permissions.AllowAny]
 
-    def get(self, request):
-        # get top 5 brands based on total sales and payment status
-        top_category = (
-            OrderItem.objects.filter(order__payment_status="settlement")
-            .annotate(
-                category_id=F("product__category"),
-                category_name=F("product__category__name"),
-                category_cover=F("product__category__cover"),
-                category_cover_mobile=F("product__category__cover_mobile"),
-                category_cover_homepage=F("product__category__cover_homepage"),
-            )
-            .values(
-                "category_id",
-                "category_name",
-                "category_cover",
-                "category_cover_mobile",
-                "category_cover_homepage",
-            )
-            .annotate(total_sales=Sum("quantity"))
-            .order_by("-total_sales")[:5]
-        )
+class TopBrandsAPIView(SalesLeaderboardAPIView):
+    model = Brand
+    field = "brand"
+    serializer_class = TopBrandSerializer
 
-        serializer = TopCategorySerializer(top_category, many=True)
 
-        return Response(serializer.data)
+class TopCategoryAPIView(SalesLeaderboardAPIView):
+    model = Category
+    field = "category"
+    serializer_class = TopCategorySerializer
+
+
+class TopProductsAPIView(SalesLeaderboardAPIView):
+    model = Product
+    field = "product"
+    serializer_class = TopProductSerializer
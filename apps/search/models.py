@@ -16,6 +16,10 @@ class Search(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # keyset cursor pagination of the search history of a user
+        indexes = [models.Index(fields=["user", "-created_at", "-id"])]
+
     def __str__(self):
         return self.query
 
@@ -22,6 +22,7 @@ from apps.store.serializers import FAQSerializer
 from apps.blogs.serializers import BlogSerializer
 from apps.coupons.serializers import CouponSerializer
 from tools.profanity_helper import AdvancedProfanityFilter
+from tools.custom_paginations import KeysetCursorPagination
 
 User = get_user_model()
 
@@ -203,6 +204,13 @@ class SearchHistoryView(views.APIView):
             "-created_at"
         )
 
+        # paginate by cursor when requested
+        if KeysetCursorPagination.cursor_query_param in request.query_params:
+            paginator = KeysetCursorPagination()
+            page = paginator.paginate_queryset(search_history, request, view=self)
+            search_history_serializer = SearchSerializer(page, many=True)
+            return paginator.get_paginated_response(search_history_serializer.data)
+
         # Serialize the search history
         search_history_serializer = SearchSerializer(search_history, many=True)
 
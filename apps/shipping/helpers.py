@@ -1,10 +1,20 @@
+import hashlib
+import json
+import math
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from rest_framework import status
 from rest_framework.response import Response
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 
-from .models import ShippingGroupTariff, ShippingType
+from .models import ShippingGroupItem, ShippingGroupTariff, ShippingType
 from apps.store.models import Contact
-from apps.orders.models import Order
+from apps.orders.models import Order, OrderShipping, ShipmentTracking
 from tools.lionparcel_helper import LionParcelHelper
 
 
@@ -15,9 +25,8 @@ def lionparcel_original_tariff(weight, shipping):
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    lionparcel = LionParcelHelper(settings.LIONPARCEL_API_KEY)
     try:
-        response = lionparcel.get_tariff(
+        response = get_cached_tariff(
             origin=store.origin,
             destination=shipping.destination.route,
             weight=weight,
@@ -29,6 +38,168 @@ def lionparcel_original_tariff(weight, shipping):
     return response
 
 
+TARIFF_CACHE_PREFIX = "lionparcel_tariff"
+TARIFF_CACHE_METRICS = ["hit", "miss", "stale", "error"]
+
+# how often the lookups waiting for the lock check if the tariff is cached,
+# and the time the lock is held on top of the API call, for the retry backoff
+TARIFF_LOCK_POLL_INTERVAL = 0.05
+TARIFF_LOCK_MARGIN = 5
+
+
+def get_tariff_lock_timeout():
+    """
+    Get how long a lookup holds the lock of its key, and the others wait
+    for it: the longest API call with all its retries, plus a margin
+    """
+    attempts = LionParcelHelper.GET_RETRIES + 1
+    request_timeout = LionParcelHelper.CONNECT_TIMEOUT + LionParcelHelper.READ_TIMEOUT
+    return math.ceil(request_timeout * attempts + TARIFF_LOCK_MARGIN)
+
+
+def get_tariff_cache_key(origin, destination, weight, commodity):
+    params = json.dumps([origin, destination, weight, commodity])
+    return f"{TARIFF_CACHE_PREFIX}:{hashlib.sha256(params.encode()).hexdigest()}"
+
+
+def count_tariff_cache_metric(name):
+    key = f"{TARIFF_CACHE_PREFIX}:metrics:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_tariff_cache_metrics():
+    keys = {
+        f"{TARIFF_CACHE_PREFIX}:metrics:{name}": name for name in TARIFF_CACHE_METRICS
+    }
+    values = cache.get_many(keys)
+    return {name: values.get(key, 0) for key, name in keys.items()}
+
+
+def get_cached_tariff(origin, destination, weight, commodity):
+    """
+    Get the LionParcel tariff of the route, weight and commodity from the
+    cache. Only one lookup per key calls the API when the entry is missing
+    or expired, the others serve the expired entry or wait for the new one,
+    and fail when it is not cached in time instead of calling the API.
+    The expired entry is also served when the API fails.
+    """
+    key = get_tariff_cache_key(origin, destination, weight, commodity)
+    lock_key = f"{key}:lock"
+
+    entry = cache.get(key)
+    if entry and entry["fresh_until"] > time.time():
+        count_tariff_cache_metric("hit")
+        return entry["response"]
+
+    lock_timeout = get_tariff_lock_timeout()
+    deadline = time.monotonic() + lock_timeout
+    token = uuid.uuid4().hex
+    while not cache.add(lock_key, token, lock_timeout):
+        # serve the expired entry while another lookup refreshes it
+        if entry:
+            count_tariff_cache_metric("stale")
+            return entry["response"]
+
+        # otherwise wait for the tariff of the lookup holding the lock
+        time.sleep(TARIFF_LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry:
+            count_tariff_cache_metric("hit")
+            return entry["response"]
+        if time.monotonic() > deadline:
+            count_tariff_cache_metric("error")
+            raise Exception("Tariff lookup timed out, please try again")
+
+    count_tariff_cache_metric("miss")
+    try:
+        lionparcel = LionParcelHelper(settings.LIONPARCEL_API_KEY)
+        response = lionparcel.get_tariff(
+            origin=origin, destination=destination, weight=weight, commodity=commodity
+        )
+    except Exception:
+        count_tariff_cache_metric("error")
+        if entry:
+            count_tariff_cache_metric("stale")
+            return entry["response"]
+        raise
+    finally:
+        # only release the lock while this lookup still holds it
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+    # keep the entry after it expires to serve it when the API fails
+    cache.set(
+        key,
+        {
+            "response": response,
+            "fresh_until": time.time() + settings.LIONPARCEL_TARIFF_CACHE_TIMEOUT,
+        },
+        settings.LIONPARCEL_TARIFF_CACHE_TIMEOUT
+        + settings.LIONPARCEL_TARIFF_STALE_TIMEOUT,
+    )
+    return response
+
+
+TARIFF_INDEX_VERSION_KEY = "shipping_tariff_index_version"
+
+# the tariff index compiled by this process, and its version
+tariff_index = {"version": None, "index": None}
+
+
+def build_tariff_index():
+    """
+    Compile the shipping groups of every route, the tariff of every shipping
+    group per shipping type code and the shipping type names, in three queries
+    """
+    index = {"routes": defaultdict(set), "groups": {}, "types": {}}
+
+    for code, name in ShippingType.objects.values_list("code", "name"):
+        index["types"][code] = name
+
+    for group_id, group_name, code, tariff in ShippingGroupTariff.objects.values_list(
+        "shipping_group_id", "shipping_group__name", "shipping_type__code", "tariff"
+    ):
+        group = index["groups"].setdefault(
+            group_id, {"name": group_name, "tariffs": {}}
+        )
+        group["tariffs"][code] = tariff
+
+    for route, group_id in ShippingGroupItem.objects.values_list(
+        "shipping_route__route", "shipping_group_id"
+    ):
+        index["routes"][route].add(group_id)
+
+    return index
+
+
+def get_tariff_index():
+    """
+    Get the tariff index of this process, compiled again when the shipping
+    groups, routes, types or tariffs were changed since
+    """
+    version = cache.get(TARIFF_INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(TARIFF_INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(TARIFF_INDEX_VERSION_KEY)
+
+    if tariff_index["version"] != version or tariff_index["index"] is None:
+        tariff_index["index"] = build_tariff_index()
+        tariff_index["version"] = version
+
+    return tariff_index["index"]
+
+
+def invalidate_tariff_index():
+    # change the version after the current transaction is committed
+    transaction.on_commit(
+        lambda: cache.set(TARIFF_INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+    )
+
+
 def lionparcel_tariff_mapping(api_response: dict):
     # get the weight
     weight = api_response.get("weight")
@@ -39,11 +210,18 @@ def lionparcel_tariff_mapping(api_response: dict):
     # get the result from the response
     result = api_response.get("result")
 
-    # get all enabled shipping types
-    shipping_types = ShippingType.objects.all()
+    # get all enabled shipping types and the tariffs of the destination
+    index = get_tariff_index()
+    shipping_types = index["types"]
     if not shipping_types:
         raise Exception("No shipping types found.")
 
+    destination_groups = [
+        index["groups"][group_id]
+        for group_id in index["routes"].get(destination, [])
+        if group_id in index["groups"]
+    ]
+
     # create new list to store the filtered result
     filtered_result = []
     default_result = []
@@ -58,17 +236,17 @@ def lionparcel_tariff_mapping(api_response: dict):
         # check the product is not embargo
         if not is_embargo:
             # check if product and destination available in shipping group
-            try:
-                shipping_tariff = ShippingGroupTariff.objects.get(
-                    shipping_group__shipping_group_items__shipping_route__route=destination,
-                    shipping_type__code=product,
+            groups = [
+                group for group in destination_groups if product in group["tariffs"]
+            ]
+            if len(groups) > 1:
+                raise Exception(
+                    f"{destination} has more than one shipping group tariff for {product}."
                 )
-            except ShippingGroupTariff.DoesNotExist:
-                shipping_tariff = None
 
-            if shipping_tariff:
-                new_tariff = shipping_tariff.tariff * weight
-                group_name = shipping_tariff.shipping_group.name
+            if groups:
+                new_tariff = groups[0]["tariffs"][product] * weight
+                group_name = groups[0]["name"]
 
                 filtered_result.append(
                     {
@@ -76,49 +254,114 @@ def lionparcel_tariff_mapping(api_response: dict):
                         "destination": destination,
                         "total_tariff": new_tariff,
                         "shipping_type": product,
-                        "shipping_type_name": shipping_tariff.shipping_type.name,
+                        "shipping_type_name": shipping_types.get(product),
                         "is_embargo": is_embargo,
                         "estimasi_sla": estimasi_sla,
                         "shipping_group": group_name,
                     }
                 )
-            else:
-                for shipping_type in shipping_types:
-                    if shipping_type.code == product:
-                        filtered_result.append(
-                            {
-                                "weight": weight,
-                                "destination": destination,
-                                "total_tariff": tariff,
-                                "shipping_type": product,
-                                "shipping_type_name": shipping_type.name,
-                                "is_embargo": is_embargo,
-                                "estimasi_sla": estimasi_sla,
-                                "shipping_group": None,
-                            }
-                        )
+            elif product in shipping_types:
+                filtered_result.append(
+                    {
+                        "weight": weight,
+                        "destination": destination,
+                        "total_tariff": tariff,
+                        "shipping_type": product,
+                        "shipping_type_name": shipping_types[product],
+                        "is_embargo": is_embargo,
+                        "estimasi_sla": estimasi_sla,
+                        "shipping_group": None,
+                    }
+                )
 
     return filtered_result if filtered_result else default_result
 
 
-def lionparcel_track_status(shipping_ref_code):
+# the LionParcel status of a delivered shipment
+DELIVERED_STATUS = "POD"
+
+
+def fetch_tracking(shipping_ref_code):
+    # get the latest tracking of the shipment, or None when it fails
     lionparcel = LionParcelHelper(settings.LIONPARCEL_API_KEY)
     try:
-        response = lionparcel.track_booking(shipping_ref_code)
-    except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return lionparcel.track_booking(shipping_ref_code)["stts"][0]
+    except Exception:
+        return None
+
 
-    # get the latest status from the response list
-    current_status = response["stts"][0].get("current_status")
-    if current_status == "POD":
-        # update the order status to completed
-        try:
-            order = Order.objects.get(
-                order_shipping__shipping_ref_code=shipping_ref_code
+def poll_shipment_tracking(batch_size=100, workers=8):
+    """
+    Poll the LionParcel tracking of the shipments of the orders in shipping,
+    in batches fetched by a pool of workers. Store the tracking of every
+    batch and complete the delivered orders in bulk.
+    Return the number of polled, failed and delivered shipments.
+    """
+    shipments = list(
+        OrderShipping.objects.filter(
+            order__status="shipping", shipping_ref_code__isnull=False
+        )
+        .exclude(shipping_ref_code="")
+        .values_list("id", "order_id", "shipping_ref_code")
+    )
+
+    polled = failed = delivered = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(shipments), batch_size):
+            batch = shipments[start : start + batch_size]
+            trackings = executor.map(
+                fetch_tracking, [ref_code for _, _, ref_code in batch]
             )
-            order.status = "complete"
-            order.save()
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    return response["stts"][0].get("history")
+            now = timezone.now()
+            results = {}
+            delivered_order_ids = []
+            for (order_shipping_id, order_id, _), tracking in zip(batch, trackings):
+                if tracking is None:
+                    failed += 1
+                    continue
+                results[order_shipping_id] = tracking
+                if tracking.get("current_status") == DELIVERED_STATUS:
+                    delivered_order_ids.append(order_id)
+
+            with transaction.atomic():
+                store_shipment_trackings(results, now)
+                delivered += Order.objects.filter(
+                    id__in=delivered_order_ids, status="shipping"
+                ).update(status="complete")
+            polled += len(results)
+
+    return polled, failed, delivered
+
+
+def store_shipment_trackings(results, polled_at):
+    # update the stored trackings of the shipments, and create the new ones
+    trackings = {
+        tracking.order_shipping_id: tracking
+        for tracking in ShipmentTracking.objects.filter(
+            order_shipping_id__in=results.keys()
+        )
+    }
+
+    new_trackings = []
+    for order_shipping_id, result in results.items():
+        tracking = trackings.get(order_shipping_id)
+        if tracking is None:
+            tracking = ShipmentTracking(order_shipping_id=order_shipping_id)
+            new_trackings.append(tracking)
+        tracking.current_status = result.get("current_status")
+        tracking.history = result.get("history") or []
+        tracking.polled_at = polled_at
+
+    ShipmentTracking.objects.bulk_create(new_trackings)
+    ShipmentTracking.objects.bulk_update(
+        trackings.values(), ["current_status", "history", "polled_at"]
+    )
+
+
+def get_tracking_history(order_shipping):
+    # get the stored tracking history, empty until the shipment is polled
+    try:
+        return order_shipping.tracking.history
+    except ShipmentTracking.DoesNotExist:
+        return []
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.shipping.helpers import poll_shipment_tracking
+
+
+class Command(BaseCommand):
+    help = "Poll the LionParcel tracking of the orders in shipping"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of shipments polled before their tracking is stored",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of concurrent LionParcel requests",
+        )
+
+    def handle(self, *args, **options):
+        polled, failed, delivered = poll_shipment_tracking(
+            batch_size=options["batch_size"], workers=options["workers"]
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Polled {polled} shipments, {failed} failed, {delivered} delivered"
+            )
+        )
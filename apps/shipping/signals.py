@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    ShippingRoute,
+    ShippingGroup,
+    ShippingType,
+    ShippingGroupItem,
+    ShippingGroupTariff,
+)
+from .helpers import invalidate_tariff_index
+
+
+# Compile the tariff index again when the shipping tariffs are changed
+@receiver(post_save, sender=ShippingRoute)
+@receiver(post_delete, sender=ShippingRoute)
+@receiver(post_save, sender=ShippingGroup)
+@receiver(post_delete, sender=ShippingGroup)
+@receiver(post_save, sender=ShippingType)
+@receiver(post_delete, sender=ShippingType)
+@receiver(post_save, sender=ShippingGroupItem)
+@receiver(post_delete, sender=ShippingGroupItem)
+@receiver(post_save, sender=ShippingGroupTariff)
+@receiver(post_delete, sender=ShippingGroupTariff)
+def invalidate_shipping_tariff_index(sender, instance, **kwargs):
+    invalidate_tariff_index()
@@ -0,0 +1,145 @@
+import threading
+import time
+import pytest
+from django.core.cache import cache
+
+from apps.shipping import helpers
+from apps.shipping.helpers import (
+    get_cached_tariff,
+    get_tariff_cache_key,
+    get_tariff_cache_metrics,
+)
+from tools.lionparcel_helper import LionParcelHelper
+
+ROUTE = ("Origin, City", "Destination, City", 2, "COS 2")
+
+
+@pytest.fixture(autouse=True)
+def tariff_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    settings.LIONPARCEL_API_KEY = "key"
+    settings.LIONPARCEL_TARIFF_CACHE_TIMEOUT = 60
+    settings.LIONPARCEL_TARIFF_STALE_TIMEOUT = 60
+    cache.clear()
+
+
+class FakeTariffAPI:
+    def __init__(self):
+        self.calls = []
+        self.is_down = False
+        self.delay = 0.1
+
+    def get_tariff(self, origin, destination, weight, commodity):
+        self.calls.append((origin, destination, weight, commodity))
+        time.sleep(self.delay)
+        if self.is_down:
+            raise Exception("LionParcel is down")
+        return {"weight": weight, "destination": destination, "result": []}
+
+
+@pytest.fixture
+def tariff_api(monkeypatch):
+    # the tariff comes from the LionParcel API
+    api = FakeTariffAPI()
+    monkeypatch.setattr(
+        LionParcelHelper,
+        "get_tariff",
+        lambda self, **params: api.get_tariff(**params),
+    )
+    return api
+
+
+def test_identical_lookups_make_one_call(tariff_api):
+    # Act: a burst of lookups, then one more
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(get_cached_tariff(*ROUTE)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    get_cached_tariff(*ROUTE)
+
+    # Assert
+    assert tariff_api.calls == [ROUTE]
+    assert len(results) == 5
+    assert all(result["destination"] == ROUTE[1] for result in results)
+    metrics = get_tariff_cache_metrics()
+    assert metrics["miss"] == 1
+    assert metrics["hit"] == 5
+
+
+def test_expired_tariff_is_served_when_api_fails(tariff_api, settings):
+    # Arrange: cache an already expired tariff
+    settings.LIONPARCEL_TARIFF_CACHE_TIMEOUT = 0
+    expired = get_cached_tariff(*ROUTE)
+    tariff_api.is_down = True
+
+    # Act
+    result = get_cached_tariff(*ROUTE)
+
+    # Assert
+    assert result == expired
+    assert len(tariff_api.calls) == 2
+    metrics = get_tariff_cache_metrics()
+    assert metrics["error"] == 1
+    assert metrics["stale"] == 1
+
+    # without a cached tariff the error is raised
+    with pytest.raises(Exception, match="LionParcel is down"):
+        get_cached_tariff(ROUTE[0], "Other, City", *ROUTE[2:])
+
+
+def test_waiting_lookup_never_calls_api_without_lock(tariff_api, monkeypatch):
+    # Arrange: another lookup holds the lock and never caches the tariff
+    monkeypatch.setattr(helpers, "get_tariff_lock_timeout", lambda: 0.2)
+    lock_key = f"{get_tariff_cache_key(*ROUTE)}:lock"
+    cache.set(lock_key, "other", 60)
+
+    # Act
+    with pytest.raises(Exception, match="timed out"):
+        get_cached_tariff(*ROUTE)
+
+    # Assert
+    assert tariff_api.calls == []
+    assert cache.get(lock_key) == "other"
+
+
+def test_lock_outlives_slow_api_call(tariff_api, monkeypatch):
+    # Arrange: the lock covers every attempt of the API call
+    attempts = LionParcelHelper.GET_RETRIES + 1
+    timeouts = LionParcelHelper.CONNECT_TIMEOUT + LionParcelHelper.READ_TIMEOUT
+    assert helpers.get_tariff_lock_timeout() > timeouts * attempts
+
+    # an API call almost as slow as its timeouts allow
+    monkeypatch.setattr(LionParcelHelper, "CONNECT_TIMEOUT", 0.1)
+    monkeypatch.setattr(LionParcelHelper, "READ_TIMEOUT", 0.2)
+    monkeypatch.setattr(helpers, "TARIFF_LOCK_MARGIN", 0)
+    tariff_api.delay = 0.3 * attempts - 0.1
+
+    # Act: more lookups arrive while the first one is calling the API
+    results = []
+    errors = []
+
+    def lookup():
+        try:
+            results.append(get_cached_tariff(*ROUTE))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(3)]
+    threads[0].start()
+    time.sleep(0.05)
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Assert
+    assert errors == []
+    assert tariff_api.calls == [ROUTE]
+    assert len(results) == 3
@@ -0,0 +1,78 @@
+import pytest
+from django.core.cache import cache
+
+from apps.shipping.helpers import lionparcel_tariff_mapping, tariff_index
+from apps.shipping.models import (
+    ShippingRoute,
+    ShippingGroup,
+    ShippingType,
+    ShippingGroupItem,
+    ShippingGroupTariff,
+)
+
+
+@pytest.fixture(autouse=True)
+def tariff_index_cache(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+    tariff_index.update(version=None, index=None)
+
+
+@pytest.fixture
+def group_tariff(db):
+    route = ShippingRoute.objects.create(route="Destination, City")
+    group = ShippingGroup.objects.create(name="Java")
+    ShippingGroupItem.objects.create(shipping_group=group, shipping_route=route)
+    regular = ShippingType.objects.create(name="Regular", code="REGPACK")
+    ShippingType.objects.create(name="Jago", code="JAGOPACK")
+    return ShippingGroupTariff.objects.create(
+        shipping_group=group, shipping_type=regular, tariff=5000
+    )
+
+
+def api_response(destination):
+    return {
+        "weight": 2,
+        "destination": destination,
+        "result": [
+            {"product": "REGPACK", "total_tariff": 20000, "estimasi_sla": "2 days"},
+            {"product": "JAGOPACK", "total_tariff": 15000, "estimasi_sla": "3 days"},
+            {"product": "BOSSPACK", "total_tariff": 30000, "estimasi_sla": "1 day"},
+            {"product": "REGPACK", "is_embargo": True},
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_tariff_mapping_reads_the_compiled_index(
+    group_tariff, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    # Arrange: compile the index once
+    lionparcel_tariff_mapping(api_response("Destination, City"))
+
+    # Act
+    with django_assert_num_queries(0):
+        grouped = lionparcel_tariff_mapping(api_response("Destination, City"))
+        other = lionparcel_tariff_mapping(api_response("Other, City"))
+
+    # Assert: the group tariff per kg replaces the LionParcel tariff
+    assert [(item["shipping_type"], item["total_tariff"]) for item in grouped] == [
+        ("REGPACK", 10000),
+        ("JAGOPACK", 15000),
+    ]
+    assert grouped[0]["shipping_group"] == "Java"
+    assert grouped[0]["shipping_type_name"] == "Regular"
+    assert [(item["shipping_type"], item["total_tariff"]) for item in other] == [
+        ("REGPACK", 20000),
+        ("JAGOPACK", 15000),
+    ]
+
+    # the index is compiled again when a tariff is saved
+    with django_capture_on_commit_callbacks(execute=True):
+        group_tariff.tariff = 7000
+        group_tariff.save()
+    grouped = lionparcel_tariff_mapping(api_response("Destination, City"))
+    assert grouped[0]["total_tariff"] == 14000
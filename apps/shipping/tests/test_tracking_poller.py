@@ -0,0 +1,103 @@
+import io
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from apps.orders.models import Order, OrderShipping, ShipmentTracking
+from apps.shipping.models import Shipping, ShippingRoute
+from tools.lionparcel_helper import LionParcelHelper
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def disable_caches(settings):
+    settings.CACHALOT_ENABLED = False
+    settings.LIONPARCEL_API_KEY = "key"
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+
+
+@pytest.fixture
+def create_shipment(user):
+    shipping = Shipping.objects.create(
+        user=user,
+        receiver_name="Receiver",
+        receiver_phone="0800",
+        receiver_address="Address",
+        destination=ShippingRoute.objects.create(route="Route"),
+    )
+
+    def create(ref_code, status="shipping"):
+        order = Order.objects.create(user=user, status=status)
+        OrderShipping.objects.create(
+            order=order,
+            shipping=shipping,
+            receiver_name="Receiver",
+            receiver_phone="0800",
+            receiver_address="Address",
+            destination_route="Route",
+            shipping_ref_code=ref_code,
+        )
+        return order
+
+    return create
+
+
+@pytest.fixture
+def track_calls(monkeypatch):
+    # the tracking comes from the LionParcel API
+    calls = []
+
+    def track_booking(self, booking_id):
+        calls.append(booking_id)
+        if booking_id == "STT-DOWN":
+            raise Exception("LionParcel is down")
+        current_status = "POD" if booking_id == "STT-POD" else "STI"
+        history = [{"status_code": current_status, "remarks": booking_id}]
+        return {"stts": [{"current_status": current_status, "history": history}]}
+
+    monkeypatch.setattr(LionParcelHelper, "track_booking", track_booking)
+    return calls
+
+
+@pytest.mark.django_db
+def test_poll_shipment_tracking(user, create_shipment, track_calls):
+    # Arrange
+    in_transit = create_shipment("STT-1")
+    delivered = create_shipment("STT-POD")
+    create_shipment("STT-DOWN")
+    create_shipment("STT-DONE", status="complete")
+
+    # Act
+    call_command("poll_shipment_tracking", batch_size=2, stdout=io.StringIO())
+    call_command("poll_shipment_tracking", batch_size=2, stdout=io.StringIO())
+
+    # Assert: the delivered order is completed and not polled anymore
+    assert sorted(track_calls) == sorted(
+        ["STT-1", "STT-POD", "STT-DOWN", "STT-1", "STT-DOWN"]
+    )
+    delivered.refresh_from_db()
+    in_transit.refresh_from_db()
+    assert delivered.status == "complete"
+    assert in_transit.status == "shipping"
+    assert ShipmentTracking.objects.count() == 2
+
+    # the status is served from the stored tracking
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.post(
+        "/api/v1/shipping-status/", {"shipping_ref_code": "STT-1"}, format="json"
+    )
+    assert response.status_code == 200
+    assert response.data == [{"status_code": "STI", "remarks": "STT-1"}]
+    assert len(track_calls) == 5
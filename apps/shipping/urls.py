@@ -5,6 +5,8 @@ from .views import (
     ShippingViewSet,
     ShippingRouteViewSet,
     ShippingTariffAPIView,
+    ShippingTariffCacheMetricsAPIView,
+    LionParcelMetricsAPIView,
     ShippingStatusAPIView,
     ShippingTypeViewSet,
     ShippingGroupViewSet,
@@ -30,6 +32,16 @@ router.register(
 urlpatterns = [
     path("v1/", include(router.urls)),
     path("v1/tariff/", ShippingTariffAPIView.as_view(), name="shipping-tariff"),
+    path(
+        "v1/tariff-cache-metrics/",
+        ShippingTariffCacheMetricsAPIView.as_view(),
+        name="shipping-tariff-cache-metrics",
+    ),
+    path(
+        "v1/lionparcel-metrics/",
+        LionParcelMetricsAPIView.as_view(),
+        name="lionparcel-metrics",
+    ),
     path(
         "v1/shipping-status/", ShippingStatusAPIView.as_view(), name="shipping-status"
     ),
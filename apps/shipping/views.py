@@ -2,6 +2,7 @@ from rest_framework import viewsets, permissions, filters, views, status
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from tools.custom_permissions import IsAdminOrReadOnly
+from tools.lionparcel_helper import LionParcelHelper
 import math
 
 from apps.orders.models import Order
@@ -27,7 +28,8 @@ from apps.orders.models import OrderShipping
 
 from .helpers import lionparcel_original_tariff
 from .helpers import lionparcel_tariff_mapping
-from .helpers import lionparcel_track_status
+from .helpers import get_tracking_history
+from .helpers import get_tariff_cache_metrics
 
 
 class ShippingRouteViewSet(viewsets.ModelViewSet):
@@ -136,6 +138,27 @@ class ShippingTariffAPIView(views.APIView):
         return Response(response, status=status.HTTP_200_OK)
 
 
+class ShippingTariffCacheMetricsAPIView(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Get the hit, miss, stale and error counts of the LionParcel tariff cache
+        """
+        return Response(get_tariff_cache_metrics(), status=status.HTTP_200_OK)
+
+
+class LionParcelMetricsAPIView(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Get the latency of each LionParcel endpoint and the circuit breaker
+        state, of the process serving the request
+        """
+        return Response(LionParcelHelper.get_metrics(), status=status.HTTP_200_OK)
+
+
 class ShippingStatusAPIView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -143,18 +166,14 @@ class ShippingStatusAPIView(views.APIView):
         shipping_ref_code = request.data.get("shipping_ref_code")
 
         try:
-            ordershipping = OrderShipping.objects.get(
+            ordershipping = OrderShipping.objects.select_related("tracking").get(
                 shipping_ref_code=shipping_ref_code
             )
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        shipping_ref_code = ordershipping.shipping_ref_code
-
-        try:
-            response = lionparcel_track_status(shipping_ref_code)
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # the tracking is stored by the poll_shipment_tracking command
+        response = get_tracking_history(ordershipping)
 
         return Response(response, status=status.HTTP_200_OK)
 
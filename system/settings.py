@@ -130,6 +130,34 @@ CACHES = {
 # Cachalot
 CACHALOT_ENABLED = True
 
+# Product detail cache timeout in seconds
+PRODUCT_DETAIL_CACHE_TIMEOUT = config(
+    "PRODUCT_DETAIL_CACHE_TIMEOUT", default=60 * 15, cast=int
+)
+
+# Product facet counts cache timeout in seconds
+PRODUCT_FACETS_CACHE_TIMEOUT = config(
+    "PRODUCT_FACETS_CACHE_TIMEOUT", default=60 * 10, cast=int
+)
+
+# Category tree cache timeout in seconds
+CATEGORY_TREE_CACHE_TIMEOUT = config(
+    "CATEGORY_TREE_CACHE_TIMEOUT", default=60 * 60, cast=int
+)
+
+# Checkout quote lifetime in seconds
+CHECKOUT_QUOTE_MAX_AGE = config("CHECKOUT_QUOTE_MAX_AGE", default=60 * 10, cast=int)
+
+# Stored responses of idempotent requests lifetime in seconds
+IDEMPOTENCY_KEY_TIMEOUT = config(
+    "IDEMPOTENCY_KEY_TIMEOUT", default=60 * 60 * 24, cast=int
+)
+
+# Sales leaderboard cache timeout in seconds
+SALES_LEADERBOARD_CACHE_TIMEOUT = config(
+    "SALES_LEADERBOARD_CACHE_TIMEOUT", default=60 * 10, cast=int
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -271,6 +299,15 @@ BACKEND_URL = config("BACKEND_URL")
 # LION PARCEL API
 LIONPARCEL_API_KEY = config("LIONPARCEL_API_KEY")
 
+# LionParcel tariff cache timeout in seconds, and how long an expired
+# tariff is kept to serve it when the LionParcel API fails
+LIONPARCEL_TARIFF_CACHE_TIMEOUT = config(
+    "LIONPARCEL_TARIFF_CACHE_TIMEOUT", default=60 * 60, cast=int
+)
+LIONPARCEL_TARIFF_STALE_TIMEOUT = config(
+    "LIONPARCEL_TARIFF_STALE_TIMEOUT", default=60 * 60 * 24, cast=int
+)
+
 # MIDTRANS
 MIDTRANS = {
     "MERCHANT_ID": config("MIDTRANS_MERCHANT_ID"),
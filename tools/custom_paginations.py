@@ -0,0 +1,151 @@
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    KeysetCursorPagination paginates a queryset from newest to oldest by
+    the (created_at, id) key, so every page costs one indexed range query
+    without COUNT(*) or OFFSET, no matter how deep the page is.
+
+    The cursor is an opaque token holding the key of the first or last row
+    of the current page and the direction to read from it. The paginated
+    model needs a (-created_at, -id) index, prefixed by the fields it is
+    always filtered by, and ?ordering= is rejected as the key fixes it.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+    created_field = "created_at"
+    id_field = "id"
+    ordering_query_param = api_settings.ORDERING_PARAM
+    invalid_cursor_message = "Invalid cursor"
+    invalid_ordering_message = "Ordering is not supported with cursor pagination"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.ordering_query_param in request.query_params:
+            raise ParseError(self.invalid_ordering_message)
+
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request)
+
+        # read the rows after (or before, when reversed) the cursor position
+        if position:
+            created_at, pk = position
+            lookup = "gt" if reverse else "lt"
+            queryset = queryset.filter(
+                Q(**{f"{self.created_field}__{lookup}": created_at})
+                | Q(
+                    **{
+                        self.created_field: created_at,
+                        f"{self.id_field}__{lookup}": pk,
+                    }
+                )
+            )
+
+        if reverse:
+            queryset = queryset.order_by(self.created_field, self.id_field)
+        else:
+            queryset = queryset.order_by(f"-{self.created_field}", f"-{self.id_field}")
+
+        # fetch one extra row to know if there is more to read
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        payload = {
+            "c": getattr(instance, self.created_field).isoformat(),
+            "i": str(getattr(instance, self.id_field)),
+            "r": int(reverse),
+        }
+        cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            created_at = parse_datetime(payload["c"])
+            pk = payload["i"]
+            reverse = bool(payload.get("r", 0))
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return (created_at, pk), reverse
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page number pagination that switches to keyset cursor pagination when
+    the request has a ?cursor= parameter (empty for the first page).
+    In cursor mode the results are always ordered from newest to oldest,
+    and a request with ?ordering= is rejected.
+    """
+
+    cursor_pagination_class = KeysetCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_pagination_class.cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
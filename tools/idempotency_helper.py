@@ -0,0 +1,112 @@
+import functools
+import hashlib
+import json
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_REPLAYED_HEADER = "Idempotency-Replayed"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# how long a request holds its key before a retry can run it again,
+# in case the request died before its response was stored. Well above the
+# longest guarded request, a checkout retrying LionParcel calls of up to
+# 3 x (CONNECT_TIMEOUT + READ_TIMEOUT) seconds on top of the payment call
+IDEMPOTENCY_LOCK_TIMEOUT = 60 * 5
+
+
+def get_idempotency_cache_key(request, key):
+    return f"idempotency:{request.user.pk}:{request.path}:{key}"
+
+
+def get_request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def idempotent(view_method):
+    """
+    Decorator of an APIView or viewset method to make it idempotent
+    with the Idempotency-Key header.
+    How to use:
+        @idempotent
+        def post(self, request, *args, **kwargs):
+    The successful response of the first request with a key is stored for
+    IDEMPOTENCY_KEY_TIMEOUT seconds and replayed to the retries with the
+    same key, user and path. A retry with another body, or while the first
+    request is still running, is rejected. Failed requests are not stored,
+    so they can be retried with the same key.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response(
+                {"error": "Idempotency key is not valid"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        cache_key = get_idempotency_cache_key(request, key)
+        fingerprint = get_request_fingerprint(request)
+
+        # claim the key, unless another request has already claimed it
+        token = uuid.uuid4().hex
+        claimed = cache.add(
+            cache_key,
+            {"fingerprint": fingerprint, "status": None, "token": token},
+            IDEMPOTENCY_LOCK_TIMEOUT,
+        )
+        if not claimed:
+            stored = cache.get(cache_key) or {}
+            if stored.get("fingerprint") != fingerprint:
+                return Response(
+                    {"error": "Idempotency key is used by another request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if stored.get("status") is None:
+                return Response(
+                    {"error": "Request with this idempotency key is in progress"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+            response = Response(stored["data"], status=stored["status"])
+            response[IDEMPOTENCY_REPLAYED_HEADER] = "true"
+            return response
+
+        def is_holding_key():
+            return (cache.get(cache_key) or {}).get("token") == token
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            if is_holding_key():
+                cache.delete(cache_key)
+            raise
+
+        # store the successful response, release the key of a failed one,
+        # only while this request still holds the key
+        if not is_holding_key():
+            return response
+        if status.is_success(response.status_code):
+            cache.set(
+                cache_key,
+                {
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "data": response.data,
+                },
+                settings.IDEMPOTENCY_KEY_TIMEOUT,
+            )
+        else:
+            cache.delete(cache_key)
+
+        return response
+
+    return wrapper
@@ -1,6 +1,10 @@
 import requests
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from urllib.parse import urljoin
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 """
 This code defines a class called `LionParcelHelper` that provides methods for interacting with the Lion Parcel API. It allows users to get tariff information for a shipment and make a booking for a shipment.
@@ -19,23 +23,149 @@ Main functionalities:
 - The `LionParcelHelper` class provides methods for interacting with the Lion Parcel API.
 - It allows users to get tariff information for a shipment and make a booking for a shipment.
 
+- All the requests share a keep-alive session per process, with timeouts, retries of the GET requests and a circuit breaker that fails fast while the API is down.
+
 Methods:
+- `get_session`: Gets the shared session of the process.
+- `get_metrics`: Gets the latency of each endpoint and the circuit breaker state.
 - `_make_request`: Makes an HTTP request to the Lion Parcel API.
 - `get_tariff`: Gets tariff information for a shipment by origin, destination, weight, and commodity.
 - `make_booking`: Makes a booking for a shipment.
+- `make_bookings`: Makes the bookings of many shipments in one request.
 - `get_booking`: Gets booking information by booking ID.
 
 Fields:
 - `BASE_URL`: The base URL of the Lion Parcel API.
+- `CONNECT_TIMEOUT`, `READ_TIMEOUT`: The timeouts of a request in seconds.
+- `POOL_SIZE`: The number of keep-alive connections of the session.
+- `GET_RETRIES`, `RETRY_BACKOFF`, `RETRY_JITTER`: The retries of the GET requests and their backoff in seconds.
+- `BOOKING_BATCH_SIZE`: The maximum number of bookings per request.
 """
 
 
+class CircuitBreakerOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker that fails the calls fast for reset_timeout seconds
+    after failure_threshold consecutive failures, then lets one trial call
+    through per reset_timeout until a call succeeds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        with self.lock:
+            if self.state == "open":
+                raise CircuitBreakerOpen("Lion Parcel API is unavailable")
+            if self.state == "half_open":
+                # let this trial call through, the others still fail fast
+                self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
 class LionParcelHelper:
     BASE_URL = "https://api-stg-middleware.thelionparcel.com"
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 20
+    POOL_SIZE = 20
+    GET_RETRIES = 2
+    RETRY_BACKOFF = 0.3
+    RETRY_JITTER = 0.3
+    RETRY_STATUSES = [502, 503, 504]
+    BOOKING_BATCH_SIZE = 50
+
+    # shared by all the helpers of the process
+    session = None
+    session_lock = threading.Lock()
+    circuit_breaker = CircuitBreaker()
+    latency = {}
+    latency_lock = threading.Lock()
 
     def __init__(self, api_key):
         self.api_key = api_key
 
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """
+        Gets the keep-alive session of the process, created on first use.
+        Only the GET requests are retried on read errors and gateway errors,
+        connection errors are retried for every method.
+        """
+        with cls.session_lock:
+            if cls.session is None:
+                retry = Retry(
+                    total=cls.GET_RETRIES,
+                    allowed_methods=["GET"],
+                    status_forcelist=cls.RETRY_STATUSES,
+                    backoff_factor=cls.RETRY_BACKOFF,
+                    backoff_jitter=cls.RETRY_JITTER,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=cls.POOL_SIZE,
+                    pool_maxsize=cls.POOL_SIZE,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls.session = session
+        return cls.session
+
+    @classmethod
+    def record_latency(cls, endpoint: str, seconds: float, failed: bool):
+        with cls.latency_lock:
+            metrics = cls.latency.setdefault(
+                endpoint, {"count": 0, "errors": 0, "total_ms": 0, "max_ms": 0}
+            )
+            milliseconds = round(seconds * 1000)
+            metrics["count"] += 1
+            metrics["errors"] += int(failed)
+            metrics["total_ms"] += milliseconds
+            metrics["max_ms"] = max(metrics["max_ms"], milliseconds)
+
+    @classmethod
+    def get_metrics(cls) -> Dict[str, Any]:
+        """
+        Gets the request count, error count, total and max latency of each
+        endpoint, and the circuit breaker state, of this process.
+        """
+        with cls.latency_lock:
+            endpoints = {
+                endpoint: {
+                    **metrics,
+                    "avg_ms": round(metrics["total_ms"] / metrics["count"]),
+                }
+                for endpoint, metrics in cls.latency.items()
+            }
+        return {"endpoints": endpoints, "circuit": cls.circuit_breaker.state}
+
     def _make_request(
         self,
         endpoint: str,
@@ -56,7 +186,8 @@ class LionParcelHelper:
             dict: The JSON response from the API.
 
         Raises:
-            Exception: If the response status code is not 200 or 201.
+            CircuitBreakerOpen: If the API failed too many times in a row recently.
+            requests.HTTPError: If the response status code is not 200 or 201, with the response.
         """
         headers = {
             "Authorization": f"Basic {self.api_key}",
@@ -64,14 +195,38 @@ class LionParcelHelper:
         }
 
         url = urljoin(self.BASE_URL, endpoint)
-        response = requests.request(
-            method, url, headers=headers, params=params, json=data
-        )
+        self.circuit_breaker.before_call()
+
+        started_at = time.perf_counter()
+        failed = True
+        try:
+            response = self.get_session().request(
+                method,
+                url,
+                headers=headers,
+                params=params,
+                json=data,
+                timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT),
+            )
+            failed = response.status_code >= 500
+        finally:
+            # connection errors, timeouts and server errors open the circuit
+            if failed:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            self.record_latency(
+                endpoint.split("?")[0], time.perf_counter() - started_at, failed
+            )
 
         if response.status_code in [200, 201]:
             return response.json()
-        else:
-            raise Exception(response.json())
+
+        try:
+            error = response.json()
+        except ValueError:
+            error = response.text
+        raise requests.HTTPError(error, response=response)
 
     def get_tariff(
         self, origin: str, destination: str, weight: int, commodity: str
@@ -128,6 +283,40 @@ class LionParcelHelper:
             Dict[str, Any]: A dictionary containing the response from the API.
         """
 
+        # reformat the data to follow the API format
+        booking_data = {"stt": self.build_stt(booking_data)}
+
+        endpoint = "/client/booking"
+        return self._make_request(endpoint, method="POST", data=booking_data)
+
+    def make_bookings(self, bookings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Creates the bookings of many shipments in one request.
+
+        Args:
+            bookings (List[Dict[str, Any]]): The booking data of each shipment, as in `make_booking`,
+                at most `BOOKING_BATCH_SIZE` of them.
+
+        Returns:
+            Dict[str, Any]: A dictionary containing the response from the API, with a booked stt per booking.
+        """
+
+        if len(bookings) > self.BOOKING_BATCH_SIZE:
+            raise ValueError(
+                f"bookings must have at most {self.BOOKING_BATCH_SIZE} items"
+            )
+
+        booking_data = {"stt": [self.build_stt(booking) for booking in bookings]}
+
+        endpoint = "/client/booking"
+        return self._make_request(endpoint, method="POST", data=booking_data)
+
+    @staticmethod
+    def build_stt(booking_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validates the booking data of a shipment and creates its stt in the API format.
+        """
+
         # validate the booking data
         if not isinstance(booking_data, dict):
             raise ValueError("booking_data must be a dictionary")
@@ -163,11 +352,7 @@ class LionParcelHelper:
             "stt_cod_amount": 0,
         }
 
-        # reformat the data to follow the API format
-        booking_data = {"stt": booking_data}
-
-        endpoint = "/client/booking"
-        return self._make_request(endpoint, method="POST", data=booking_data)
+        return booking_data
 
     def track_booking(self, booking_id: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,93 @@
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.search.models import Search
+from tools.custom_paginations import KeysetCursorPagination, OptionalCursorPagination
+
+
+@pytest.fixture
+def searches(db):
+    now = timezone.now()
+    searches = [Search.objects.create(query=f"query {index}") for index in range(5)]
+
+    # give two searches the same timestamp to check the id tie breaker
+    for index, search in enumerate(searches):
+        created_at = now - timedelta(minutes=min(index, 3))
+        Search.objects.filter(pk=search.pk).update(created_at=created_at)
+
+    return list(Search.objects.order_by("-created_at", "-id"))
+
+
+def paginate(paginator, url):
+    request = Request(APIRequestFactory().get(url))
+    page = paginator.paginate_queryset(Search.objects.order_by("-created_at"), request)
+    return page, paginator.get_paginated_response([]).data
+
+
+def test_keyset_cursor_pagination_walks_all_pages(searches):
+    # Arrange
+    paginator = KeysetCursorPagination()
+    paginator.page_size = 2
+    url = "/search/?cursor="
+
+    # Act
+    results = []
+    while url:
+        page, data = paginate(paginator, url)
+        results.extend(page)
+        url = data["next"]
+
+    # Assert
+    assert results == searches
+
+
+def test_keyset_cursor_pagination_previous_page(searches):
+    # Arrange
+    paginator = KeysetCursorPagination()
+    paginator.page_size = 2
+    first_page, data = paginate(paginator, "/search/?cursor=")
+    second_page, data = paginate(paginator, data["next"])
+
+    # Act
+    previous_page, data = paginate(paginator, data["previous"])
+
+    # Assert
+    assert second_page == searches[2:4]
+    assert previous_page == first_page
+    assert data["previous"] is None
+
+
+def test_keyset_cursor_pagination_invalid_cursor(searches):
+    # Arrange
+    paginator = KeysetCursorPagination()
+
+    # Act & Assert
+    with pytest.raises(NotFound):
+        paginate(paginator, "/search/?cursor=invalid")
+
+
+def test_keyset_cursor_pagination_rejects_ordering(searches):
+    # Arrange
+    paginator = OptionalCursorPagination()
+
+    # Act & Assert: the cursor key fixes the ordering
+    with pytest.raises(ParseError):
+        paginate(paginator, "/search/?cursor=&ordering=query")
+    page, data = paginate(paginator, "/search/?ordering=query")
+    assert len(page) == 5
+
+
+def test_optional_cursor_pagination_uses_page_number_by_default(searches):
+    # Arrange
+    paginator = OptionalCursorPagination()
+
+    # Act
+    page, data = paginate(paginator, "/search/")
+
+    # Assert
+    assert len(page) == 5
+    assert data["count"] == 5
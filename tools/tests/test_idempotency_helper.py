@@ -0,0 +1,87 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from tools.idempotency_helper import idempotent, get_idempotency_cache_key
+
+User = get_user_model()
+
+
+class CounterAPIView(APIView):
+    calls = 0
+
+    @idempotent
+    def post(self, request):
+        CounterAPIView.calls += 1
+        if request.data.get("expire"):
+            # the key expires and a retry claims it meanwhile
+            cache.set(
+                get_idempotency_cache_key(request, request.headers["Idempotency-Key"]),
+                {"fingerprint": "retry", "status": None, "token": "retry"},
+            )
+        if request.data.get("fail"):
+            return Response({"error": "failed"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"call": CounterAPIView.calls}, status=status.HTTP_201_CREATED)
+
+
+@pytest.fixture
+def post(db):
+    cache.clear()
+    CounterAPIView.calls = 0
+    user = User.objects.create_user(
+        email="user@example.com",
+        password="password",
+        first_name="Test",
+        last_name="User",
+    )
+
+    def post(data, key=None):
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        request = APIRequestFactory().post("/counter/", data, format="json", **headers)
+        force_authenticate(request, user=user)
+        return CounterAPIView.as_view()(request)
+
+    return post
+
+
+def test_idempotent_replays_stored_response(post):
+    # Act
+    first = post({"item": 1}, key="key-1")
+    retry = post({"item": 1}, key="key-1")
+    other = post({"item": 1}, key="key-2")
+    without_key = post({"item": 1})
+
+    # Assert
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert retry.data == first.data == {"call": 1}
+    assert retry["Idempotency-Replayed"] == "true"
+    assert other.data == {"call": 2}
+    assert without_key.data == {"call": 3}
+
+
+def test_idempotent_rejects_reused_key_and_retries_failures(post):
+    # Act
+    post({"item": 1}, key="key-1")
+    reused = post({"item": 2}, key="key-1")
+    failed = post({"fail": True}, key="key-2")
+    retried = post({"fail": True}, key="key-2")
+
+    # Assert
+    assert reused.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert failed.status_code == retried.status_code == status.HTTP_400_BAD_REQUEST
+    assert CounterAPIView.calls == 3
+
+
+def test_idempotent_keeps_key_claimed_by_another_request(post):
+    # Act
+    failed = post({"fail": True, "expire": True}, key="key-1")
+    retry = post({"item": 1}, key="key-1")
+
+    # Assert: the failed request didn't release the key of the retry
+    assert failed.status_code == status.HTTP_400_BAD_REQUEST
+    assert retry.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert CounterAPIView.calls == 1
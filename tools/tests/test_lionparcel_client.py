@@ -0,0 +1,98 @@
+import pytest
+import requests
+
+from tools.lionparcel_helper import (
+    CircuitBreaker,
+    CircuitBreakerOpen,
+    LionParcelHelper,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    def __init__(self):
+        self.requests = []
+        self.is_down = False
+        self.status_code = 200
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs["timeout"]))
+        if self.is_down:
+            raise requests.ConnectionError("Connection refused")
+        if self.status_code != 200:
+            return FakeResponse(self.status_code, {"message": "Invalid stt"})
+        return FakeResponse(200, {"stts": []})
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(
+        LionParcelHelper, "get_session", classmethod(lambda cls: session)
+    )
+    monkeypatch.setattr(
+        LionParcelHelper, "circuit_breaker", CircuitBreaker(failure_threshold=2)
+    )
+    monkeypatch.setattr(LionParcelHelper, "latency", {})
+    return session
+
+
+def test_shared_session_retries_only_get_requests():
+    # Act
+    session = LionParcelHelper.get_session()
+
+    # Assert
+    assert LionParcelHelper.get_session() is session
+    retry = session.get_adapter(LionParcelHelper.BASE_URL).max_retries
+    assert retry.total == LionParcelHelper.GET_RETRIES
+    assert retry.allowed_methods == ["GET"]
+    assert retry.backoff_jitter == LionParcelHelper.RETRY_JITTER
+
+
+def test_circuit_breaker_fails_fast_while_api_is_down(session):
+    # Arrange
+    helper = LionParcelHelper("key")
+    helper.track_booking("STT1")
+    session.is_down = True
+
+    # Act
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            helper.track_booking("STT2")
+
+    # Assert: the next call doesn't reach the API
+    with pytest.raises(CircuitBreakerOpen):
+        helper.track_booking("STT3")
+    assert len(session.requests) == 3
+    assert session.requests[0][2] == (
+        LionParcelHelper.CONNECT_TIMEOUT,
+        LionParcelHelper.READ_TIMEOUT,
+    )
+
+    metrics = LionParcelHelper.get_metrics()
+    assert metrics["circuit"] == "open"
+    assert metrics["endpoints"]["/v3/stt/track"]["count"] == 3
+    assert metrics["endpoints"]["/v3/stt/track"]["errors"] == 2
+
+
+def test_error_response_is_raised_with_its_status(session):
+    # Arrange
+    helper = LionParcelHelper("key")
+    session.status_code = 422
+
+    # Act
+    with pytest.raises(requests.HTTPError) as error:
+        helper.track_booking("STT1")
+
+    # Assert: a validation error doesn't open the circuit
+    assert error.value.response.status_code == 422
+    assert str(error.value) == str({"message": "Invalid stt"})
+    assert LionParcelHelper.get_metrics()["circuit"] == "closed"